@@ -0,0 +1,357 @@
+import os
+import json
+from array import array
+import numpy as np
+import networkx as nx
+
+####################################################
+# Reads an input folder (graph.gml and parameters.txt)
+# into CSR arrays, with a binary cache next to the input
+# so that repeat runs skip parsing the GML file.
+#
+# graph.gml is read line by line by a small parser for
+# the (networkx written) GML files of this project, which
+# only keeps the node labels and the edge endpoints.
+# Anything it doesn't handle falls back to nx.read_gml.
+#
+# The cache is the folder <input_folder>/.instance_cache
+# and is rebuilt whenever the size or modification time
+# of graph.gml or parameters.txt changes.
+####################################################
+
+CACHE_DIR = ".instance_cache"
+CACHE_VERSION = 1
+SOURCE_FILES = ("graph.gml", "parameters.txt")
+ARRAY_NAMES = ("indptr", "indices", "labels", "constraint_indptr", "constraint_members")
+
+
+class InputData:
+    """
+    Parsed input, the vertices are relabeled to their position in the GML file's node list.
+    """
+
+    def __init__(self, indptr, indices, labels, num_edges, num_buses, bus_size, constraint_indptr,
+                 constraint_members):
+        """
+        :param indptr: CSR row pointer array, vertex u's neighbors are indices[indptr[u]:indptr[u+1]]
+        :param indices: CSR column array. A self loop appears once in its vertex's row.
+        :param labels: list of the (string) label of each vertex.
+        :param num_edges: number of (undirected) edges in the graph.
+        :param num_buses: number of buses.
+        :param bus_size: capacity of each bus.
+        :param constraint_indptr: row pointer array of the rowdy groups (same layout as indptr).
+        :param constraint_members: int vertices of the rowdy groups.
+        """
+        self.indptr = indptr
+        self.indices = indices
+        self.labels = labels
+        self.num_edges = num_edges
+        self.num_buses = num_buses
+        self.bus_size = bus_size
+        self.constraint_indptr = constraint_indptr
+        self.constraint_members = constraint_members
+
+    @property
+    def constraints(self):
+        """
+        :return: list of the rowdy groups as lists of int vertices.
+        """
+        members = self.constraint_members.tolist()
+        ptr = self.constraint_indptr.tolist()
+        return [members[ptr[i]:ptr[i + 1]] for i in range(len(ptr) - 1)]
+
+    def to_networkx(self):
+        """
+        :return: networkx graph with the original labels as vertices.
+        """
+        labels = self.labels
+        indptr = self.indptr.tolist()
+        indices = self.indices.tolist()
+        graph = nx.Graph()
+        graph.add_nodes_from(labels)
+        graph.add_edges_from((labels[u], labels[v]) for u in range(len(labels))
+                             for v in indices[indptr[u]:indptr[u + 1]] if u <= v)
+        return graph
+
+
+class GMLFormatError(ValueError):
+    """
+    Raised by read_gml_arrays on a GML file it can't read the same way as nx.read_gml.
+    """
+
+
+def gml_string(value):
+    """
+    :return: the str of the quoted GML value VALUE.
+    """
+    if len(value) < 2 or value[0] != '"' or value[-1] != '"' or '&' in value:
+        raise GMLFormatError(f"Not a plain string: {value}")  # nx.read_gml unescapes HTML entities.
+    return value[1:-1]
+
+
+def read_gml_arrays(file_path):
+    """
+    Reads the graph of the GML file FILE_PATH, one line at a time and without building a
+    networkx graph. The vertices and neighbor orders are the same as in nx.read_gml's graph.
+    Only handles one key (and value or '[') per line, which is how networkx writes GML files.
+
+    :param file_path: path to the graph.gml file.
+    :return: Tuple of (indptr, indices, labels, num_edges) (see InputData).
+    :raises: GMLFormatError if the file is not of the handled format.
+    """
+    ids = {}
+    labels = []
+    sources = array('q')
+    targets = array('q')
+    keys = []  # Keys of the open lists.
+    node_id = node_label = None
+    edge_source = edge_target = None
+
+    with open(file_path, 'r', encoding='utf8') as f:
+        for line in f:
+            parts = line.split(None, 1)
+            if not parts:
+                continue
+            key = parts[0]
+            value = parts[1].strip() if len(parts) > 1 else None
+
+            if key == ']' and value is None:
+                if not keys:
+                    raise GMLFormatError("Unmatched ']'")
+                closed = keys.pop()
+                if len(keys) == 1 and closed == "node":
+                    if node_id is None or node_label is None or node_id in ids:
+                        raise GMLFormatError("Node without a unique id and a label")
+                    ids[node_id] = len(labels)
+                    labels.append(node_label)
+                    node_id = node_label = None
+                elif len(keys) == 1 and closed == "edge":
+                    if edge_source is None or edge_target is None:
+                        raise GMLFormatError("Edge without a source and a target")
+                    sources.append(edge_source)
+                    targets.append(edge_target)
+                    edge_source = edge_target = None
+                continue
+            if value == '[':
+                if not keys and key != "graph":
+                    raise GMLFormatError(f"Unexpected top level key: {key}")
+                keys.append(key)
+                continue
+            if (value is None or not keys or value.endswith('[') or
+                    (value[0] == '"' and (len(value) < 2 or value[-1] != '"')) or
+                    (value[0] != '"' and ('[' in value or ']' in value))):
+                raise GMLFormatError(f"Unhandled line: {line.strip()}")
+
+            if len(keys) == 1:
+                if key in ("directed", "multigraph") and value != '0':
+                    raise GMLFormatError(f"Unhandled graph type: {key} {value}")
+            elif len(keys) == 2 and keys[1] == "node":
+                if key == "id":
+                    node_id = int(value)
+                elif key == "label":
+                    node_label = gml_string(value)
+            elif len(keys) == 2 and keys[1] == "edge":
+                if key == "source":
+                    edge_source = int(value)
+                elif key == "target":
+                    edge_target = int(value)
+    if keys or len(set(labels)) != len(labels):
+        raise GMLFormatError("Unclosed list or duplicate labels")
+
+    num_vertices = len(labels)
+    min_id = min(ids, default=0)
+    if max(ids, default=0) - min_id > 2 * num_vertices:
+        raise GMLFormatError("Sparse node ids")
+    id_map = np.full(max(ids, default=0) - min_id + 1, -1, dtype=np.int64)
+    for node_id, u in ids.items():
+        id_map[node_id - min_id] = u
+    sources = np.frombuffer(sources, dtype=np.int64) - min_id
+    targets = np.frombuffer(targets, dtype=np.int64) - min_id
+    if len(sources) and (min(sources.min(), targets.min()) < 0 or
+                         max(sources.max(), targets.max()) >= len(id_map)):
+        raise GMLFormatError("Edge to an unknown node")
+    sources = id_map[sources]
+    targets = id_map[targets]
+    if len(sources) and min(sources.min(), targets.min()) < 0:
+        raise GMLFormatError("Edge to an unknown node")
+    lo, hi = np.minimum(sources, targets), np.maximum(sources, targets)
+    if len(np.unique(lo * num_vertices + hi)) != len(sources):
+        raise GMLFormatError("Duplicate edge")
+
+    # Edge i adds sources[i] -> targets[i] then targets[i] -> sources[i] (once for a self loop),
+    # a stable sort by row keeps each vertex's neighbors in order of appearance, like networkx.
+    rows = np.stack([sources, targets], axis=1).ravel()
+    cols = np.stack([targets, sources], axis=1).ravel()
+    keep = np.ones(len(rows), dtype=bool)
+    keep[1::2] = sources != targets
+    rows, cols = rows[keep], cols[keep]
+    order = np.argsort(rows, kind='stable')
+    indptr = np.zeros(num_vertices + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=num_vertices), out=indptr[1:])
+    return indptr, cols[order].astype(np.int32), labels, len(sources)
+
+
+def read_gml_arrays_networkx(file_path):
+    """
+    Same as read_gml_arrays, but reads FILE_PATH with nx.read_gml.
+    """
+    graph = nx.read_gml(file_path)
+    labels = list(graph.nodes())
+    index = {label: u for u, label in enumerate(labels)}
+    indptr = [0]
+    indices = []
+    for label in labels:
+        indices.extend(index[v] for v in graph.neighbors(label))
+        indptr.append(len(indices))
+    return np.array(indptr, dtype=np.int64), np.array(indices, dtype=np.int32), labels, graph.number_of_edges()
+
+
+def read_parameters(folder_name):
+    """
+    :return: Tuple of (num_buses, bus_size, constraints) where constraints is a list of
+        lists of vertex labels, as written in FOLDER_NAME's parameters.txt.
+    """
+    with open(folder_name + "/parameters.txt") as parameters:
+        num_buses = int(parameters.readline())
+        bus_size = int(parameters.readline())
+        constraints = []
+        for line in parameters:
+            line = line[1: -2]
+            curr_constraint = [num.replace("'", "") for num in line.split(", ")]
+            constraints.append(curr_constraint)
+    return num_buses, bus_size, constraints
+
+
+def read_parameter_arrays(folder_name, index):
+    """
+    Same as read_parameters, but streams the rowdy groups into arrays of int vertices.
+
+    :param index: dict of {vertex label: int vertex}
+    :return: Tuple of (num_buses, bus_size, constraint_indptr, constraint_members) (see InputData).
+    """
+    constraint_indptr = array('q', [0])
+    constraint_members = array('i')
+    with open(folder_name + "/parameters.txt") as parameters:
+        num_buses = int(parameters.readline())
+        bus_size = int(parameters.readline())
+        for line in parameters:
+            line = line[1: -2]
+            constraint_members.extend(index[num.replace("'", "")] for num in line.split(", "))
+            constraint_indptr.append(len(constraint_members))
+    return (num_buses, bus_size, np.frombuffer(constraint_indptr, dtype=np.int64),
+            np.frombuffer(constraint_members, dtype=np.int32))
+
+
+def parse_input_data(folder_name):
+    """
+    Parses FOLDER_NAME's graph.gml and parameters.txt (no cache).
+
+    :return: InputData obj of the input.
+    """
+    try:
+        indptr, indices, labels, num_edges = read_gml_arrays(folder_name + "/graph.gml")
+    except ValueError:  # GMLFormatError and UnicodeDecodeError are ValueErrors too.
+        indptr, indices, labels, num_edges = read_gml_arrays_networkx(folder_name + "/graph.gml")
+    index = {label: u for u, label in enumerate(labels)}
+    num_buses, bus_size, constraint_indptr, constraint_members = read_parameter_arrays(folder_name, index)
+    return InputData(indptr, indices, labels, num_edges, num_buses, bus_size, constraint_indptr, constraint_members)
+
+
+def source_stamps(folder_name):
+    """
+    :return: dict of {source file name: [size, modification time in ns]} of FOLDER_NAME's input files.
+    """
+    stamps = {}
+    for file_name in SOURCE_FILES:
+        stat = os.stat(f"{folder_name}/{file_name}")
+        stamps[file_name] = [stat.st_size, stat.st_mtime_ns]
+    return stamps
+
+
+def load_cache(folder_name):
+    """
+    Loads the cache of FOLDER_NAME, the arrays are memory mapped.
+
+    :return: InputData obj of the input, or None if there is no cache or if it is stale.
+    """
+    cache_path = f"{folder_name}/{CACHE_DIR}"
+    try:
+        with open(f"{cache_path}/meta.json", 'r') as f:
+            meta = json.load(f)
+        if meta.get("version") != CACHE_VERSION or meta.get("sources") != source_stamps(folder_name):
+            return None
+        arrays = {name: np.load(f"{cache_path}/{name}.npy", mmap_mode='r') for name in ARRAY_NAMES}
+        if len(arrays["indptr"]) != len(arrays["labels"]) + 1:
+            return None
+    except (OSError, ValueError, KeyError):
+        return None
+    return InputData(arrays["indptr"], arrays["indices"], arrays["labels"].tolist(), meta["num_edges"],
+                     meta["num_buses"], meta["bus_size"], arrays["constraint_indptr"], arrays["constraint_members"])
+
+
+def write_cache(folder_name, data, stamps):
+    """
+    Writes DATA as the cache of FOLDER_NAME. Each file is written through a temporary file and
+    meta.json (which marks the cache as valid) is written last, so readers never see a partial cache.
+
+    :param stamps: source_stamps of the input files DATA was parsed from.
+    """
+    cache_path = f"{folder_name}/{CACHE_DIR}"
+    os.makedirs(cache_path, exist_ok=True)
+    tmp_suffix = f".{os.getpid()}.tmp"
+    try:
+        os.remove(f"{cache_path}/meta.json")
+    except FileNotFoundError:
+        pass
+
+    arrays = {
+        "indptr": data.indptr,
+        "indices": data.indices,
+        "labels": np.array(data.labels, dtype=str),
+        "constraint_indptr": data.constraint_indptr,
+        "constraint_members": data.constraint_members,
+    }
+    for name, array in arrays.items():
+        with open(f"{cache_path}/{name}.npy{tmp_suffix}", 'wb') as f:
+            np.save(f, array)
+        os.replace(f"{cache_path}/{name}.npy{tmp_suffix}", f"{cache_path}/{name}.npy")
+
+    meta = {
+        "version": CACHE_VERSION,
+        "sources": stamps,
+        "num_edges": data.num_edges,
+        "num_buses": data.num_buses,
+        "bus_size": data.bus_size,
+    }
+    with open(f"{cache_path}/meta.json{tmp_suffix}", 'w') as f:
+        json.dump(meta, f)
+    os.replace(f"{cache_path}/meta.json{tmp_suffix}", f"{cache_path}/meta.json")
+
+
+def read_input(folder_name, use_cache=True, read_only=False):
+    """
+    Reads the input FOLDER_NAME from its cache if it is up to date,
+    otherwise parses it and (re)writes the cache.
+
+    :param folder_name: path to the input folder.
+    :param use_cache: if False, always parse the input and don't touch the cache.
+    :param read_only: if True, an up to date cache is still read, but a missing or
+        out of date one is not (re)written, so nothing is written to FOLDER_NAME.
+    :return: InputData obj of the input.
+    """
+    if not use_cache:
+        return parse_input_data(folder_name)
+
+    data = load_cache(folder_name)
+    if data is not None:
+        return data
+    if read_only:
+        return parse_input_data(folder_name)
+
+    stamps = source_stamps(folder_name)
+    data = parse_input_data(folder_name)
+    try:
+        write_cache(folder_name, data, stamps)
+    except OSError:
+        pass  # Read only input folder, just don't cache.
+    return data
@@ -1,7 +1,9 @@
 import os
 import sys
+import numpy as np
 import networkx as nx
 import matplotlib.pyplot as plt
+from input_reader import read_input
 
 ####################################################
 # To run:
@@ -27,16 +29,10 @@ def score_output(input_folder, output_file):
             score - a number between 0 and 1 which represents what fraction of friendships were broken
             msg - a string which stores error messages in case the output file is not valid for the given input
     '''
-    graph = nx.read_gml(input_folder + "/graph.gml")
-    parameters = open(input_folder + "/parameters.txt")
-    num_buses = int(parameters.readline())
-    size_bus = int(parameters.readline())
-    constraints = []
-
-    for line in parameters:
-        line = line[1: -2]
-        curr_constraint = [node.replace("'","") for node in line.split(", ")]
-        constraints.append(curr_constraint)
+    data = read_input(input_folder, read_only=True)  # Scoring never writes to the input folder.
+    num_buses = data.num_buses
+    size_bus = data.bus_size
+    index = {label: u for u, label in enumerate(data.labels)}
 
     output = open(output_file)
     assignments = []
@@ -55,44 +51,39 @@ def score_output(input_folder, output_file):
         if len(assignments[i]) <= 0:
             return -1, "Bus {} is empty".format(i)
         
-    bus_assignments = {}
-    attendance_count = 0
+    # bus of each student (int vertex), -1 until it is assigned
+    bus_of = np.full(len(data.labels), -1, dtype=np.int64)
         
     # make sure each student is in exactly one bus
-    attendance = {student:False for student in graph.nodes()}
     for i in range(len(assignments)):
-        if not all([student in graph for student in assignments[i]]):
+        if not all([student in index for student in assignments[i]]):
             return -1, "Bus {} references a non-existant student: {}".format(i, assignments[i])
 
         for student in assignments[i]:
             # if a student appears more than once
-            if attendance[student] == True:
+            if bus_of[index[student]] >= 0:
                 print(assignments[i])
                 return -1, "{0} appears more than once in the bus assignments".format(student)
                 
-            attendance[student] = True
-            bus_assignments[student] = i
+            bus_of[index[student]] = i
     
     # make sure each student is accounted for
-    if not all(attendance.values()):
+    if (bus_of < 0).any():
         return -1, "Not all students have been assigned a bus"
     
-    total_edges = graph.number_of_edges()
-    # Remove nodes for rowdy groups which were not broken up
-    for i in range(len(constraints)):
-        busses = set()
-        for student in constraints[i]:
-            busses.add(bus_assignments[student])
-        if len(busses) <= 1:
-            for student in constraints[i]:
-                if student in graph:
-                    graph.remove_node(student)
+    total_edges = data.num_edges
+    # Students of rowdy groups which were not broken up don't count
+    invalid = np.zeros(len(data.labels), dtype=bool)
+    for constraint in data.constraints:
+        if len(set(bus_of[constraint].tolist())) <= 1:
+            invalid[constraint] = True
 
-    # score output
-    score = 0
-    for edge in graph.edges():
-        if bus_assignments[edge[0]] == bus_assignments[edge[1]]:
-            score += 1
+    # score output, each edge (u, v) is counted in the row of u <= v of the CSR arrays
+    indptr = np.asarray(data.indptr)
+    sources = np.repeat(np.arange(len(data.labels)), np.diff(indptr))
+    targets = np.asarray(data.indices)
+    counted = (sources <= targets) & (bus_of[sources] == bus_of[targets]) & ~invalid[sources] & ~invalid[targets]
+    score = int(counted.sum())
     score = score / total_edges
 
 
@@ -1,16 +1,26 @@
 import os
-import copy
 import bisect
 import sys
 import json
 import time
 import datetime
+import functools
 import math
+import multiprocessing
+import heapq
+import types
+import queue
+import threading
 import numpy as np
 import networkx as nx
-from shutil import copyfile
 from collections import deque
 import matplotlib.pyplot as plt
+from input_reader import read_input, read_parameters
+
+try:
+    import fcntl
+except ImportError:  # No file locks (Windows), only one solver process should write at a time.
+    fcntl = None
 
 ###########################################
 # Change this variable to the path to 
@@ -26,11 +36,440 @@ path_to_inputs = "./all_inputs"
 ###########################################
 path_to_outputs = "./outputs"
 
+###########################################
+# Change this variable to solve several
+# inputs at once (number of worker
+# processes used by main)
+###########################################
+num_processes = 1
+
+###########################################
+# Seconds (wall-clock) that main gives
+# each input (split between the phases of
+# the solver by PHASE_BUDGETS), None for
+# no time limit
+###########################################
+input_time_limit = None
+
+###########################################
+# Size categories that main solves with
+# the multilevel solver (solve_multilevel)
+# instead of solve
+###########################################
+multilevel_categories = []
+
+###########################################
+# Size categories that main solves with
+# the memetic solver (solve_memetic)
+# instead of solve
+###########################################
+memetic_categories = []
+
+###########################################
+# Size categories that main solves with
+# the racing solver (solve_racing) and
+# the path of its win statistics
+###########################################
+racing_categories = []
+race_stats_path = f"{path_to_outputs}/race_stats.json"
+
 ###########################################
 # Dictionary to track scores.
 ###########################################
 score_path = f"{path_to_outputs}/scores.json"
+score_log_path = f"{path_to_outputs}/scores.jsonl"
 SCORES = {}
+SCORE_LEDGER = None
+
+
+#################
+# Compact Graph #
+#################
+
+
+class CompactGraph:
+    """
+    Read-only graph whose vertices are relabeled to the ints 0 to V-1, with a CSR
+    adjacency (indptr / indices NumPy arrays) and a label table for writing outputs.
+
+    It implements the (small) part of the networkx graph API that the solvers use,
+    so the solver classes can run on it directly. Use to_networkx for drawing and validation.
+    """
+
+    def __init__(self, indptr, indices, labels, num_edges):
+        """
+        :param indptr: CSR row pointer array, vertex u's neighbors are indices[indptr[u]:indptr[u+1]]
+        :param indices: CSR column array. A self loop appears once in its vertex's row.
+        :param labels: list of the (string) label of each vertex.
+        :param num_edges: number of (undirected) edges in the graph.
+        """
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.labels = list(labels)
+        self.index = {label: u for u, label in enumerate(self.labels)}
+        self.num_edges = num_edges
+        # Python lists of neighbors for the hot loops (scalar access on NumPy arrays is slow).
+        self.adjacency = [self.indices[self.indptr[u]:self.indptr[u + 1]].tolist() for u in range(len(self.labels))]
+        # Degrees follow networkx's convention of counting a self loop twice.
+        self.degrees = [len(self.adjacency[u]) + (u in self.adjacency[u]) for u in range(len(self.labels))]
+        self.degree = CompactDegreeView(self.degrees)
+
+    def __getstate__(self):
+        # Only the arrays are pickled, the rest is rebuilt from them.
+        return self.indptr, self.indices, self.labels, self.num_edges
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    @classmethod
+    def from_networkx(cls, graph):
+        """
+        :param graph: networkx graph, vertex u is relabeled to its position in graph.nodes()
+        :return: the CompactGraph obj of GRAPH.
+        """
+        labels = list(graph.nodes())
+        index = {label: u for u, label in enumerate(labels)}
+        indptr = [0]
+        indices = []
+        for label in labels:
+            indices.extend(index[v] for v in graph.neighbors(label))
+            indptr.append(len(indices))
+        return cls(indptr, indices, labels, graph.number_of_edges())
+
+    def to_networkx(self):
+        """
+        :return: networkx graph of self with the original labels as vertices.
+        """
+        graph = nx.Graph()
+        graph.add_nodes_from(self.labels)
+        graph.add_edges_from((self.labels[u], self.labels[v]) for u, v in self.edges())
+        return graph
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __contains__(self, u):
+        try:
+            return 0 <= u < len(self.labels) and u == int(u)
+        except TypeError:
+            return False
+
+    def nodes(self):
+        return range(len(self.labels))
+
+    def neighbors(self, u):
+        return self.adjacency[u]
+
+    def edges(self):
+        for u in range(len(self.labels)):
+            for v in self.adjacency[u]:
+                if u <= v:
+                    yield u, v
+
+    def number_of_edges(self):
+        return self.num_edges
+
+
+class CompactDegreeView:
+    """
+    Same behaviour as networkx's degree view: iterating gives (vertex, degree)
+    tuples and indexing by a vertex gives its degree.
+    """
+
+    def __init__(self, degrees):
+        self.degrees = degrees
+
+    def __len__(self):
+        return len(self.degrees)
+
+    def __getitem__(self, u):
+        return self.degrees[u]
+
+    def __iter__(self):
+        return iter(enumerate(self.degrees))
+
+
+################
+# Score Ledger #
+################
+
+
+class ScoreLedger:
+    """
+    Append only log of the best scores of the outputs (one JSON object per line).
+    Recording a score appends a single line instead of rewriting the whole table,
+    and several solver processes can record into the same ledger at once.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: path of the ledger (.jsonl) file.
+        """
+        self.path = path
+        self.scores = {}
+        self.offset = 0  # Bytes of the ledger that are already in self.scores.
+        self.inode = None
+
+    def _lock(self):
+        """
+        Opens and exclusively locks the ledger file. Since `load` replaces the file,
+        it retries until the locked file is still the one at self.path.
+
+        :return: file descriptor of the locked ledger.
+        """
+        while True:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+            if fcntl is None:
+                break
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                if os.fstat(fd).st_ino == os.stat(self.path).st_ino:
+                    break
+            except FileNotFoundError:
+                pass
+            os.close(fd)
+        inode = os.fstat(fd).st_ino
+        if inode != self.inode:  # Compacted by some other process, re-read everything.
+            self.inode, self.offset = inode, 0
+        return fd
+
+    def _read_new(self, fd):
+        """
+        Reads the lines appended since the last read into self.scores, keeping the max score
+        of each output. A partial last line (from a crashed writer) and bad lines are ignored.
+
+        :return: True if the file ends with a complete line.
+        """
+        os.lseek(fd, self.offset, os.SEEK_SET)
+        chunks = []
+        while True:
+            chunk = os.read(fd, 1 << 20)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        data = b"".join(chunks)
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            try:
+                entry = json.loads(line)
+                file_path, score = entry["file"], entry["score"]
+            except (ValueError, KeyError, TypeError):
+                continue
+            if score > self.scores.get(file_path, -1):
+                self.scores[file_path] = score
+        self.offset += end
+        return end == len(data)
+
+    def load(self, legacy_path=None):
+        """
+        Reads the whole ledger (and the old scores.json file LEGACY_PATH if it exists),
+        then compacts the ledger down to one line per output.
+
+        :return: dict of {output file path: best score}
+        """
+        fd = self._lock()
+        try:
+            self.offset = 0
+            self.scores = {}
+            self._read_new(fd)
+            if legacy_path and os.path.isfile(legacy_path):
+                with open(legacy_path, 'r') as f:
+                    lines = f.read()
+                for file_path, score in (json.loads(lines) if lines else {}).items():
+                    if score > self.scores.get(file_path, -1):
+                        self.scores[file_path] = score
+
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                for file_path, score in self.scores.items():
+                    f.write(json.dumps({"file": file_path, "score": score}))
+                    f.write("\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)  # Still holding the lock of the replaced file.
+            self.inode = os.stat(self.path).st_ino
+            self.offset = os.path.getsize(self.path)
+        finally:
+            os.close(fd)
+        return self.scores
+
+    def record(self, file_path, score, write=None):
+        """
+        Records SCORE for FILE_PATH if it is better than the best score recorded (by any process).
+        WRITE is called (while holding the lock) before the score is recorded, so the output file
+        always matches the best recorded score.
+
+        :param file_path: path of the .out file.
+        :param score: score of the new solution.
+        :param write: function that writes the new solution to FILE_PATH.
+        :return: Tuple of (previous best score or None, True if SCORE was recorded)
+        """
+        fd = self._lock()
+        try:
+            complete = self._read_new(fd)
+            prev_score = self.scores.get(file_path, None)
+            if prev_score is not None and prev_score >= score:
+                return prev_score, False
+            if write is not None:
+                write()
+            line = json.dumps({"file": file_path, "score": score}) + "\n"
+            data = line.encode('utf8') if complete else ("\n" + line).encode('utf8')
+            os.write(fd, data)  # Single append, never interleaves with other writers.
+            os.fsync(fd)
+            self.offset = os.fstat(fd).st_size
+            self.scores[file_path] = score
+            return prev_score, True
+        finally:
+            os.close(fd)
+
+
+def score_ledger():
+    """
+    :return: the ScoreLedger of score_log_path (made on first use).
+    """
+    global SCORE_LEDGER
+    if SCORE_LEDGER is None or SCORE_LEDGER.path != score_log_path:
+        SCORE_LEDGER = ScoreLedger(score_log_path)
+    return SCORE_LEDGER
+
+
+def write_solution_file(file_path, solution):
+    """
+    Writes SOLUTION to FILE_PATH (through a temporary file, so FILE_PATH is never half written).
+    """
+    tmp_path = f"{file_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf8') as f:
+        for lst in solution:
+            f.write(str(lst))
+            f.write("\n")
+    os.replace(tmp_path, file_path)
+
+
+def write_output(file_path, score, solution, verbose=False):
+    """
+    Writes SOLUTION to the .out file FILE_PATH and records its score in the score ledger
+    (and SCORES), only if SCORE is better than the best recorded score of FILE_PATH.
+
+    :param file_path: path of the .out file.
+    :param score: (valid) score of SOLUTION.
+    :param solution: list of lists (buses) of vertex labels.
+    :param verbose: print message or not.
+    :return: the message that VERBOSE prints.
+    """
+    global SCORES
+
+    # Only write solutions that have betters scores than previous solutions.
+    ledger = score_ledger()
+    prev_score, written = ledger.record(file_path, score, lambda: write_solution_file(file_path, solution))
+    SCORES = ledger.scores
+    prev_score = score if prev_score is None else prev_score
+    if written:
+        msg = "[{}] New Score for {}:  {}  (diff = {})\n".format(str(datetime.datetime.utcnow())[11:],
+                                                                 file_path, round(score, 5),
+                                                                 round(score - prev_score, 5))
+    else:
+        msg = "[{}] New score for {} was <= to old score. DID NOT WRITE. (diff = {})\n".format(
+            str(datetime.datetime.utcnow())[11:], file_path, round(score - prev_score, 5))
+    if verbose:
+        print(msg)
+    return msg
+
+
+####################
+# Problem Instance #
+####################
+
+
+def rowdy_index(graph, constraints):
+    """
+    Builds the map of each node to the indices of the rowdy groups it is in,
+    in one pass over CONSTRAINTS. So this is O(V + total constraint size).
+
+    :return: read only dict of {node: tuple of rowdy group indices (increasing)}
+    """
+    index = {node: [] for node in graph.nodes()}
+    for i in range(len(constraints)):
+        for node in constraints[i]:
+            lst = index.setdefault(node, [])
+            if not lst or lst[-1] != i:  # A node can be listed more than once in a group.
+                lst.append(i)
+    return types.MappingProxyType({node: tuple(lst) for node, lst in index.items()})
+
+
+class ProblemInstance:
+    """
+    All of the precomputed, read-only data of one input (see parse_input). It is built
+    once and given to every solver and optimizer of that input (instance param), so
+    none of them recompute it. It is cheap to pickle for worker processes.
+
+    Vertices have an int index (vertex_index[node]), which is the node itself for CompactGraphs.
+
+    NOTE: Unpacks like the (graph, num_buses, bus_size, constraints) tuple.
+    """
+
+    def __init__(self, graph, num_buses, bus_size, constraints):
+        self.graph = graph
+        self.num_buses = num_buses
+        self.bus_size = bus_size
+        self.constraints = constraints
+
+        # Adjacency arrays (int indices)
+        if isinstance(graph, CompactGraph):
+            self.compact_graph = graph
+            self.nodes = self.vertex_index = graph.nodes()
+        else:
+            self.compact_graph = CompactGraph.from_networkx(graph)
+            self.nodes = self.compact_graph.labels
+            self.vertex_index = self.compact_graph.index
+        self.adjacency = self.compact_graph.adjacency
+        self.num_edges = graph.number_of_edges()
+
+        # Degree orders (for Heuristic.set_process_queue)
+        self.low_degree_order = [node for node, _ in sorted(graph.degree, key=lambda x: x[1])]
+        self.high_degree_order = [node for node, _ in sorted(graph.degree, key=lambda x: x[1], reverse=True)]
+
+        # Rowdy groups
+        self.node_to_rowdy_index_dict = rowdy_index(graph, constraints)
+        self.rowdy_sizes = np.array([len(grp) for grp in constraints], dtype=np.int64)
+        self.max_rowdy_size = int(self.rowdy_sizes.max(initial=0))
+        multiplicities = {}
+        for i in range(len(constraints)):
+            for u in constraints[i]:
+                multiplicities[u, i] = multiplicities.get((u, i), 0) + 1
+        self.rowdy_indices = {}  # Rowdy group indices (array) of each node
+        self.rowdy_multiplicities = {}  # Number of times the node is listed in each of its rowdy groups
+        for u in graph.nodes():
+            indices = self.node_to_rowdy_index_dict[u]
+            self.rowdy_indices[u] = np.array(indices, dtype=np.int64)
+            self.rowdy_multiplicities[u] = np.array([multiplicities[u, i] for i in indices], dtype=np.int32)
+        # Rowdy groups (without repeats) and rowdy group indices of each vertex, by vertex index
+        self.groups = [list(dict.fromkeys(self.vertex_index[u] for u in grp)) for grp in constraints]
+        self.vertex_groups = [[] for _ in range(len(self.compact_graph))]
+        for i in range(len(self.groups)):
+            for u in self.groups[i]:
+                self.vertex_groups[u].append(i)
+
+        self._set_neighbor_indices()
+
+    def _set_neighbor_indices(self):
+        # Neighbors (NumPy array views of the CSR indices) of each vertex index.
+        compact_graph = self.compact_graph
+        self.neighbor_indices = [compact_graph.indices[compact_graph.indptr[u]:compact_graph.indptr[u + 1]]
+                                 for u in range(len(compact_graph))]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["node_to_rowdy_index_dict"] = dict(self.node_to_rowdy_index_dict)
+        del state["neighbor_indices"]  # Views are rebuilt (pickling them would copy every slice).
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.node_to_rowdy_index_dict = types.MappingProxyType(self.node_to_rowdy_index_dict)
+        self._set_neighbor_indices()
+
+    def __iter__(self):
+        return iter((self.graph, self.num_buses, self.bus_size, self.constraints))
 
 
 class Solver:
@@ -39,20 +478,25 @@ class Solver:
     for using in the heuristic solver and optimizer.
     """
 
-    def __init__(self, graph, num_buses, bus_size, constraints, solution=None):
+    def __init__(self, graph, num_buses, bus_size, constraints, solution=None, instance=None):
+        """
+        :param instance: the ProblemInstance obj of (GRAPH, NUM_BUSES, BUS_SIZE, CONSTRAINTS), built
+            from them if it is not given. All of the precomputed data comes from the instance, so
+            it must be of the same input.
+        :raises: ValueError if INSTANCE is not of (GRAPH, NUM_BUSES, BUS_SIZE, CONSTRAINTS).
+        """
+        if instance is not None and (instance.graph is not graph or instance.num_buses != num_buses or
+                                     instance.bus_size != bus_size or
+                                     (instance.constraints is not constraints and instance.constraints != constraints)):
+            raise ValueError("The instance is not of the given graph, num_buses, bus_size and constraints.")
         self.graph = graph
         self.num_buses = num_buses
         self.bus_size = bus_size
         self.constraints = constraints
+        self.instance = instance if instance else ProblemInstance(graph, num_buses, bus_size, constraints)
         self.solution = solution if solution else []
         self.score = -1
-        self.node_to_rowdy_index_dict = {}
-        for node in self.graph.nodes():
-            lst = []
-            for i in range(len(self.constraints)):
-                if node in self.constraints[i]:
-                    lst.append(i)
-            self.node_to_rowdy_index_dict[node] = lst[:]
+        self.node_to_rowdy_index_dict = self.instance.node_to_rowdy_index_dict
 
     def get_solution_vertices_by_importance(self, limit=None):
         """
@@ -63,11 +507,12 @@ class Solver:
             So the first el of the returned list contributes the least to the score
             (after accounting for degree) and the last el contributes the most.
         """
-        limit = limit if limit else len(self.graph.nodes)
+        limit = limit if limit else len(self.graph)
+        solution = self.solution  # Optimizers build their solution on every access.
         lst = []
-        for i in range(len(self.solution)):
-            bus_set = set(self.solution[i])
-            for u in self.solution[i]:
+        for i in range(len(solution)):
+            bus_set = set(solution[i])
+            for u in solution[i]:
                 # Terminate early if possible
                 if len(lst) == limit:
                     return [l[1] for l in lst]
@@ -89,7 +534,7 @@ class Solver:
                     bisect.insort(lst, (score_contribution + self.graph.degree[u], (u, i)))
         return [l[1] for l in lst]
 
-    def write(self, file_name, file_directory, verbose=False):
+    def write(self, file_name, file_directory, verbose=False, writer=None):
         """
         Writes our planted solution's .out file as specified in the
         project spec. Returns true if successful. Only writes if the solution
@@ -98,41 +543,69 @@ class Solver:
         :param file_name: clean filename string with no file extension.
         :param file_directory: the directory for where the file will be written to.
         :param verbose: print message or not.
+        :param writer: OutputWriter obj, if given the file is written by its thread.
         :raises: ValueError if the score is not valid, with an accompanying message.
         """
-        global SCORES
-
         score, msg = self.set_score()
-        file_path = f"{file_directory}/{file_name}.out"
         if score < 0:
             raise ValueError("Solution object for {}/{} has a negative score. "
                              "Scorer Message: {}".format(file_directory, file_name, msg))
+        if writer is not None:
+            writer.put(f"{file_directory}/{file_name}.out", score, self.labeled_solution())
+        else:
+            write_output(f"{file_directory}/{file_name}.out", score, self.labeled_solution(), verbose=verbose)
 
-        # Only write solutions that have betters scores than previous solutions.
-        prev_score = SCORES.get(file_path, None)
-        if prev_score is None:
-            SCORES[file_path] = score
-        elif SCORES[file_path] >= score:
-            if verbose:
-                print("[{}] New score for {} was <= to old score. DID NOT WRITE. (diff = {})\n".format(
-                    str(datetime.datetime.utcnow())[11:], file_path, round(score - SCORES[file_path], 5)))
-            return
+    def labeled_solution(self):
+        """
+        :return: (list) a copy of self.solution (list of lists) with the vertices' labels
+            (as they are in the input), which are only different from the vertices for CompactGraphs.
+        """
+        if isinstance(self.graph, CompactGraph):
+            return [[self.graph.labels[u] for u in bus] for bus in self.solution]
+        return [list(bus) for bus in self.solution]
 
-        if verbose:
-            print("[{}] New Score for {}:  {}  (diff = {})\n".format(str(datetime.datetime.utcnow())[11:],
-                                                                     file_path, round(score, 5),
-                                                                     round(score - SCORES[file_path], 5)))
-        with open(file_path, 'w', encoding='utf8') as f:
-            for lst in self.solution:
-                f.write(str(lst))
-                f.write("\n")
-
-        SCORES[file_path] = score
-        # Update jason file's scores.
-        if os.path.isfile(score_path):
-            copyfile(score_path, f"{score_path}.bak")  # Backup file
-        with open(score_path, 'w') as f:
-            json.dump(SCORES, f)
+    def bus_solution(self, bus_of):
+        """
+        :param bus_of: list of the bus of each student (vertex index).
+        :return: list of lists (buses) of the students (vertices) in each bus.
+        """
+        solution = [[] for _ in range(self.num_buses)]
+        for u, bus in enumerate(bus_of):
+            solution[bus].append(self.instance.nodes[u])
+        return solution
+
+    def repair(self, bus_of):
+        """
+        Moves students (in place) out of over capacity buses and into empty buses. The moved
+        student is the one with the fewest friends on its bus and it goes to the bus (with a free
+        seat) where it has the most friends.
+        """
+        adjacency = self.instance.adjacency
+        loads = [0] * self.num_buses
+        solution = [[] for _ in range(self.num_buses)]
+        for u, bus in enumerate(bus_of):
+            loads[bus] += 1
+            solution[bus].append(u)
+
+        def friends_on(u, bus):
+            return sum(1 for v in adjacency[u] if v != u and bus_of[v] == bus)
+
+        def move(u, to_bus):
+            solution[bus_of[u]].remove(u)
+            loads[bus_of[u]] -= 1
+            solution[to_bus].append(u)
+            loads[to_bus] += 1
+            bus_of[u] = to_bus
+
+        for bus in range(self.num_buses):
+            while loads[bus] > self.bus_size:
+                u = min(solution[bus], key=lambda x: friends_on(x, bus))
+                open_buses = [b for b in range(self.num_buses) if loads[b] < self.bus_size]
+                move(u, max(open_buses, key=lambda b: (friends_on(u, b), -loads[b])))
+        for bus in range(self.num_buses):
+            if not loads[bus]:
+                from_bus = max(range(self.num_buses), key=lambda b: loads[b])
+                move(min(solution[from_bus], key=lambda x: friends_on(x, from_bus)), bus)
 
     def set_score(self):
         """
@@ -210,6 +683,316 @@ class Solver:
         pass
 
 
+################
+# Delta Scorer #
+################
+
+
+class Assignment:
+    """
+    Compact representation of a solution where vertices are ints (0 to n-1).
+
+    bus_of[v] is the bus of vertex v, buses[b] is the list of vertices on bus b and
+    position[v] is the index of v in buses[bus_of[v]]. This makes moving a vertex O(1)
+    since it is removed from its bus by swapping it with the last vertex of the bus.
+
+    NOTE: the order of vertices within a bus is NOT preserved by moves.
+    """
+
+    def __init__(self, num_vertices, num_buses):
+        self.bus_of = [-1] * num_vertices
+        self.position = [-1] * num_vertices
+        self.buses = [[] for _ in range(num_buses)]
+
+    @classmethod
+    def from_solution(cls, solution, index):
+        """
+        :param solution: list of lists (buses) of vertices.
+        :param index: dict (or list) of {vertex: int index of vertex}
+        :return: the Assignment obj of SOLUTION.
+        """
+        assignment = cls(len(index), len(solution))
+        for i in range(len(solution)):
+            for u in solution[i]:
+                assignment.add(index[u], i)
+        return assignment
+
+    def add(self, v, bus):
+        self.bus_of[v] = bus
+        self.position[v] = len(self.buses[bus])
+        self.buses[bus].append(v)
+
+    def remove(self, v):
+        bus = self.buses[self.bus_of[v]]
+        last = bus.pop()
+        if last != v:
+            bus[self.position[v]] = last
+            self.position[last] = self.position[v]
+        self.bus_of[v] = -1
+        self.position[v] = -1
+
+    def move(self, v, to_bus):
+        self.remove(v)
+        self.add(v, to_bus)
+
+    def to_solution(self, nodes=None):
+        """
+        :param nodes: list of vertex labels (indexed by the int vertices), defaults to the ints.
+        :return: the list of lists (buses) format of the solution.
+        """
+        if nodes is None:
+            return [bus[:] for bus in self.buses]
+        return [[nodes[v] for v in bus] for bus in self.buses]
+
+
+class DeltaScorer:
+    """
+    Stateful scoring object for a (valid) solution that gives the exact change in
+    score of a proposed move / swap without re-scoring the whole solution.
+
+    It keeps the number of valid friendships (edges) inside each bus and, for every
+    rowdy group, a count of its members on each bus. A rowdy group that is entirely on
+    one bus invalidates all of its members' edges (same rule as Solver.set_score).
+
+    Vertices are relabeled to ints (self.index) and the solution is kept as an
+    Assignment obj, so evaluating a move only costs time proportional to the moved
+    vertices' degree and rowdy group memberships (plus the members of rowdy groups
+    that the move completes or breaks up).
+
+    NOTE: This does NOT check bus capacities or empty buses, use Solver.set_score for that.
+    """
+
+    def __init__(self, instance, solution=None):
+        """
+        :param instance: the ProblemInstance obj of the input.
+        :param solution: list of lists (buses) of vertices.
+        """
+        self.nodes = instance.nodes
+        self.index = instance.vertex_index
+        self.adjacency = instance.adjacency
+        self.groups = instance.groups
+        self.vertex_groups = instance.vertex_groups
+        self.total_edges = instance.num_edges
+        self.load(solution if solution else [])
+
+    def load(self, solution):
+        """
+        (Re)builds the assignment and all of the counters for SOLUTION.
+        This is O(V + E + total constraint size).
+
+        :param solution: list of lists (buses) of vertices.
+        """
+        self.assignment = Assignment.from_solution(solution, self.index)
+        self.bus_of = self.assignment.bus_of
+
+        # group_counts[i] is a dict of {bus: number of rowdy group i's members on bus}.
+        self.group_counts = []
+        self.invalid_count = [0] * len(self.nodes)
+        for grp in self.groups:
+            counts = {}
+            for u in grp:
+                counts[self.bus_of[u]] = counts.get(self.bus_of[u], 0) + 1
+            self.group_counts.append(counts)
+            if len(counts) == 1:
+                for u in grp:
+                    self.invalid_count[u] += 1
+
+        self.bus_edges = [0] * len(solution)
+        for u in range(len(self.nodes)):
+            bus = self.bus_of[u]
+            if self.invalid_count[u] or bus < 0:
+                continue
+            for v in self.adjacency[u]:
+                if v >= u and self.bus_of[v] == bus and not self.invalid_count[v]:
+                    self.bus_edges[bus] += 1
+        self.edges = sum(self.bus_edges)
+
+    @property
+    def score(self):
+        return self.edges / self.total_edges
+
+    def _evaluate(self, moves):
+        """
+        Private method that computes the effect of MOVES without applying them.
+
+        :param moves: dict of {vertex index: destination bus}
+        :return: Tuple where el 0 is a dict of {bus: change in valid edges of bus},
+            el 1 is a dict of {rowdy group index: new group counts} and
+            el 2 is a dict of {vertex index: change in invalid count}.
+        """
+        bus_of = self.bus_of
+        invalid_count = self.invalid_count
+
+        new_group_counts = {}
+        for u, to_bus in moves.items():
+            from_bus = bus_of[u]
+            for i in self.vertex_groups[u]:
+                counts = new_group_counts.get(i)
+                if counts is None:
+                    counts = new_group_counts[i] = dict(self.group_counts[i])
+                counts[from_bus] -= 1
+                if not counts[from_bus]:
+                    del counts[from_bus]
+                counts[to_bus] = counts.get(to_bus, 0) + 1
+
+        # Rowdy groups that got completed / broken up change their members' validity.
+        invalid_delta = {}
+        for i, counts in new_group_counts.items():
+            was_whole = len(self.group_counts[i]) == 1
+            if was_whole != (len(counts) == 1):
+                for u in self.groups[i]:
+                    invalid_delta[u] = invalid_delta.get(u, 0) + (-1 if was_whole else 1)
+
+        # Only edges incident to a moved vertex or to a vertex whose validity changed can change.
+        affected = set(moves)
+        affected.update(invalid_delta)
+        bus_delta = {}
+        for u in affected:
+            old_bus_u = bus_of[u]
+            new_bus_u = moves.get(u, old_bus_u)
+            old_valid_u = not invalid_count[u]
+            new_valid_u = not (invalid_count[u] + invalid_delta.get(u, 0))
+            for v in self.adjacency[u]:
+                if v < u and v in affected:
+                    continue  # Edge is counted when processing v.
+                old_bus_v = bus_of[v]
+                if old_valid_u and old_bus_u == old_bus_v and not invalid_count[v]:
+                    bus_delta[old_bus_u] = bus_delta.get(old_bus_u, 0) - 1
+                if new_valid_u and new_bus_u == moves.get(v, old_bus_v) \
+                        and not (invalid_count[v] + invalid_delta.get(v, 0)):
+                    bus_delta[new_bus_u] = bus_delta.get(new_bus_u, 0) + 1
+        return bus_delta, new_group_counts, invalid_delta
+
+    @staticmethod
+    def _as_dict(moves):
+        return {u: to_bus for u, to_bus in moves if u is not None}
+
+    def delta(self, moves):
+        """
+        :param moves: iterable of (vertex index, destination bus) tuples. Vertices that
+            are None (empty seats) are ignored.
+        :return: (int) the exact change in the number of counted friendships if MOVES
+            were applied. So the score changes by DELTA / self.total_edges.
+        """
+        return sum(self._evaluate(self._as_dict(moves))[0].values())
+
+    def _changes_groups(self, vertex_1, vertex_2, bus1, bus2):
+        """
+        :return: True if swapping VERTEX_1 (in BUS1) and VERTEX_2 (in BUS2) can complete or break up
+            one of their rowdy groups.
+        """
+        for u, to_bus in ((vertex_1, bus2), (vertex_2, bus1)):
+            if u is None:
+                continue
+            for i in self.vertex_groups[u]:
+                counts = self.group_counts[i]
+                if len(counts) == 1 or counts.get(to_bus, 0) + 1 >= len(self.groups[i]):
+                    return True
+        return False
+
+    def swap_delta(self, vertex_1, vertex_2, bus1, bus2):
+        """
+        Same as self.delta(self.swap_moves(VERTEX_1, VERTEX_2, BUS1, BUS2)), but when the swap can't
+        complete or break up a rowdy group (the common case) it only counts the moved vertices'
+        friends on both buses, without building any move / counter dicts.
+        """
+        if self._changes_groups(vertex_1, vertex_2, bus1, bus2):
+            return self.delta(self.swap_moves(vertex_1, vertex_2, bus1, bus2))
+
+        bus_of = self.bus_of
+        invalid_count = self.invalid_count
+        delta = 0
+        for u, from_bus, to_bus in ((vertex_1, bus1, bus2), (vertex_2, bus2, bus1)):
+            if u is None or invalid_count[u]:
+                continue
+            for v in self.adjacency[u]:
+                # The swapped vertices stay on different buses, and a self loop stays on its bus.
+                if v == vertex_1 or v == vertex_2 or invalid_count[v]:
+                    continue
+                if bus_of[v] == from_bus:
+                    delta -= 1
+                elif bus_of[v] == to_bus:
+                    delta += 1
+        return delta
+
+    def score_after(self, moves):
+        """
+        :param moves: iterable of (vertex index, destination bus) tuples.
+        :return: the score (same value as Solver.set_score) if MOVES were applied.
+        """
+        return (self.edges + self.delta(moves)) / self.total_edges
+
+    def apply(self, moves):
+        """
+        Applies MOVES to self.assignment and updates all of the counters.
+
+        :param moves: iterable of (vertex index, destination bus) tuples.
+        :return: the new score.
+        """
+        moves = self._as_dict(moves)
+        bus_delta, new_group_counts, invalid_delta = self._evaluate(moves)
+        for u, to_bus in moves.items():
+            self.assignment.move(u, to_bus)
+        for i, counts in new_group_counts.items():
+            self.group_counts[i] = counts
+        for u, d in invalid_delta.items():
+            self.invalid_count[u] += d
+        for bus, d in bus_delta.items():
+            self.bus_edges[bus] += d
+            self.edges += d
+        return self.score
+
+    def apply_swap(self, vertex_1, vertex_2, bus1, bus2):
+        """
+        Same as self.apply(self.swap_moves(VERTEX_1, VERTEX_2, BUS1, BUS2)), with the fast path of
+        swap_delta: when the swap can't complete or break up a rowdy group, the moved vertices'
+        friends on both buses are counted and the group counts are updated in place.
+
+        :return: the new score.
+        """
+        if self._changes_groups(vertex_1, vertex_2, bus1, bus2):
+            return self.apply(self.swap_moves(vertex_1, vertex_2, bus1, bus2))
+
+        bus_of = self.bus_of
+        invalid_count = self.invalid_count
+        bus_edges = self.bus_edges
+        for u, from_bus, to_bus in ((vertex_1, bus1, bus2), (vertex_2, bus2, bus1)):
+            if u is None or invalid_count[u]:
+                continue
+            for v in self.adjacency[u]:
+                if v == u:
+                    bus_edges[from_bus] -= 1  # A self loop moves with U.
+                    bus_edges[to_bus] += 1
+                    continue
+                if v == vertex_1 or v == vertex_2 or invalid_count[v]:
+                    continue
+                if bus_of[v] == from_bus:
+                    bus_edges[from_bus] -= 1
+                    self.edges -= 1
+                elif bus_of[v] == to_bus:
+                    bus_edges[to_bus] += 1
+                    self.edges += 1
+        for u, from_bus, to_bus in ((vertex_1, bus1, bus2), (vertex_2, bus2, bus1)):
+            if u is None:
+                continue
+            for i in self.vertex_groups[u]:
+                counts = self.group_counts[i]
+                counts[from_bus] -= 1
+                if not counts[from_bus]:
+                    del counts[from_bus]
+                counts[to_bus] = counts.get(to_bus, 0) + 1
+            self.assignment.move(u, to_bus)
+        return self.score
+
+    @staticmethod
+    def swap_moves(vertex_1, vertex_2, bus1, bus2):
+        """
+        :return: the moves of swapping VERTEX_1 (in BUS1) and VERTEX_2 (in BUS2).
+            Either vertex can be None (an empty seat).
+        """
+        return [(vertex_1, bus2), (vertex_2, bus1)]
+
+
 ####################
 # Heuristic Solver #
 ####################
@@ -217,37 +1000,75 @@ class Solver:
 
 class HeuristicPriorityQueue:
     """
-    Special (inefficient) 'priority queue' for the heuristic solver. Queue is used for
+    Special 'priority queue' for the heuristic solver. Queue is used for
     processing the order in which students are added to buses.
 
-    Its a queue to fit the class code/structure, but really this is more like a
-    generator.
+    Its a queue to fit the class code/structure (popleft gives the next student),
+    but the students are ranked by a heap with lazily invalidated entries. A student's
+    rank is the max of its row in the solver's friends_in_bus matrix, which is updated
+    when one of its friends gets placed.
+
+    NOTE: The next student is ranked when the current one is popped, so the rank
+    does not account for the popped student (it has not been placed yet).
     """
 
     def __init__(self, solver, iterable=None, ranked="potential_friends"):
         self.solver = solver
         self.rank = ranked.upper()
-        self.set = set(iterable) if iterable else set()
+        if self.rank != "POTENTIAL_FRIENDS":
+            raise ValueError(f"{self.rank} is unsupported rank scheme for {self}")
+        self.set = set()
+        self.heap = []
+        self.weight = {}
+        # Ties are broken by graph order (this is the set order for ints, i.e. CompactGraphs).
+        self.order = solver.vertex_index
+        self.placed = None
         self.nxt = None
+        for x in (iterable if iterable else []):
+            self.appendleft(x)
         self._rank()
 
     def __repr__(self):
         return f"<HeuristicQueue> set: {self.set}"
 
     def __bool__(self):
-        return bool(len(self.set) > 0 or self.nxt)
+        return bool(len(self.set) > 0 or self.nxt is not None)
 
     def clear(self):
         self.set.clear()
+        self.heap.clear()
+        self.weight.clear()
 
     def append(self, x):
         self.appendleft(x)
 
     def appendleft(self, x):
+        if x in self.set:
+            return
         self.set.add(x)
+        self.weight[x] = int(self.solver.friends_in_bus[self.solver.vertex_index[x]].max(initial=0))
+        heapq.heappush(self.heap, (self.weight[x], self.order[x], x))
 
     def remove(self, x):
         self.set.remove(x)
+        del self.weight[x]
+
+    def _update(self):
+        """ Private method to account for the last popped student, which has been placed since. """
+        u = self.placed
+        self.placed = None
+        if u is None:
+            return
+        bus_num = next((i for i in range(len(self.solver.solution_set_rep))
+                        if u in self.solver.solution_set_rep[i]), None)
+        if bus_num is None:
+            return
+        for w in self.solver.graph.neighbors(u):
+            if w in self.set:
+                friend_count = self.solver.friends_on_bus(bus_num, w)
+                if friend_count > self.weight[w]:
+                    self.weight[w] = int(friend_count)
+                    heapq.heappush(self.heap, (self.weight[w], self.order[w], w))
 
     def _rank(self):
         """ Private method to rank elements in the 'queue'
@@ -257,31 +1078,18 @@ class HeuristicPriorityQueue:
             friends (edge) each student could possibly add to the score
             in 1 time step (disregarding rowdy groups for simplicity).
         """
-        if self.rank == "POTENTIAL_FRIENDS":
-            min_el = (math.inf, None)
-            for u in self.set:
-                u_friends = set(self.solver.graph.neighbors(u))
-                weight = 0
-                for bus in self.solver.solution:
-                    friend_count = 0
-                    for v in bus:
-                        if v in u_friends:
-                            friend_count += 1
-                    weight = max(weight, friend_count)
-                if weight < min_el[0]:
-                    min_el = (weight, u)
-            self.set.remove(min_el[1])
-            self.nxt = min_el[1]
-        else:
-            raise ValueError(f"{self.rank} is unsupported rank scheme for {self}")
+        self._update()
+        while self.heap:
+            weight, _, u = heapq.heappop(self.heap)
+            # Stale entries are skipped (weights only increase, so the current entry is pushed later).
+            if u in self.set and self.weight[u] == weight:
+                self.remove(u)
+                self.nxt = u
+                return
+        self.nxt = None
 
     def pop(self):
-        to_be_returned = self.nxt
-        if self.set:
-            self._rank()
-        else:
-            self.nxt = None
-        return to_be_returned
+        return self.popleft()
 
     def popleft(self):
         to_be_returned = self.nxt
@@ -289,6 +1097,7 @@ class HeuristicPriorityQueue:
             self._rank()
         else:
             self.nxt = None
+        self.placed = to_be_returned
         return to_be_returned
 
 
@@ -303,12 +1112,31 @@ class Heuristic(Solver):
         "PRIO_QUEUE"
     ]
 
-    def __init__(self, graph, num_buses, bus_size, constraints):
-        Solver.__init__(self, graph, num_buses, bus_size, constraints)
+    def __init__(self, graph, num_buses, bus_size, constraints, instance=None):
+        Solver.__init__(self, graph, num_buses, bus_size, constraints, instance=instance)
         self.solution = [[] for _ in range(self.num_buses)]
         self.solution_set_rep = np.array([set() for _ in range(self.num_buses)])
+        self.bus_position = {}  # Index of each placed student in its bus (list) of self.solution
         self.process_queue = deque()
 
+        # friends_in_bus[v, b] is the number of friends of student (index) v that are on bus b.
+        self.vertex_index = self.instance.vertex_index
+        self.neighbor_indices = self.instance.neighbor_indices
+        self.friends_in_bus = np.zeros((len(self.instance.nodes), self.num_buses), dtype=np.int32)
+
+        # rowdy_in_bus[i, b] is the number of members of rowdy group i that are on bus b.
+        self.rowdy_in_bus = np.zeros((len(self.constraints), self.num_buses), dtype=np.int32)
+        self.rowdy_sizes = self.instance.rowdy_sizes
+        self.rowdy_indices = self.instance.rowdy_indices
+        self.rowdy_multiplicities = self.instance.rowdy_multiplicities
+        self.bus_loads = np.zeros(self.num_buses, dtype=np.int64)
+
+    def friends_on_bus(self, bus_num, target):
+        """
+        :return: (int) number of friends of TARGET on bus number: BUS_NUM (a lookup in self.friends_in_bus)
+        """
+        return self.friends_in_bus[self.vertex_index[target], bus_num]
+
     def set_process_queue(self, kind="LOW_DEGREE"):
         """
         Method to set the process set of heuristic solvers.
@@ -322,36 +1150,37 @@ class Heuristic(Solver):
         kind = kind.upper()
         self.process_queue.clear()
         if kind == "LOW_DEGREE":
-            for node in sorted(self.graph.degree, key=lambda x: x[1]):
-                self.process_queue.append(node[0])
+            self.process_queue.extend(self.instance.low_degree_order)
         elif kind == "HIGH_DEGREE":
-            for node in sorted(self.graph.degree, key=lambda x: x[1], reverse=True):
-                self.process_queue.append(node[0])
+            self.process_queue.extend(self.instance.high_degree_order)
         elif kind == "PRIO_QUEUE":
-            self.process_queue = HeuristicPriorityQueue(self, self.graph.nodes)
+            self.process_queue = HeuristicPriorityQueue(self, self.graph.nodes())
         return self.process_queue
 
     def heuristic(self, bus_num, target):
         """
-        This 'heuristic' should NOT be use.
-        This is only used for development reasons.
-
-        Heuristic is number of friends (of target) in bus number: BUS_NUM
+        Heuristic of TARGET for the single bus number: BUS_NUM (see self.heuristics).
 
         :param target: current node being processed
         :param bus_num: the heuristic for the current buss being processed
         :return: (float) heuristic value
         """
-        bus_set_rep = self.solution_set_rep[bus_num]
+        return self.heuristics(target, np.array([bus_num]))[0]
+
+    def heuristics(self, target, buses):
+        """
+        This 'heuristic' should NOT be use.
+        This is only used for development reasons.
 
-        if len(bus_set_rep) == self.bus_size:
-            return -1
+        Heuristic is number of friends (of target) in each bus of BUSES
 
-        count = 0
-        for v in self.graph.neighbors(target):
-            if v in bus_set_rep:
-                count += 1
-        return count
+        :param target: current node being processed
+        :param buses: (NumPy array) of the bus numbers being considered.
+        :return: (NumPy array) heuristic value of each bus in BUSES
+        """
+        values = self.friends_in_bus[self.vertex_index[target], buses].astype(np.float64)
+        values[self.bus_loads[buses] == self.bus_size] = -1
+        return values
 
     # noinspection PyMethodMayBeStatic
     def heuristic_tie_breaker(self, target, candidates):
@@ -370,32 +1199,47 @@ class Heuristic(Solver):
         :param possible_buses: all buses to consider.
         :return: bus with the highest heuristic value.
         """
-        candidate_buses = []
-        highest_heuristic = -1
-        for bus_num in possible_buses:
-            heuristic = self.heuristic(bus_num, target)
-            if heuristic > highest_heuristic:
-                candidate_buses = [bus_num]
-                highest_heuristic = heuristic
-            elif heuristic == highest_heuristic:
-                candidate_buses.append(bus_num)
+        possible_buses = np.fromiter(possible_buses, dtype=np.int64)
+        heuristics = self.heuristics(target, possible_buses)
+        candidate_buses = possible_buses[heuristics == heuristics.max()]
 
         if len(candidate_buses) == 1:
-            return candidate_buses[0]
-        return self.heuristic_tie_breaker(target, candidate_buses)
+            return int(candidate_buses[0])
+        return self.heuristic_tie_breaker(target, candidate_buses.tolist())
+
+    def place_student(self, v, bus_index):
+        """
+        Add a (not yet placed) student to a bus in self.solution
+
+        :param v: student (vertex) being placed
+        :param bus_index: add to this bus (this is an index)
+        """
+        self.bus_position[v] = len(self.solution[bus_index])
+        self.solution[bus_index].append(v)
+        self.solution_set_rep[bus_index].add(v)
+        self.friends_in_bus[self.neighbor_indices[self.vertex_index[v]], bus_index] += 1
+        self.rowdy_in_bus[self.rowdy_indices[v], bus_index] += self.rowdy_multiplicities[v]
+        self.bus_loads[bus_index] += 1
 
     def move_student(self, v, from_bus_index, to_bus_index):
         """
-        Move a student from one bus to another in self.solution
+        Move a student from one bus to another in self.solution.
+        This is O(1), the student is swapped with the last student of its bus before being removed.
 
         :param v: student (vertex) being moves
         :param from_bus_index: remove from this bus (this is an index)
         :param to_bus_index: add to this bus (this is an index)
         """
-        self.solution[from_bus_index].remove(v)
+        from_bus = self.solution[from_bus_index]
+        last = from_bus.pop()
+        if last != v:
+            from_bus[self.bus_position[v]] = last
+            self.bus_position[last] = self.bus_position[v]
         self.solution_set_rep[from_bus_index].remove(v)
-        self.solution[to_bus_index].append(v)
-        self.solution_set_rep[to_bus_index].add(v)
+        self.friends_in_bus[self.neighbor_indices[self.vertex_index[v]], from_bus_index] -= 1
+        self.rowdy_in_bus[self.rowdy_indices[v], from_bus_index] -= self.rowdy_multiplicities[v]
+        self.bus_loads[from_bus_index] -= 1
+        self.place_student(v, to_bus_index)
 
     def check_and_correct_nonempty_buses(self):
         """
@@ -438,8 +1282,7 @@ class Heuristic(Solver):
 
             dest_bus = self.process_heuristic(target, range(self.num_buses))
 
-            self.solution[dest_bus].append(target)
-            self.solution_set_rep[dest_bus].add(target)
+            self.place_student(target, dest_bus)
 
         return self.check_and_correct_nonempty_buses()
 
@@ -451,10 +1294,13 @@ class DiracDeltaHeuristicBase(Heuristic):
     """
 
     sig = 0.1
+    phi_tables = {}  # Cache of the phi lookup tables, see DiracDeltaHeuristicBase.phi_table
 
-    def __init__(self, graph, num_buses, bus_size, constraints):
-        Heuristic.__init__(self, graph, num_buses, bus_size, constraints)
+    def __init__(self, graph, num_buses, bus_size, constraints, instance=None):
+        Heuristic.__init__(self, graph, num_buses, bus_size, constraints, instance=instance)
         self.phi_constant = 1e6
+        self.max_rowdy_size = self.instance.max_rowdy_size
+        self.phi_lookup = DiracDeltaHeuristicBase.phi_table(self.max_rowdy_size, self.phi_constant)
 
     @staticmethod
     def phi(x, rowdy_size, c=1.0):
@@ -473,53 +1319,64 @@ class DiracDeltaHeuristicBase(Heuristic):
         denominator = DiracDeltaHeuristicBase.sig * np.sqrt(2 * np.pi)
         return (numerator / denominator) * c
 
-    def people_on_bus_count(self, bus_num, group):
-        """
-        Counts the number of people of GROUP that are in bus number: BUS_NUM
-
-        :param bus_num: (int) the bus number in self.solution
-            this is b in the design doc.
-        :param group: (iterable) the group being counted
-            this is g or i's neighbors
-        :return: (int) the count.
+    @staticmethod
+    def phi_table(max_rowdy_size, c=1.0):
         """
-        bus_set_rep = self.solution_set_rep[bus_num]
-        if bus_set_rep == set():
-            return 0
+        Static Method for the lookup table of phi. It is built once per (sig, C, MAX_ROWDY_SIZE).
 
-        count = 0
-        for v in group:
-            if v in bus_set_rep:
-                count += 1
-        return count
+        phi only depends on x - rowdy_size, which is between -(MAX_ROWDY_SIZE - 1) and 1 since
+        x <= |g| and rowdy_size = |g| - 1 in the heuristic. So phi(x, rowdy_size, c) is
+        table[x - rowdy_size + MAX_ROWDY_SIZE - 1] (values are exactly the same as phi's).
 
-    def heuristic(self, bus_num, target):
+        :param max_rowdy_size: Size of the biggest rowdy group.
+        :param c: same as phi's C.
+        :return: read-only (NumPy array) table.
         """
-        The heuristic. (overrides inherited heuristic)
+        key = (DiracDeltaHeuristicBase.sig, c, max_rowdy_size)
+        if key not in DiracDeltaHeuristicBase.phi_tables:
+            table = np.array([DiracDeltaHeuristicBase.phi(d, 0, c) for d in range(1 - max_rowdy_size, 2)])
+            table.setflags(write=False)
+            DiracDeltaHeuristicBase.phi_tables[key] = table
+        return DiracDeltaHeuristicBase.phi_tables[key]
+
+    def dirac_delta_heuristics(self, target, buses):
+        """
+        The heuristic of TARGET for all of BUSES at once.
             This is H(.,.) in the design doc
 
-        NOTE: This heuristic returns -1 if bus number: BUS_NUM is full.
+        NOTE: This does NOT account for bus capacity.
 
         :param target: current node being processed
-        :param bus_num: the heuristic for the current buss being processed
-        :return: (float) heuristic value
+        :param buses: (NumPy array) of the bus numbers being considered.
+        :return: (NumPy array) heuristic value of each bus in BUSES
         """
-        if len(self.solution[bus_num]) == self.bus_size:
-            return -1
-
         # numerator calculation
-        numerator = self.people_on_bus_count(bus_num, self.graph.neighbors(target)) + 1
-
-        # denominator calculation
-        max_val = 0
-        target_rowdy_groups = (self.constraints[i] for i in self.node_to_rowdy_index_dict[target])
-        for grp in target_rowdy_groups:
-            r = self.people_on_bus_count(bus_num, grp)
-            phi = DiracDeltaHeuristicBase.phi(r, len(grp) - 1, self.phi_constant)
-            max_val = max(max_val, phi)
-        denominator = max_val + 1
+        numerator = self.friends_in_bus[self.vertex_index[target], buses] + 1
+
+        # denominator calculation (max over the target's rowdy groups)
+        rowdy_indices = self.rowdy_indices[target]
+        if not len(rowdy_indices):
+            return numerator / 1  # No rowdy groups, so the denominator is 1
+        r = self.rowdy_in_bus[rowdy_indices][:, buses]
+        # phi(r, |g| - 1) from the lookup table (see DiracDeltaHeuristicBase.phi_table)
+        phi = self.phi_lookup[r - self.rowdy_sizes[rowdy_indices, np.newaxis] + self.max_rowdy_size]
+        denominator = phi.max(axis=0) + 1
         return numerator / denominator
 
+    def heuristics(self, target, buses):
+        """
+        The heuristic. (overrides inherited heuristics)
+
+        NOTE: This heuristic is -1 for the buses that are full.
+
+        :param target: current node being processed
+        :param buses: (NumPy array) of the bus numbers being considered.
+        :return: (NumPy array) heuristic value of each bus in BUSES
+        """
+        values = self.dirac_delta_heuristics(target, buses)
+        values[self.bus_loads[buses] == self.bus_size] = -1
+        return values
+
 
 class DDHeuristicTieBreakers(DiracDeltaHeuristicBase):
     """
@@ -535,35 +1392,26 @@ class DDHeuristicTieBreakers(DiracDeltaHeuristicBase):
         "DEFAULT"
     ]
 
-    def __init__(self, graph, num_buses, bus_size, constraints, tie_break="MOST_FRIENDS"):
-        DiracDeltaHeuristicBase.__init__(self, graph, num_buses, bus_size, constraints)
+    def __init__(self, graph, num_buses, bus_size, constraints, tie_break="MOST_FRIENDS", instance=None):
+        DiracDeltaHeuristicBase.__init__(self, graph, num_buses, bus_size, constraints, instance=instance)
         self.tie_break = tie_break.upper()
 
-    def breaker_heuristic(self, bus_num, target):
+    def breaker_heuristics(self, target, buses):
         """
         Heuristic for the deterministic heuristic_tie_breaker of the solve method.
 
-        Logic: N = friends of TARGET in bus number: BUS_NUM.
+        Logic: N = friends of TARGET in the bus.
                D = Sum r_i; Let i = Constraint group index of TARGET
                             Have r_i = 1 if any member of constraint group
                             i is in the bus. r_i = 0 otherwise.
                Heuristic is then (N+1)/(D+1) (+1 for 0s error).
 
-        :param bus_num: the bus number considered.
         :param target: the person being processed.
-        :return: Heuristic value described above.
+        :param buses: (NumPy array) of the bus numbers considered.
+        :return: (NumPy array) Heuristic value described above for each bus in BUSES.
         """
-        bus_members = set(self.solution[bus_num])
-        numerator = self.people_on_bus_count(bus_num, self.graph.neighbors(target))
-
-        rowdy_group_indices = self.node_to_rowdy_index_dict[target]
-        denominator = 0
-        for i in rowdy_group_indices:
-            for v in self.constraints[i]:
-                if v in bus_members:
-                    denominator += 1
-                    break
-
+        numerator = self.friends_in_bus[self.vertex_index[target], buses]
+        denominator = np.count_nonzero(self.rowdy_in_bus[self.rowdy_indices[target]][:, buses], axis=0)
         return (numerator + 1) / (denominator + 1)
 
     def heuristic_tie_breaker(self, target, candidates, tie_break=None):
@@ -580,18 +1428,11 @@ class DDHeuristicTieBreakers(DiracDeltaHeuristicBase):
         elif tie_break == "MOST_FULL":
             return max(candidates, key=lambda i: len(self.solution[i]))
         elif tie_break == "MOST_FRIENDS":
-            target_friends = self.graph.neighbors(target)
-            return max(candidates, key=lambda i: self.people_on_bus_count(i, target_friends))
+            return max(candidates, key=lambda i: self.friends_on_bus(i, target))
         elif tie_break == "HEURISTIC":
-            lst = []
-            highest_heuristic = -1
-            for bus_num in candidates:
-                heuristic = self.breaker_heuristic(bus_num, target)
-                if heuristic > highest_heuristic:
-                    lst = [bus_num]
-                    highest_heuristic = heuristic
-                elif heuristic == highest_heuristic:
-                    lst.append(bus_num)
+            candidates = np.array(candidates)
+            heuristics = self.breaker_heuristics(target, candidates)
+            lst = candidates[heuristics == heuristics.max()].tolist()
             if len(lst) > 1:
                 return self.heuristic_tie_breaker(target, lst, tie_break="LEAST_FULL")
             return lst[0]
@@ -607,27 +1448,16 @@ class DDHeuristicOversizeCorrection(DDHeuristicTieBreakers):
     greedily corrects this using this classes heuristic.
     """
 
-    def heuristic(self, bus_num, target):
+    def heuristics(self, target, buses):
         """
-        The heuristic. (overrides inherited heuristic)
-            This is H(.,.) in the design doc
+        The heuristic. (overrides inherited heuristics)
+            Buses are allowed to go over capacity.
 
         :param target: current node being processed
-        :param bus_num: the heuristic for the current buss being processed
-        :return: (float) heuristic value
+        :param buses: (NumPy array) of the bus numbers being considered.
+        :return: (NumPy array) heuristic value of each bus in BUSES
         """
-        # numerator calculation
-        numerator = self.people_on_bus_count(bus_num, self.graph.neighbors(target)) + 1
-
-        # denominator calculation
-        max_val = 0
-        target_rowdy_groups = (self.constraints[i] for i in self.node_to_rowdy_index_dict[target])
-        for grp in target_rowdy_groups:
-            r = self.people_on_bus_count(bus_num, grp)
-            phi = DiracDeltaHeuristicBase.phi(r, len(grp) - 1, self.phi_constant)
-            max_val = max(max_val, phi)
-        denominator = max_val + 1
-        return numerator / denominator
+        return self.dirac_delta_heuristics(target, buses)
 
     def solve(self, process_order=None):
         """
@@ -645,8 +1475,7 @@ class DDHeuristicOversizeCorrection(DDHeuristicTieBreakers):
 
             dest_bus = self.process_heuristic(target, range(self.num_buses))
 
-            self.solution[dest_bus].append(target)
-            self.solution_set_rep[dest_bus].add(target)
+            self.place_student(target, dest_bus)
 
         # Greedily correct for over-capacity buses using the class's heuristic. (Makes it slower)
         over_cap_buses = set(i for i in range(self.num_buses) if len(self.solution[i]) > self.bus_size)
@@ -657,7 +1486,7 @@ class DDHeuristicOversizeCorrection(DDHeuristicTieBreakers):
             for bus_num in over_cap_buses:
                 invalid_students_count = len(self.solution[bus_num]) - self.bus_size
                 invalid_students = sorted(self.solution[bus_num],
-                                          key=lambda u: self.people_on_bus_count(bus_num, self.graph.neighbors(u)),
+                                          key=lambda u: self.friends_on_bus(bus_num, u),
                                           reverse=True)[:invalid_students_count]
                 to_be_removed.extend((u, bus_num) for u in invalid_students)
             for u, bus_num in to_be_removed:
@@ -674,72 +1503,127 @@ class DDHeuristicOversizeCorrection(DDHeuristicTieBreakers):
 #############
 
 
-class Optimizer(Solver):
+def out_of_time(deadline):
+    """
+    :param deadline: time.time() at which the caller has to stop, or None (no time limit).
+    :return: True if DEADLINE has passed.
+    """
+    return deadline is not None and time.time() >= deadline
 
-    def __init__(self, graph, num_buses, bus_size, constraints, solution):
-        Solver.__init__(self, graph, num_buses, bus_size, constraints, solution=solution)
 
-    def solve(self):
-        if not hasattr(self, "verbose") or not hasattr(self, 'optimize'):
-            raise AttributeError(f"{self} obj doesn't have necessary instance attributes.")
-        if self.num_buses == 1:
-            if self.verbose:
-                sys.stdout.write(f"\r\tDid NOT optimize {' ' * 30}")
-                sys.stdout.flush()
-                print("")
-            return
-        self.optimize()
-        return self.solution
+class MoveJournal:
+    """
+    Log of the swaps applied to an optimizer's solution. Rejected swaps are undone
+    by rolling back the log (in reverse order) instead of restoring a copy of the
+    whole solution, so a rejection costs O(number of swaps) instead of O(V).
+    """
 
-    def remove_vertex(self, vertex, bus):
-        # get the bus
-        temp_list = self.solution[bus]
-        left_hand_list = []
-        right_hand_list = []
-        seen_element = False
-        for element in temp_list:
-            if element == vertex:
-                continue
-            elif seen_element:
-                right_hand_list += [element]
-            else:
-                left_hand_list += [element]
-        self.solution[bus] = left_hand_list + right_hand_list
+    def __init__(self):
+        self.entries = []
+
+    def __len__(self):
+        return len(self.entries)
+
+    def record(self, vertex_1, vertex_2, bus1, bus2):
+        self.entries.append((vertex_1, vertex_2, bus1, bus2))
+
+    def mark(self):
+        """
+        :return: a checkpoint that can be given to self.rollback
+        """
+        return len(self.entries)
+
+    def commit(self):
+        """ Keep all of the logged swaps (forgets them). """
+        self.entries.clear()
+
+    def rollback(self, optimizer, mark=0):
+        """
+        Undo all of the swaps logged after MARK on OPTIMIZER.
+
+        :param optimizer: the Optimizer obj that the swaps were applied to.
+        :param mark: checkpoint from self.mark, defaults to undoing everything.
+        """
+        while len(self.entries) > mark:
+            vertex_1, vertex_2, bus1, bus2 = self.entries.pop()
+            optimizer.move_vertices(vertex_1, vertex_2, bus2, bus1, record=False)
+
+
+class Optimizer(Solver):
+    """
+    Base class of the optimizers. The solution is kept as an Assignment obj (of vertex
+    indices) inside of self.scorer, self.solution is a read-only snapshot of it.
+    """
+
+    def __init__(self, graph, num_buses, bus_size, constraints, solution, instance=None):
+        instance = instance if instance else ProblemInstance(graph, num_buses, bus_size, constraints)
+        self.scorer = DeltaScorer(instance)
+        Solver.__init__(self, graph, num_buses, bus_size, constraints, solution=solution, instance=instance)
+        self.journal = MoveJournal()
+
+    @property
+    def solution(self):
+        """
+        NOTE: unlike Solver.solution, this is built from self.scorer on every access (O(V)), so
+        callers that read it more than once should keep it in a local variable. It is made of
+        tuples so that it can't be changed in place, the solution only changes through
+        self.move_vertices or by assigning a new solution to self.solution.
+
+        :return: (tuple) snapshot of the current solution, a tuple of buses (tuples of vertices).
+        """
+        return tuple(map(tuple, self.scorer.assignment.to_solution(self.scorer.nodes)))
+
+    @solution.setter
+    def solution(self, solution):
+        self.scorer.load(solution)
+
+    def solve(self):
+        if not hasattr(self, "verbose") or not hasattr(self, 'optimize'):
+            raise AttributeError(f"{self} obj doesn't have necessary instance attributes.")
+        if self.num_buses == 1:
+            if self.verbose:
+                sys.stdout.write(f"\r\tDid NOT optimize {' ' * 30}")
+                sys.stdout.flush()
+                print("")
+            return
+        self.optimize()
+        return self.solution
+
+    def move_vertices(self, vertex_1, vertex_2, bus1, bus2, record=True):
+        """
+        Swaps VERTEX_1 (in BUS1) and VERTEX_2 (in BUS2) in self.scorer. Either vertex
+        (index) can be None (an empty seat).
+
+        :param record: log the swap in self.journal so that it can be rolled back.
+        """
+        self.scorer.apply_swap(vertex_1, vertex_2, bus1, bus2)
+        if record:
+            self.journal.record(vertex_1, vertex_2, bus1, bus2)
 
     def swap(self, vertex_1, vertex_2, bus1, bus2, score):
-        # to hold the place of the old solution before swapping
-        holder_solution = copy.deepcopy(self.solution)
-
-        # Swap the vertices in the new solution
-        # First remove the vertices from their buses
-        self.remove_vertex(vertex_1, bus1)
-        self.remove_vertex(vertex_2, bus2)
-        # Add the vertices to the opposite bus
-        if vertex_2 is not None:
-            self.solution[bus1] += [vertex_2]
-        if vertex_1 is not None:
-            self.solution[bus2] += [vertex_1]
-        # Recompute the score
-        new_score = self.set_score()[0]
+        # Score the swap before touching the solution so rejected swaps cost nothing.
+        scorer = self.scorer
+        new_score = (scorer.edges + scorer.swap_delta(vertex_1, vertex_2, bus1, bus2)) / scorer.total_edges
         # return the new score if it is larger and update the solution
         if new_score >= score:
-            return new_score  # We have already updated the solution by removing the vertices
+            self.move_vertices(vertex_1, vertex_2, bus1, bus2, record=False)
+            return new_score
         else:
-            self.solution = holder_solution
             return score
 
     def sample_swap(self):
         # Pick two random buses and one random vertex from each bus to swap
         counter = 0
 
-        viable_buses = [i for i in range(self.num_buses) if len(self.solution[i]) > 1]
+        buses = self.scorer.assignment.buses
+        viable_buses = [i for i in range(self.num_buses) if len(buses[i]) > 1]
         if len(viable_buses) < 2:
             return None, None, None, None
 
         bus1, bus2 = np.random.choice(viable_buses, 2, replace=False)
 
         # Sample a vertex from each bus
-        open_seats1 = self.bus_size - len(self.solution[bus1])
+        open_seats1 = self.bus_size - len(buses[bus1])
         # Determine if we select an empty seat or not
         choose_empty_seat = np.random.binomial(1, open_seats1 / self.bus_size)
 
@@ -747,31 +1631,36 @@ class Optimizer(Solver):
         if choose_empty_seat:
             student_1 = None
         else:
-            student_1 = np.random.choice(self.solution[bus1])
+            student_1 = buses[bus1][np.random.randint(len(buses[bus1]))]
 
         # Choose a second student with the requirement that we not try to swap two empty seats
         if student_1 is None:
             # student_2 cannot be none
-            student_2 = np.random.choice(self.solution[bus2])
+            student_2 = buses[bus2][np.random.randint(len(buses[bus2]))]
         else:
-            open_seats2 = self.bus_size - len(self.solution[bus2])
+            open_seats2 = self.bus_size - len(buses[bus2])
             choose_empty_seat = np.random.binomial(1, open_seats2 / self.bus_size)
 
-            student_2 = None if choose_empty_seat else np.random.choice(self.solution[bus2])
+            student_2 = None if choose_empty_seat else buses[bus2][np.random.randint(len(buses[bus2]))]
 
         return student_1, student_2, bus1, bus2
 
 
 class BasicOptimizer(Optimizer):
     def __init__(self, graph, num_buses, bus_size, constraints, solution, sample_size=100, verbose=False,
-                 early_termination=True):
-        Optimizer.__init__(self, graph, num_buses, bus_size, constraints, solution)
+                 early_termination=True, time_limit=None, instance=None):
+        """
+        :param time_limit: stop after this many seconds (wall-clock), checked before every sampled swap.
+        """
+        Optimizer.__init__(self, graph, num_buses, bus_size, constraints, solution, instance=instance)
         self.sample_size = sample_size
         self.verbose = verbose
         self.early_termination = early_termination
+        self.time_limit = time_limit
 
     # Call this method to optimize the solution we are given for a specific score
     def optimize(self, max_iterations=1000):  # Initialize the score
+        deadline = time.time() + self.time_limit if self.time_limit is not None else None
         score = self.set_score()[0]
         last_iter_score = score
         # If we don't have two buses no swapping will occur
@@ -786,6 +1675,8 @@ class BasicOptimizer(Optimizer):
             last_iter_score = score
             # If we have monte_carlo set to true we will sample the optimization space
             for sample in range(self.sample_size):
+                if out_of_time(deadline):
+                    break
                 # Sample a number of vertex combinations to try swapping
                 student_1, student_2, bus1, bus2 = self.sample_swap()
                 if student_1 is None and student_2 is None and bus1 is None and bus2 is None:
@@ -797,7 +1688,7 @@ class BasicOptimizer(Optimizer):
                 sys.stdout.write(f"\r\tScore on iteration {i} of BasicOptimizer: "
                                  f"{round(score, 5)} {' ' * 30}")
                 sys.stdout.flush()
-            if score == last_iter_score and self.early_termination:
+            if (score == last_iter_score and self.early_termination) or out_of_time(deadline):
                 if self.verbose:
                     sys.stdout.write(f"\r\tStopped BasicOptimizer on iteration {i} {' ' * 30}")
                     sys.stdout.flush()
@@ -810,30 +1701,36 @@ class BasicOptimizer(Optimizer):
 class TreeSearchOptimizer(Optimizer):
 
     def __init__(self, graph, num_buses, bus_size, constraints, solution, sample_size=100, max_rollout=5,
-                 verbose=False, early_termination=True):
-        Solver.__init__(self, graph, num_buses, bus_size, constraints, solution)
+                 verbose=False, early_termination=True, batch_size=1, processes=None, chunk_size=100,
+                 time_limit=None, instance=None):
+        """
+        :param batch_size: number of rollouts (from the same solution) per batch, only the best rollout
+            of a batch is kept (if it is not worse). A batch size of 1 keeps each rollout that isn't worse.
+            Only used without worker processes.
+        :param processes: number of worker processes. Each of them runs chunks of chunk_size rollouts
+            from the same solution, keeping each rollout that isn't worse (like the sequential loop),
+            and the best worker's chunk is kept. The rollouts are run in this process if it is None or 1.
+        :param chunk_size: number of rollouts that each worker process runs between two syncs.
+        :param time_limit: stop after this many seconds (wall-clock), checked after every rollout (batch).
+        """
+        Optimizer.__init__(self, graph, num_buses, bus_size, constraints, solution, instance=instance)
         self.sample_size = sample_size
         self.max_rollout = max_rollout
         self.verbose = verbose
         self.early_termination = early_termination
+        self.batch_size = batch_size
+        self.processes = processes
+        self.chunk_size = chunk_size
+        self.time_limit = time_limit
 
-    # Override swap because we don't want to copy or cancel out inferior solutions until rollout is complete
+    # Override swap because we don't want to cancel out inferior solutions until rollout is complete
     def swap(self, vertex_1, vertex_2, bus1, bus2):
-        # to hold the place of the old solution before swapping
-        # Swap the vertices in the new solution
-        # First remove the vertices from their buses
-        self.remove_vertex(vertex_1, bus1)
-        self.remove_vertex(vertex_2, bus2)
-        # Add the vertices to the opposite bus
-        if vertex_2 is not None:
-            self.solution[bus1] += [vertex_2]
-        if vertex_1 is not None:
-            self.solution[bus2] += [vertex_1]
-
-    def rollout(self, init_score):
-
-        solution_holder = copy.deepcopy(self.solution)
+        self.move_vertices(vertex_1, vertex_2, bus1, bus2)
 
+    def rollout_swaps(self):
+        """
+        Applies a rollout of up to max_rollout sampled swaps (logged in self.journal).
+        """
         for step in range(self.max_rollout):
             # At each step we sample a swap
             # First sample two busses
@@ -844,17 +1741,70 @@ class TreeSearchOptimizer(Optimizer):
             # swap these students and get a new temporary solution
             self.swap(student_1, student_2, bus1, bus2)
 
+    def rollout(self, init_score):
+
+        checkpoint = self.journal.mark()
+        self.rollout_swaps()
+
         # Score this rollout
-        new_score = self.set_score()[0]
+        new_score = self.scorer.score
 
         if new_score >= init_score:
+            self.journal.commit()
             return new_score
         else:
-            self.solution = solution_holder
+            self.journal.rollback(self, checkpoint)
             return init_score
 
+    def batch_rollouts(self, num_rollouts):
+        """
+        Runs NUM_ROLLOUTS rollouts from the current solution, each one is undone after it is scored.
+
+        :return: Tuple of (score, swaps) of the best rollout, swaps is the list of
+            (vertex_1, vertex_2, bus1, bus2) swaps to apply with move_vertices (in order).
+        """
+        best_score, best_swaps = None, None
+        for _ in range(num_rollouts):
+            checkpoint = self.journal.mark()
+            self.rollout_swaps()
+            new_score = self.scorer.score
+            if best_score is None or new_score > best_score:
+                best_score, best_swaps = new_score, self.journal.entries[checkpoint:]
+            self.journal.rollback(self, checkpoint)
+        return best_score, best_swaps
+
+    def rollout_chunk(self, num_rollouts, deadline=None):
+        """
+        Runs NUM_ROLLOUTS rollouts, keeping each one that isn't worse (like optimize). The kept
+        swaps stay in self.journal, so they can still be undone with self.journal.rollback.
+
+        :param deadline: time.time() at which it stops (checked after every rollout).
+        :return: Tuple of (score, swaps) of the chunk, swaps is the list of all of the kept
+            (vertex_1, vertex_2, bus1, bus2) swaps to apply with move_vertices (in order).
+        """
+        score = self.scorer.score
+        for _ in range(num_rollouts):
+            checkpoint = self.journal.mark()
+            self.rollout_swaps()
+            if self.scorer.score >= score:
+                score = self.scorer.score
+            else:
+                self.journal.rollback(self, checkpoint)
+            if out_of_time(deadline):
+                break
+        return score, list(self.journal.entries)
+
+    def apply_swaps(self, swaps):
+        for vertex_1, vertex_2, bus1, bus2 in swaps:
+            self.move_vertices(vertex_1, vertex_2, bus1, bus2, record=False)
+
     def optimize(self, max_iterations=1000):
+        deadline = time.time() + self.time_limit if self.time_limit is not None else None
         score = self.set_score()[0]
+        if self.processes and self.processes > 1:
+            return self.optimize_workers(score, max_iterations, deadline)
+        if self.batch_size > 1:
+            return self.optimize_batches(score, max_iterations, deadline)
 
         # Optimize the solution
         for iteration in range(max_iterations):
@@ -862,11 +1812,15 @@ class TreeSearchOptimizer(Optimizer):
             for sample in range(self.sample_size):
                 # For every time we expand with the rollout policy we call the method rollout to sample
                 score = self.rollout(score)
+                if out_of_time(deadline):
+                    break
 
             if self.verbose:
                 sys.stdout.write(f"\r\tScore on iteration {iteration} of TreeSearchOptimizer: "
                                  f"{round(score, 5)} {' ' * 30}")
                 sys.stdout.flush()
+            if out_of_time(deadline):
+                break
             if score == last_iter_score and self.early_termination:
                 if self.verbose:
                     sys.stdout.write(f"\r\tStopped TreeSearchOptimizer on iteration {iteration} {' ' * 30}")
@@ -875,150 +1829,2531 @@ class TreeSearchOptimizer(Optimizer):
         if self.verbose:
             print("")
 
+    def optimize_batches(self, score, max_iterations=1000, deadline=None):
+        """
+        Same as optimize, but the sample_size rollouts of an iteration are run in batches of
+        batch_size rollouts from the same solution. The best rollout of each batch is kept if its
+        score is >= to the current score.
 
-############################
-# Main Execution Functions #
-############################
+        :param deadline: time.time() at which it stops (checked after every batch).
+        """
+        num_batches = math.ceil(self.sample_size / self.batch_size)
+        for iteration in range(max_iterations):
+            last_iter_score = score
+            for batch in range(num_batches):
+                new_score, swaps = self.batch_rollouts(self.batch_size)
+                if new_score >= score:
+                    self.apply_swaps(swaps)
+                    score = self.scorer.score
+                if out_of_time(deadline):
+                    break
+
+            if self.verbose:
+                sys.stdout.write(f"\r\tScore on iteration {iteration} of TreeSearchOptimizer: "
+                                 f"{round(score, 5)} {' ' * 30}")
+                sys.stdout.flush()
+            if out_of_time(deadline):
+                break
+            if score == last_iter_score and self.early_termination:
+                if self.verbose:
+                    sys.stdout.write(f"\r\tStopped TreeSearchOptimizer on iteration {iteration} {' ' * 30}")
+                    sys.stdout.flush()
+                break
+        if self.verbose:
+            print("")
+
+    def optimize_workers(self, score, max_iterations=1000, deadline=None):
+        """
+        Same as optimize, but every worker process runs the sample_size rollouts of an iteration
+        from the same solution, in chunks of chunk_size rollouts. After each chunk the other workers
+        continue from the best worker's solution, which is loaded here once they are done.
+
+        :param deadline: time.time() at which it stops (checked after every rollout by the workers).
+        """
+        workers = RolloutWorkers(self, self.processes)
+        try:
+            for iteration in range(max_iterations):
+                last_iter_score = score
+                for start in range(0, self.sample_size, self.chunk_size):
+                    score = workers.run_chunks(min(self.chunk_size, self.sample_size - start), deadline)
+                    if out_of_time(deadline):
+                        break
+
+                if self.verbose:
+                    sys.stdout.write(f"\r\tScore on iteration {iteration} of TreeSearchOptimizer: "
+                                     f"{round(score, 5)} {' ' * 30}")
+                    sys.stdout.flush()
+                if out_of_time(deadline):
+                    break
+                if score == last_iter_score and self.early_termination:
+                    if self.verbose:
+                        sys.stdout.write(f"\r\tStopped TreeSearchOptimizer on iteration {iteration} {' ' * 30}")
+                        sys.stdout.flush()
+                    break
+            self.solution = workers.solution()
+        finally:
+            workers.close()
+        if self.verbose:
+            print("")
 
 
-def parse_input(folder_name):
+def rollout_worker(conn, instance, solution, sample_size, max_rollout, seed):
     """
-        Parses an input and returns the corresponding graph and parameters
+    Worker process of RolloutWorkers. It keeps a replica of the TreeSearchOptimizer's solution
+    and answers the messages of CONN:
+        ("CHUNK", n, deadline) -> runs a chunk of n rollouts (see TreeSearchOptimizer.rollout_chunk)
+            and sends back its (score, swaps).
+        ("KEEP",) -> keeps the swaps of the last chunk.
+        ("APPLY", swaps) -> undoes the last chunk and applies the swaps to the replica.
+        ("SOLUTION",) -> sends back the replica's solution.
+        ("STOP",) -> exits.
+    """
+    np.random.seed(seed)
+    optimizer = TreeSearchOptimizer(*instance, solution, sample_size=sample_size, max_rollout=max_rollout,
+                                    instance=instance)
+    while True:
+        message = conn.recv()
+        if message[0] == "CHUNK":
+            conn.send(optimizer.rollout_chunk(message[1], message[2]))
+        elif message[0] == "KEEP":
+            optimizer.journal.commit()
+        elif message[0] == "APPLY":
+            optimizer.journal.rollback(optimizer)
+            optimizer.apply_swaps(message[1])
+        elif message[0] == "SOLUTION":
+            conn.send(optimizer.solution)
+        else:
+            conn.close()
+            return
 
-        Inputs:
-            folder_name - a string representing the path to the input folder
 
-        Outputs:
-            (graph, num_buses, bus_size, constraints)
-            graph - the graph as a NetworkX object
-            num_buses - an integer representing the number of buses you can allocate to
-            bus_sizes - an integer representing the number of students that can fit on a bus
-            constraints - a list where each element is a list vertices which represents a single rowdy group
+class RolloutWorkers:
+    """
+    Worker processes that each keep a replica of a TreeSearchOptimizer's solution, so a chunk of
+    rollouts only sends the number of rollouts to each worker and the kept swaps back.
     """
-    graph = nx.read_gml(folder_name + "/graph.gml")
-    parameters = open(folder_name + "/parameters.txt")
-    num_buses = int(parameters.readline())
-    bus_size = int(parameters.readline())
-    constraints = []
 
-    for line in parameters:
-        line = line[1: -2]
-        curr_constraint = [num.replace("'", "") for num in line.split(", ")]
-        constraints.append(curr_constraint)
+    def __init__(self, optimizer, processes):
+        """
+        :param optimizer: the TreeSearchOptimizer obj, its current solution is copied to the workers.
+        :param processes: number of worker processes.
+        """
+        solution = optimizer.solution
+        self.conns = []
+        self.workers = []
+        for seed in np.random.randint(0, 2 ** 31 - 1, size=processes).tolist():
+            conn, worker_conn = multiprocessing.Pipe()
+            worker = multiprocessing.Process(target=rollout_worker, daemon=True,
+                                             args=(worker_conn, optimizer.instance, solution,
+                                                   optimizer.sample_size, optimizer.max_rollout, seed))
+            worker.start()
+            worker_conn.close()
+            self.conns.append(conn)
+            self.workers.append(worker)
+
+    def run_chunks(self, num_rollouts, deadline=None):
+        """
+        Every worker runs a chunk of NUM_ROLLOUTS rollouts from the (same) current solution, then
+        all of them continue from the solution of the best chunk.
 
-    return graph, num_buses, bus_size, constraints
+        :param deadline: time.time() at which the workers stop their chunk.
+        :return: (float) score of the best chunk.
+        """
+        for conn in self.conns:
+            conn.send(("CHUNK", num_rollouts, deadline))
+        results = [conn.recv() for conn in self.conns]
+        best = max(range(len(results)), key=lambda i: results[i][0])
+        for i, conn in enumerate(self.conns):
+            conn.send(("KEEP",) if i == best else ("APPLY", results[best][1]))
+        return results[best][0]
+
+    def solution(self):
+        """
+        :return: the workers' (shared) solution, a list of buses (lists of vertices).
+        """
+        self.conns[0].send(("SOLUTION",))
+        return self.conns[0].recv()
 
+    def close(self):
+        for conn in self.conns:
+            conn.send(("STOP",))
+            conn.close()
+        for worker in self.workers:
+            worker.join()
 
-TIE_BREAK_BREAKS = [
-    "LEAST_FULL",
-    "HEURISTIC",
-    "MOST_FULL",
-    "DEFAULT"
-]
 
-TIE_BREAK_PROCESS = [
-    "PRIO_QUEUE",
-    "HIGH_DEGREE",
-    "LOW_DEGREE",
-]
+class GainBuckets:
+    """
+    Bucket priority queue of vertices keyed by (int) gain, for FMOptimizer. Insert / remove
+    are O(1) and popping the max is amortized O(1), since gains are bounded by the max degree.
+    """
 
-OVER_CORR_BREAKS = [
-    "LEAST_FULL",
-    "HEURISTIC"
-]
+    def __init__(self):
+        self.buckets = {}
+        self.gain_of = {}
+        self.max_gain = None
 
-OVER_CORR_PROCESS = [
-    "PRIO_QUEUE",
-]
+    def __len__(self):
+        return len(self.gain_of)
 
+    def insert(self, u, gain):
+        self.gain_of[u] = gain
+        self.buckets.setdefault(gain, {})[u] = None
+        if self.max_gain is None or gain > self.max_gain:
+            self.max_gain = gain
 
-def solve(graph, num_buses, bus_size, constraints, verbose=False):
-    """
-    Params are obvious, they are from the skeleton code.
-    :return: The solver instance.
+    def remove(self, u):
+        gain = self.gain_of.pop(u, None)
+        if gain is not None:
+            del self.buckets[gain][u]
 
-    Note: we might have this function branch off (by calling other functions)
-    depending on some future solvers that we implement.
+    def pop(self):
+        """
+        :return: a vertex with the max gain (the first one inserted on ties), None if empty.
+        """
+        if not self.gain_of:
+            self.max_gain = None
+            return None
+        while not self.buckets.get(self.max_gain):
+            self.max_gain -= 1
+        u = next(iter(self.buckets[self.max_gain]))
+        self.remove(u)
+        return u
+
+
+class FMOptimizer(Optimizer):
+    """
+    Fiduccia-Mattheyses style refinement. Each pass keeps every unlocked vertex in GainBuckets
+    by the gain of its best move (see best_move), repeatedly
+    makes the best move, locks the moved vertices and finally rolls back to the best prefix of
+    the pass (scored exactly by self.scorer, so rowdy groups are accounted for). Passes repeat
+    until one doesn't improve the score.
+
+    A move to a full bus (or one that would empty the vertex's bus) becomes a swap with the
+    unlocked vertex of the target bus that gains the most by moving the other way.
+
+    Students in a rowdy group of one are always invalid, so moving them gains nothing and their
+    friendships never count: they are left out of the friend counts and the buckets (but they
+    can still be swap partners, with a gain of 0).
     """
-    all_heuristics = []
-    for tie_break in TIE_BREAK_BREAKS:
-        for process_order in TIE_BREAK_PROCESS:
-            if verbose:
-                sys.stdout.write(f"\r\tSolving using DDHeuristicTieBreakers... "
-                                 f"({tie_break}) ({process_order}) {' ' * 10}")
-                sys.stdout.flush()
-            solver = DDHeuristicTieBreakers(graph, num_buses, bus_size, constraints, tie_break)
-            solver.solve(process_order)
-            all_heuristics.append((solver.set_score()[0], solver.solution))
 
-    for tie_break in OVER_CORR_BREAKS:
-        for process_order in OVER_CORR_PROCESS:
-            if verbose:
-                sys.stdout.write(f"\r\tSolving using DDHeuristicOversizeCorrection... "
-                                 f"({tie_break}) ({process_order}) {' ' * 10}")
-                sys.stdout.flush()
-            solver = DDHeuristicOversizeCorrection(graph, num_buses, bus_size, constraints, tie_break)
-            solver.solve(process_order)
-            all_heuristics.append((solver.set_score()[0], solver.solution))
+    def __init__(self, graph, num_buses, bus_size, constraints, solution, max_passes=10, exact_flips=True,
+                 time_limit=None, verbose=False, instance=None):
+        """
+        :param max_passes: max number of FM passes.
+        :param exact_flips: score moves that complete or break up a rowdy group exactly (self.scorer.delta),
+            instead of with flip_gain. Slower, but better on inputs with a lot of rowdy groups.
+        :param time_limit: stop after this many seconds (wall-clock). A pass that runs out of time
+            still rolls back to its best prefix.
+        """
+        Optimizer.__init__(self, graph, num_buses, bus_size, constraints, solution, instance=instance)
+        self.adjacency = self.instance.adjacency
+        self.dead = {grp[0] for grp in self.instance.groups if len(grp) == 1}
+        self.max_passes = max_passes
+        self.exact_flips = exact_flips
+        self.time_limit = time_limit
+        self.deadline = None
+        self.verbose = verbose
+
+    def flip_buses(self, u):
+        """
+        :return: set of the buses that U moving to would complete or break up one of U's rowdy groups.
+            It is cached in self.flips until the group_risk of one of U's groups changes.
+        """
+        if self.flips[u] is not None:
+            return self.flips[u]
+        self.flips[u] = self._flip_buses(u)
+        return self.flips[u]
+
+    def _flip_buses(self, u):
+        scorer = self.scorer
+        from_bus = scorer.bus_of[u]
+        buses = set()
+        for i in scorer.vertex_groups[u]:
+            size = len(scorer.groups[i])
+            if size == 1:
+                continue  # Always whole, U is in self.dead and never moved for a gain.
+            counts = scorer.group_counts[i]
+            if len(counts) == 1:
+                return set(range(self.num_buses))
+            buses.update(bus for bus, count in counts.items() if count + 1 == size and bus != from_bus)
+        return buses
+
+    def flip_gain(self, u, bus):
+        """
+        Estimated change in score (in friendships) from the rowdy groups that U moving to BUS
+        completes or breaks up: a group that gets broken up gets back its members' friends on
+        their bus and a group that gets completed loses its members' friends on BUS.
+        """
+        scorer = self.scorer
+        from_bus = scorer.bus_of[u]
+        gain = 0
+        for i in scorer.vertex_groups[u]:
+            grp = scorer.groups[i]
+            if len(grp) == 1:
+                continue
+            counts = scorer.group_counts[i]
+            if len(counts) == 1:
+                gain += sum(self.friends[v][from_bus] for v in grp if v != u)
+            elif counts.get(bus, 0) + 1 == len(grp):
+                gain -= sum(self.friends[v][bus] for v in grp if v != u) + self.friends[u][bus]
+        return gain
+
+    def best_move(self, u):
+        """
+        The gain of a move is the change in U's friends on its bus. For moves that complete or
+        break up a rowdy group, it is the exact change in score (or the estimate of flip_gain).
 
-    heuristic_sol = max(all_heuristics, key=lambda tup: tup[0])[1]
+        :return: Tuple of (gain, bus) of the best move of U, buses with free seats win ties.
+        """
+        row = self.friends[u]
+        from_bus = self.scorer.bus_of[u]
+        buses = self.scorer.assignment.buses
+        flip_buses = self.flip_buses(u)
+        if not flip_buses:
+            # Same result as the loop below, but the max is found by list methods (in C).
+            top = max(row[:from_bus] + row[from_bus + 1:])
+            first = None
+            bus = row.index(top)
+            while True:
+                if bus != from_bus:
+                    if len(buses[bus]) < self.bus_size:
+                        return top - row[from_bus], bus
+                    first = bus if first is None else first
+                try:
+                    bus = row.index(top, bus + 1)
+                except ValueError:
+                    return top - row[from_bus], first
+
+        best = None
+        for bus in range(self.num_buses):
+            if bus != from_bus:
+                if bus not in flip_buses:
+                    gain = row[bus] - row[from_bus]
+                elif self.exact_flips:
+                    gain = self.scorer.delta([(u, bus)])
+                else:
+                    gain = row[bus] - row[from_bus] + self.flip_gain(u, bus)
+                key = (gain, len(buses[bus]) < self.bus_size)
+                if best is None or key > best[0]:
+                    best = (key, bus)
+        return best[0][0], best[1]
+
+    def refresh(self, v):
+        """
+        Recomputes the best move of (unlocked) vertex V and moves it to its new bucket. Once the
+        time is up it does nothing, the pass stops at its next pop.
+        """
+        if v in self.buckets.gain_of and not out_of_time(self.deadline):
+            self.buckets.remove(v)
+            self.target[v] = self.best_move(v)
+            self.buckets.insert(v, self.target[v][0])
 
-    if verbose:
-        sys.stdout.write(f"\r\tOptimizing... {' ' * 100}")
-        sys.stdout.flush()
-    solver = TreeSearchOptimizer(graph, num_buses, bus_size, constraints, heuristic_sol,
-                                 sample_size=300, max_rollout=max(20, num_buses), verbose=verbose)
-    solver.solve()
-    solver = BasicOptimizer(graph, num_buses, bus_size, constraints, solver.solution,
-                            sample_size=300, verbose=verbose)
-    solver.solve()
+    def group_risk(self, i):
+        """
+        :return: the state of rowdy group I that its members' flip_buses depend on, i.e. whether it
+            is whole and the buses that hold all but one of its members.
+        """
+        counts = self.scorer.group_counts[i]
+        size = len(self.scorer.groups[i])
+        return len(counts) == 1, frozenset(bus for bus, count in counts.items() if count + 1 == size)
 
-    return solver
+    def update_friends(self, u, from_bus, to_bus, group_risks):
+        """
+        Updates the friend counts of U's neighbors after U moved FROM_BUS TO_BUS, and the gains
+        of U's neighbors and of the members of U's rowdy groups whose group_risk changed.
+
+        :param group_risks: dict of {rowdy group index: group_risk before the move}
+        """
+        for v in self.adjacency[u]:
+            if v == u or u in self.dead:
+                continue
+            self.friends[v][from_bus] -= 1
+            self.friends[v][to_bus] += 1
+            self.refresh(v)
+        for i in self.scorer.vertex_groups[u]:
+            if self.group_risk(i) != group_risks[i]:
+                for v in self.scorer.groups[i]:
+                    self.flips[v] = None
+                    self.refresh(v)
+
+    def swap_partner(self, u, from_bus, to_bus):
+        """
+        :return: the unlocked vertex of TO_BUS with the max gain of moving to FROM_BUS
+            (when swapped with U), None if there is no such vertex.
+        """
+        best, best_gain = None, None
+        adjacent = set(self.adjacency[u])
+        for v in self.scorer.assignment.buses[to_bus]:
+            if v in self.locked:
+                continue
+            if v in self.dead:
+                gain = 0
+            else:
+                row = self.friends[v]
+                gain = row[from_bus] - row[to_bus] - 2 * (v in adjacent)
+            if best_gain is None or gain > best_gain:
+                best, best_gain = v, gain
+        return best
 
+    def refinement_pass(self):
+        """
+        Runs one FM pass and rolls back to its best prefix.
 
-def optimize_ours(graph, num_buses, bus_size, constraints, solution, sample_size, max_rollout, verbose=False):
-    # Optimizes our own solutions
-    solver = TreeSearchOptimizer(graph, num_buses, bus_size, constraints, solution, sample_size=sample_size,
-                                 max_rollout=max_rollout, verbose=False, early_termination=False)
-    solver.solve()
-    return solver
+        :return: True if the pass improved the score.
+        """
+        scorer = self.scorer
+        bus_of = scorer.bus_of
+        buses = scorer.assignment.buses
+        self.friends = [[0] * self.num_buses for _ in range(len(bus_of))]
+        for u in range(len(bus_of)):
+            for v in self.adjacency[u]:
+                if v != u and v not in self.dead:
+                    self.friends[u][bus_of[v]] += 1
+        self.buckets = GainBuckets()
+        self.target = [None] * len(bus_of)
+        self.flips = [None] * len(bus_of)
+        self.locked = set()
+        for u in range(len(bus_of)):
+            if not u & 15 and out_of_time(self.deadline):
+                return False  # Nothing has moved yet.
+            if u in self.dead:
+                continue
+            self.target[u] = self.best_move(u)
+            self.buckets.insert(u, self.target[u][0])
+
+        self.journal.commit()
+        start_edges = best_edges = scorer.edges
+        best_mark = self.journal.mark()
+        while self.buckets:
+            if out_of_time(self.deadline):
+                break
+            u = self.buckets.pop()
+            self.locked.add(u)
+            from_bus, to_bus = bus_of[u], self.target[u][1]
+            if len(buses[to_bus]) < self.bus_size and len(buses[from_bus]) > 1:
+                partner = None
+            else:
+                partner = self.swap_partner(u, from_bus, to_bus)
+                if partner is None:
+                    continue
+                self.locked.add(partner)
+                self.buckets.remove(partner)
+
+            moved = [u] if partner is None else [u, partner]
+            group_risks = {i: self.group_risk(i) for v in moved for i in scorer.vertex_groups[v]}
+            self.move_vertices(u, partner, from_bus, to_bus)
+            self.update_friends(u, from_bus, to_bus, group_risks)
+            if partner is not None:
+                self.update_friends(partner, to_bus, from_bus, group_risks)
+            if scorer.edges > best_edges:
+                best_edges = scorer.edges
+                best_mark = self.journal.mark()
+
+        self.journal.rollback(self, best_mark)
+        self.journal.commit()
+        return best_edges > start_edges
+
+    def optimize(self):
+        self.deadline = time.time() + self.time_limit if self.time_limit is not None else None
+        for i in range(self.max_passes):
+            if out_of_time(self.deadline):  # Checked before the pass builds its buckets, which is O(V + E).
+                break
+            improved = self.refinement_pass()
+            if self.verbose:
+                sys.stdout.write(f"\r\tScore on pass {i} of FMOptimizer: {round(self.scorer.score, 5)} {' ' * 30}")
+                sys.stdout.flush()
+            if not improved:
+                break
+        if self.verbose:
+            print("")
 
 
-def main():
+class SimulatedAnnealingOptimizer(Optimizer):
     """
-        Main method which iterates over all inputs and calls `solve` on each.
-        The student should modify `solve` to return their solution and modify
-        the portion which writes it to a file to make sure their output is
-        formatted correctly.
+    Simulated annealing over sample_swap proposals. A proposal that loses DELTA friendships is
+    accepted with probability exp(DELTA / temperature), so it can walk out of the local optima
+    that BasicOptimizer stops at. Proposals are scored with DeltaScorer.swap_delta (O(degree)).
+
+    Temperature schedules (see SCHEDULES):
+        GEOMETRIC - temperature *= cooling_rate every steps_per_temperature proposals.
+        ADAPTIVE - cools while the acceptance rate of losing swaps is above a target rate, heats up
+            otherwise. The target starts at target_acceptance and decays by cooling_rate every step.
+        REHEATING - GEOMETRIC, but goes back to reheat_fraction of the initial temperature
+            after reheat_after temperature steps without a new best score.
+
+    The best solution is kept by journaling the accepted swaps since the last best score,
+    and the optimizer ends on (rolls back to) the best solution it has seen. When the journal
+    gets too long, the best solution is saved as a list and the journal is committed (see
+    trim_journal), so the walk goes on from where it is.
+
+    NOTE: The whole loop runs about 35k to 85k proposals per second on the large inputs (measured
+    on large/1000, 1001, 1004 and 1036), the scoring step alone (DeltaScorer.swap_delta) 0.1M to
+    0.7M per second. Going beyond that would need compiled code.
     """
-    global SCORES
 
-    size_categories = ["small", "medium", "large"]
-    if not os.path.isdir(path_to_outputs):
-        os.mkdir(path_to_outputs)
+    SCHEDULES = [
+        "GEOMETRIC",
+        "ADAPTIVE",
+        "REHEATING",
+    ]
+
+    def __init__(self, graph, num_buses, bus_size, constraints, solution, schedule="GEOMETRIC",
+                 initial_temperature=None, min_temperature=0.05, cooling_rate=0.95, steps_per_temperature=None,
+                 target_acceptance=0.2, reheat_after=20, reheat_fraction=0.5, max_proposals=None, time_limit=None,
+                 verbose=False, instance=None):
+        """
+        :param schedule: one of SCHEDULES.
+        :param initial_temperature: in friendships (edges), estimated from sampled swaps if None.
+        :param min_temperature: GEOMETRIC and ADAPTIVE stop once the temperature gets below this.
+        :param cooling_rate: temperature factor of each temperature step.
+        :param steps_per_temperature: proposals per temperature step, defaults to 10 * V.
+        :param target_acceptance: (ADAPTIVE) initial target acceptance rate of losing swaps.
+        :param reheat_after: (REHEATING) number of temperature steps without a new best before reheating.
+        :param reheat_fraction: (REHEATING) fraction of the initial temperature that it reheats to.
+        :param max_proposals: stop after this many proposals, defaults to 1000 * V if there is no time_limit.
+        :param time_limit: stop after this many seconds (wall-clock).
+        """
+        Optimizer.__init__(self, graph, num_buses, bus_size, constraints, solution, instance=instance)
+        self.schedule = schedule.upper()
+        if self.schedule not in self.SCHEDULES:
+            raise ValueError(f"{self.schedule} is unsupported schedule for {self}")
+        self.initial_temperature = initial_temperature
+        self.min_temperature = min_temperature
+        self.cooling_rate = cooling_rate
+        self.steps_per_temperature = steps_per_temperature if steps_per_temperature else 10 * len(self.graph)
+        self.target_acceptance = target_acceptance
+        self.reheat_after = reheat_after
+        self.reheat_fraction = reheat_fraction
+        if max_proposals is None and time_limit is None:
+            max_proposals = 1000 * len(self.graph)
+        self.max_proposals = max_proposals
+        self.time_limit = time_limit
+        # Trim the journal when it gets this long, so its memory stays O(V).
+        self.journal_limit = max(100000, 10 * len(self.graph))
+        self.best_edges = None
+        self.best_bus_of = None  # The best solution (bus of each student) if the journal was trimmed since.
+        self.verbose = verbose
 
-    # Load previous scores from file if such file exists.
-    if os.path.isfile(score_path):
-        with open(score_path, 'r+') as f:
-            lines = f.read()
-            if lines:
-                print("!!~~ LOADED PREVIOUS SCORES ~~!!\n")
-                SCORES = json.loads(lines)
+    def propose(self, draws):
+        """
+        Same distribution as sample_swap (including its empty seat semantics), using the 4
+        uniform random numbers DRAWS. So a batch of proposals only needs one NumPy call.
 
-    t_start = time.time()
-    for size in size_categories:
-        category_path = path_to_inputs + "/" + size
-        output_category_path = path_to_outputs + "/" + size
-        category_dir = os.fsencode(category_path)
+        :return: Tuple of (student_1, student_2, bus1, bus2), bus1 is None if one of the buses
+            has less than 2 students (the proposal should be skipped).
+        """
+        buses = self.scorer.assignment.buses
+        bus1 = int(draws[0] * self.num_buses)
+        bus2 = int(draws[1] * (self.num_buses - 1))
+        bus2 += bus2 >= bus1
+        size1, size2 = len(buses[bus1]), len(buses[bus2])
+        if size1 < 2 or size2 < 2:
+            return None, None, None, None
 
-        if not os.path.isdir(output_category_path):
-            os.mkdir(output_category_path)
+        empty1 = (self.bus_size - size1) / self.bus_size
+        if draws[2] < empty1:
+            student_1 = None
+            student_2 = buses[bus2][min(int(draws[3] * size2), size2 - 1)]
+        else:
+            student_1 = buses[bus1][min(int((draws[2] - empty1) / (1 - empty1) * size1), size1 - 1)]
+            empty2 = (self.bus_size - size2) / self.bus_size
+            if draws[3] < empty2:
+                student_2 = None
+            else:
+                student_2 = buses[bus2][min(int((draws[3] - empty2) / (1 - empty2) * size2), size2 - 1)]
+        return student_1, student_2, bus1, bus2
+
+    def estimate_temperature(self, samples=200):
+        """
+        :return: temperature where a swap losing the mean friendships of SAMPLES sampled
+            losing swaps is accepted half of the time.
+        """
+        losses = []
+        for draws in np.random.random((samples, 4)).tolist():
+            student_1, student_2, bus1, bus2 = self.propose(draws)
+            if bus1 is not None:
+                delta = self.scorer.swap_delta(student_1, student_2, bus1, bus2)
+                if delta < 0:
+                    losses.append(-delta)
+        return (sum(losses) / len(losses)) / math.log(2) if losses else 1.0
+
+    def new_best(self):
+        """
+        Makes the current solution the best one (self.best_edges and an empty journal).
+        """
+        self.best_edges = self.scorer.edges
+        self.best_bus_of = None
+        self.journal.commit()
+
+    def trim_journal(self):
+        """
+        Commits the journal without losing the best solution, which is saved in self.best_bus_of
+        (undoing the journal on a copy of the current one) unless it already is.
+        """
+        if self.best_bus_of is None:
+            bus_of = self.scorer.bus_of[:]
+            for vertex_1, vertex_2, bus1, bus2 in reversed(self.journal.entries):
+                if vertex_1 is not None:
+                    bus_of[vertex_1] = bus1
+                if vertex_2 is not None:
+                    bus_of[vertex_2] = bus2
+            self.best_bus_of = bus_of
+        self.journal.commit()
+
+    def restore_best(self):
+        """
+        Goes back to the best solution (see new_best). A journal longer than V is undone on a copy
+        of bus_of and loaded (see trim_journal) instead of being rolled back swap by swap.
+        """
+        if self.best_bus_of is None and len(self.journal) > len(self.scorer.bus_of):
+            self.trim_journal()
+        if self.best_bus_of is not None:
+            self.solution = self.bus_solution(self.best_bus_of)
+        else:
+            self.journal.rollback(self)
+        self.new_best()
+
+    def metropolis(self, temperature, num_proposals, deadline=None):
+        """
+        Runs NUM_PROPOSALS proposals at a fixed TEMPERATURE. The swaps accepted since the best
+        score (self.best_edges) are kept in self.journal, see restore_best.
+
+        :param deadline: time.time() at which it stops early (checked every 64 proposals).
+        :return: Tuple of (number of proposals made, number of losing proposals, number of
+            accepted losing proposals).
+        """
+        scorer = self.scorer
+        losing = accepted = 0
+        draws = np.random.random((num_proposals, 5)).tolist()
+        for i, draw in enumerate(draws):
+            if not i & 63 and out_of_time(deadline):
+                return i, losing, accepted
+            student_1, student_2, bus1, bus2 = self.propose(draw)
+            if bus1 is None:
+                continue
+            delta = scorer.swap_delta(student_1, student_2, bus1, bus2)
+            if delta < 0:
+                losing += 1
+            if delta >= 0 or draw[4] < math.exp(delta / temperature):
+                self.move_vertices(student_1, student_2, bus1, bus2)
+                accepted += delta < 0
+                if scorer.edges > self.best_edges:
+                    self.new_best()
+                elif len(self.journal) > self.journal_limit:
+                    self.trim_journal()
+        return num_proposals, losing, accepted
+
+    def optimize(self):
+        scorer = self.scorer
+        deadline = time.time() + self.time_limit if self.time_limit is not None else None
+        initial_temperature = self.initial_temperature if self.initial_temperature else self.estimate_temperature()
+        temperature = initial_temperature
+        self.new_best()
+        target_acceptance = self.target_acceptance
+        proposals = 0
+        step = 0
+        last_best_step = 0
+
+        while True:
+            num_proposals = self.steps_per_temperature
+            if self.max_proposals is not None:
+                num_proposals = min(num_proposals, self.max_proposals - proposals)
+            best_edges = self.best_edges
+            proposed, losing, accepted = self.metropolis(temperature, num_proposals, deadline)
+            if self.best_edges > best_edges:
+                last_best_step = step
+            proposals += proposed
+            step += 1
+
+            if self.verbose:
+                sys.stdout.write(f"\r\tScore on step {step} of SimulatedAnnealingOptimizer: "
+                                 f"{round(self.best_edges / scorer.total_edges, 5)} (T = {round(temperature, 4)}) {' ' * 20}")
+                sys.stdout.flush()
+
+            if self.schedule == "ADAPTIVE":
+                if not losing or accepted / losing > target_acceptance:
+                    temperature *= self.cooling_rate
+                else:
+                    temperature /= math.sqrt(self.cooling_rate)
+                target_acceptance *= self.cooling_rate
+            else:
+                temperature *= self.cooling_rate
+            if self.schedule == "REHEATING" and step - last_best_step >= self.reheat_after:
+                temperature = self.reheat_fraction * initial_temperature
+                last_best_step = step
+            elif self.schedule != "REHEATING" and temperature < self.min_temperature:
+                break
+            if proposed < num_proposals or (self.max_proposals is not None and proposals >= self.max_proposals):
+                break
+
+        self.restore_best()
+        if self.verbose:
+            print("")
+
+
+def run_replicas(replicas, temperatures, num_proposals, deadline=None):
+    """
+    Runs NUM_PROPOSALS Metropolis proposals on each replica at its temperature.
 
-        for input_folder in os.listdir(category_dir):
-            input_name = os.fsdecode(input_folder)
-            graph, num_buses, bus_size, constraints = parse_input(category_path + "/" + input_name)
-            solver_instance = solve(graph, num_buses, bus_size, constraints, verbose=True)
-            solver_instance.write(input_name, output_category_path, verbose=True)
+    :param replicas: dict of {replica id: SimulatedAnnealingOptimizer obj}.
+    :param temperatures: dict of {replica id: temperature}.
+    :return: dict of {replica id: (current edges, best edges)} of the replicas.
+    """
+    results = {}
+    for replica_id, temperature in temperatures.items():
+        replica = replicas[replica_id]
+        replica.metropolis(temperature, num_proposals, deadline)
+        results[replica_id] = (replica.scorer.edges, replica.best_edges)
+    return results
+
+
+def new_replica(instance, solution, random_swaps=0):
+    """
+    :param random_swaps: number of random proposals (see SimulatedAnnealingOptimizer.propose) that
+        are made on SOLUTION whatever they lose, so that the replicas start from different solutions.
+    :return: SimulatedAnnealingOptimizer obj that is a replica of ParallelTemperingOptimizer.
+    """
+    replica = SimulatedAnnealingOptimizer(*instance, solution, instance=instance)
+    for draws in np.random.random((random_swaps, 4)).tolist():
+        student_1, student_2, bus1, bus2 = replica.propose(draws)
+        if bus1 is not None:
+            replica.move_vertices(student_1, student_2, bus1, bus2, record=False)
+    replica.new_best()
+    return replica
+
+
+def best_replica_solution(replica):
+    """
+    :return: the best solution (vertex labels) that REPLICA has seen.
+    """
+    replica.restore_best()
+    return replica.solution
+
+
+def tempering_worker(conn, instance, solution, random_swaps, seed):
+    """
+    Worker process of TemperingReplicas. It keeps the replicas of RANDOM_SWAPS, a dict of
+    {replica id: number of random swaps from SOLUTION} (see new_replica), and answers the
+    messages of CONN:
+        ("RUN", temperatures, num_proposals, deadline) -> sends back run_replicas of its replicas.
+        ("BEST", replica_id) -> sends back best_replica_solution of the replica.
+        ("STOP",) -> exits.
+    """
+    np.random.seed(seed)
+    replicas = {replica_id: new_replica(instance, solution, swaps) for replica_id, swaps in random_swaps.items()}
+    while True:
+        message = conn.recv()
+        if message[0] == "RUN":
+            temperatures = {replica_id: message[1][replica_id] for replica_id in replicas}
+            conn.send(run_replicas(replicas, temperatures, message[2], message[3]))
+        elif message[0] == "BEST":
+            conn.send(best_replica_solution(replicas[message[1]]))
+        else:
+            conn.close()
+            return
+
+
+class TemperingReplicas:
+    """
+    The replicas of a ParallelTemperingOptimizer. They are split between worker processes (so a run
+    only sends the temperatures to each worker and the replica scores back), or all kept in this
+    process if processes is None or 1.
+    """
+
+    def __init__(self, optimizer, num_replicas, processes=None):
+        """
+        :param optimizer: the ParallelTemperingOptimizer obj, its current solution is copied to the replicas.
+            Replica i (of the i-th temperature) starts i / (num_replicas - 1) sweeps of random swaps
+            away from it (see new_replica), so the coldest one starts from it.
+        :param num_replicas: number of replicas, their ids are 0 to num_replicas - 1.
+        :param processes: number of worker processes.
+        """
+        solution = optimizer.solution
+        num_vertices = len(optimizer.instance.adjacency)
+        random_swaps = {replica_id: replica_id * num_vertices // max(1, num_replicas - 1)
+                        for replica_id in range(num_replicas)}
+        self.conns = []
+        self.workers = []
+        self.replicas = {}
+        if processes is None or processes <= 1:
+            self.replicas = {replica_id: new_replica(optimizer.instance, solution, swaps)
+                             for replica_id, swaps in random_swaps.items()}
+            return
+        processes = min(processes, num_replicas)
+        for i, seed in enumerate(np.random.randint(0, 2 ** 31 - 1, size=processes).tolist()):
+            conn, worker_conn = multiprocessing.Pipe()
+            worker = multiprocessing.Process(target=tempering_worker, daemon=True,
+                                             args=(worker_conn, optimizer.instance, solution,
+                                                   {replica_id: random_swaps[replica_id]
+                                                    for replica_id in range(i, num_replicas, processes)}, seed))
+            worker.start()
+            worker_conn.close()
+            self.conns.append(conn)
+            self.workers.append(worker)
+
+    def run(self, temperatures, num_proposals, deadline=None):
+        """
+        Runs all of the replicas at once (see run_replicas).
+        """
+        if not self.conns:
+            return run_replicas(self.replicas, temperatures, num_proposals, deadline)
+        for conn in self.conns:
+            conn.send(("RUN", temperatures, num_proposals, deadline))
+        results = {}
+        for conn in self.conns:
+            results.update(conn.recv())
+        return results
+
+    def best_solution(self, replica_id):
+        if not self.conns:
+            return best_replica_solution(self.replicas[replica_id])
+        conn = self.conns[replica_id % len(self.conns)]
+        conn.send(("BEST", replica_id))
+        return conn.recv()
+
+    def close(self):
+        for conn in self.conns:
+            conn.send(("STOP",))
+            conn.close()
+        for worker in self.workers:
+            worker.join()
+
+
+class ParallelTemperingOptimizer(Optimizer):
+    """
+    Parallel tempering (replica exchange). num_replicas copies of the solution each run Metropolis
+    sweeps (SimulatedAnnealingOptimizer.metropolis, so the same proposals and scores as the
+    SimulatedAnnealingOptimizer) at a fixed temperature of a geometric ladder. After every
+    sweeps_per_exchange sweeps (of V proposals), replicas at neighboring temperatures swap
+    temperatures with probability min(1, exp((E_j - E_i) * (1 / T_i - 1 / T_j))), where E is
+    the number of intra-bus friendships. So good solutions drift to the cold end while the hot
+    replicas keep exploring. Ends on the best solution seen by any replica.
+
+    The replicas are spread over worker processes, see TemperingReplicas.
+    """
+
+    def __init__(self, graph, num_buses, bus_size, constraints, solution, num_replicas=None, processes=None,
+                 min_temperature=0.1, max_temperature=None, sweeps_per_exchange=2, max_exchanges=100,
+                 time_limit=None, verbose=False, instance=None):
+        """
+        :param num_replicas: number of replicas, defaults to max(4, processes).
+        :param processes: number of worker processes for the replicas. They are all run in this
+            process if it is None or 1.
+        :param min_temperature: temperature of the coldest replica.
+        :param max_temperature: temperature of the hottest replica, estimated from sampled swaps
+            if None (see SimulatedAnnealingOptimizer.estimate_temperature).
+        :param sweeps_per_exchange: number of sweeps (V proposals) between the exchanges.
+        :param max_exchanges: max number of exchange rounds.
+        :param time_limit: stop after this many seconds (wall-clock).
+        """
+        Optimizer.__init__(self, graph, num_buses, bus_size, constraints, solution, instance=instance)
+        self.processes = processes
+        self.num_replicas = num_replicas if num_replicas else max(4, processes if processes else 1)
+        self.min_temperature = min_temperature
+        self.max_temperature = max_temperature
+        self.sweeps_per_exchange = sweeps_per_exchange
+        self.max_exchanges = max_exchanges
+        self.time_limit = time_limit
+        self.verbose = verbose
+
+    def temperature_ladder(self):
+        """
+        :return: list of the num_replicas temperatures, from the coldest to the hottest (geometric).
+        """
+        max_temperature = self.max_temperature
+        if max_temperature is None:
+            max_temperature = SimulatedAnnealingOptimizer(*self.instance, self.solution,
+                                                          instance=self.instance).estimate_temperature()
+        max_temperature = max(max_temperature, self.min_temperature)
+        if self.num_replicas == 1:
+            return [self.min_temperature]
+        ratio = (max_temperature / self.min_temperature) ** (1 / (self.num_replicas - 1))
+        return [self.min_temperature * ratio ** i for i in range(self.num_replicas)]
+
+    @staticmethod
+    def exchange(ladder, temperatures, edges, parity):
+        """
+        Tries to swap the temperatures of the replicas at neighboring temperatures (pairs of
+        ladder positions (i, i + 1) with i % 2 == PARITY).
+
+        :param ladder: list of the replica ids at each temperature (coldest first), updated in place.
+        :param temperatures: list of the temperatures (coldest first).
+        :param edges: dict of {replica id: current edges}.
+        :return: number of accepted exchanges.
+        """
+        accepted = 0
+        for i in range(parity, len(ladder) - 1, 2):
+            cold, hot = ladder[i], ladder[i + 1]
+            log_ratio = (edges[hot] - edges[cold]) * (1 / temperatures[i] - 1 / temperatures[i + 1])
+            if log_ratio >= 0 or np.random.random() < math.exp(log_ratio):
+                ladder[i], ladder[i + 1] = hot, cold
+                accepted += 1
+        return accepted
+
+    def optimize(self):
+        deadline = time.time() + self.time_limit if self.time_limit is not None else None
+        temperatures = self.temperature_ladder()
+        ladder = list(range(self.num_replicas))  # Replica id at each temperature.
+        num_proposals = self.sweeps_per_exchange * len(self.instance.adjacency)
+        best_id, best_edges = None, self.scorer.edges
+
+        replicas = TemperingReplicas(self, self.num_replicas, self.processes)
+        try:
+            for exchange in range(self.max_exchanges):
+                results = replicas.run({replica_id: temperatures[i] for i, replica_id in enumerate(ladder)},
+                                       num_proposals, deadline)
+                for replica_id, (_, replica_best) in results.items():
+                    if replica_best > best_edges:
+                        best_id, best_edges = replica_id, replica_best
+                self.exchange(ladder, temperatures, {k: v[0] for k, v in results.items()}, exchange % 2)
+
+                if self.verbose:
+                    sys.stdout.write(f"\r\tScore on exchange {exchange} of ParallelTemperingOptimizer: "
+                                     f"{round(best_edges / self.scorer.total_edges, 5)} {' ' * 20}")
+                    sys.stdout.flush()
+                if out_of_time(deadline):
+                    break
+            if best_id is not None:
+                self.solution = replicas.best_solution(best_id)
+        finally:
+            replicas.close()
+        if self.verbose:
+            print("")
+
+
+class TabuSearchOptimizer(Optimizer):
+    """
+    Tabu search over the moves and swaps of boundary vertices (vertices with friends on other buses,
+    or in a rowdy group that is whole). Every iteration makes the best admissible move or swap, even
+    if it lowers the score, so it can cross the plateaus that BasicOptimizer stops on.
+
+    Candidates are ranked by cached gains (each vertex's friend counts per bus, updated in O(degree)
+    per committed move) and the best num_exact of them are scored exactly by self.scorer. The gains
+    are kept in heaps per (from bus, to bus) pair and only the moved vertices, their neighbors and
+    their rowdy groups' members get new gains after a move (see refresh_candidates).
+    Moving a vertex back to a bus it left less than `tenure` iterations ago is tabu, unless it
+    gives a new best score (aspiration). The optimizer ends on the best solution it has seen.
+    """
+
+    def __init__(self, graph, num_buses, bus_size, constraints, solution, tenure=None, max_iterations=None,
+                 max_stall=None, num_exact=10, swap_candidates=3, time_limit=None, verbose=False, instance=None):
+        """
+        :param tenure: number of iterations a vertex can't go back to the bus it left,
+            defaults to max(7, sqrt(V)) (plus a random 0 to tenure / 2 on each move).
+        :param max_iterations: max number of iterations, defaults to 2 * V.
+        :param max_stall: stop after this many iterations without a new best score, defaults to V / 2.
+        :param num_exact: number of the best candidates (by cached gain) that are scored exactly, twice
+            as many are scored (and so on) when all of them are tabu.
+        :param swap_candidates: number of the best vertices from each (bus, other bus) pair that are paired up in swaps.
+        :param time_limit: stop after this many seconds (wall-clock).
+        """
+        Optimizer.__init__(self, graph, num_buses, bus_size, constraints, solution, instance=instance)
+        num_vertices = len(self.instance.adjacency)
+        self.tenure = tenure if tenure else max(7, int(math.sqrt(num_vertices)))
+        self.max_iterations = max_iterations if max_iterations else 2 * num_vertices
+        self.max_stall = max_stall if max_stall else max(50, num_vertices // 2)
+        self.num_exact = num_exact
+        self.swap_candidates = swap_candidates
+        self.time_limit = time_limit
+        self.verbose = verbose
+        self.adjacency = self.instance.adjacency
+        self.neighbor_sets = [set(neighbors) for neighbors in self.adjacency]
+        self.degrees = [sum(1 for v in neighbors if v != u) for u, neighbors in enumerate(self.adjacency)]
+        self.friends = None
+        self.tabu_until = {}
+
+    def build_friends(self):
+        """
+        Builds self.friends, the list of dicts of {bus: number of friends on bus} of each vertex,
+        and the candidate buckets (see refresh_candidates) from scratch.
+        """
+        bus_of = self.scorer.bus_of
+        self.friends = [{} for _ in range(len(self.adjacency))]
+        for u, neighbors in enumerate(self.adjacency):
+            row = self.friends[u]
+            for v in neighbors:
+                if v != u:
+                    row[bus_of[v]] = row.get(bus_of[v], 0) + 1
+
+        num_vertices = len(self.adjacency)
+        self.gains = [{} for _ in range(num_vertices)]  # {to bus: cached gain} of each vertex's moves.
+        self.gains_bus = [-1] * num_vertices  # Bus of each vertex when its gains were cached.
+        self.own = [0] * num_vertices  # Friends of each vertex on its bus when its gains were cached.
+        self.bonuses = {}  # {vertex: break_gain(vertex)} of the vertices in whole rowdy groups.
+        self.pair_heaps = {}  # {(from bus, to bus): heap of (-gain, vertex)}, lazily invalidated.
+        self.least_attached = [[] for _ in range(self.num_buses)]  # Heaps of (own, vertex), lazily invalidated.
+        self.pair_candidates = {}  # {(from bus, to bus): list of the pair's candidates (see candidates)}
+        self.candidate_heap = []  # Heap of candidate_entry tuples, lazily invalidated.
+        self.counter = 0
+        self.heap_entries = 0  # Entries pushed into the pair and least attached heaps since they were built.
+        self.live_gains = 0  # Number of cached gains.
+        self.least_tops = [None] * self.num_buses  # Last least_attached_vertex of each bus.
+        self.dirty_buses = set()  # Buses whose least attached vertex can have changed.
+        buses = self.scorer.assignment.buses
+        self.can_leave = [len(bus) > 1 for bus in buses]
+        self.has_room = [len(bus) < self.bus_size for bus in buses]
+        self.dirty_vertices = set(range(num_vertices))
+        self.dirty_pairs = set()
+        self.whole_groups = {i for i, grp in enumerate(self.scorer.groups)
+                             if len(grp) > 1 and len(self.scorer.group_counts[i]) == 1}
+        self.refresh_candidates()
+
+    def move_vertices(self, vertex_1, vertex_2, bus1, bus2, record=True):
+        # Also keeps the cached friend counts up to date (including the journal's rollbacks) and
+        # marks the vertices whose cached gains can change: the moved vertices, their neighbors and
+        # the members of the whole rowdy groups these are in (for break_gain). Only the moved
+        # vertices' groups can become or stop being whole, so self.whole_groups is kept up to date
+        # from them instead of checking all of the neighbors' groups.
+        Optimizer.move_vertices(self, vertex_1, vertex_2, bus1, bus2, record=record)
+        if self.friends is None:
+            return
+        scorer = self.scorer
+        dirty = self.dirty_vertices
+        whole_groups = self.whole_groups
+        for u in (vertex_1, vertex_2):
+            if u is None:
+                continue
+            dirty.add(u)
+            for i in scorer.vertex_groups[u]:
+                is_whole = len(scorer.groups[i]) > 1 and len(scorer.group_counts[i]) == 1
+                if is_whole or i in whole_groups:
+                    dirty.update(scorer.groups[i])
+                    if is_whole:
+                        whole_groups.add(i)
+                    else:
+                        whole_groups.discard(i)
+        for u, from_bus, to_bus in ((vertex_1, bus1, bus2), (vertex_2, bus2, bus1)):
+            if u is None:
+                continue
+            for v in self.adjacency[u]:
+                if v == u:
+                    continue
+                row = self.friends[v]
+                row[from_bus] -= 1
+                if not row[from_bus]:
+                    del row[from_bus]
+                row[to_bus] = row.get(to_bus, 0) + 1
+                dirty.add(v)
+            neighbors = self.neighbor_sets[u]
+            for i in whole_groups:
+                if not neighbors.isdisjoint(scorer.groups[i]):
+                    dirty.update(scorer.groups[i])
+
+        buses = scorer.assignment.buses
+        for bus in (bus1, bus2):
+            if self.can_leave[bus] != (len(buses[bus]) > 1):
+                self.can_leave[bus] = not self.can_leave[bus]
+                self.dirty_pairs.update((bus, to_bus) for to_bus in range(self.num_buses))
+            if self.has_room[bus] != (len(buses[bus]) < self.bus_size):
+                self.has_room[bus] = not self.has_room[bus]
+                self.dirty_pairs.update((from_bus, bus) for from_bus in range(self.num_buses))
+
+    def break_gain(self, u):
+        """
+        :return: estimated friendships won back by breaking up U's whole rowdy groups (by moving U),
+            i.e. the other members' friends on their bus.
+        """
+        scorer = self.scorer
+        from_bus = scorer.bus_of[u]
+        gain = 0
+        for i in scorer.vertex_groups[u]:
+            grp = scorer.groups[i]
+            if len(grp) > 1 and len(scorer.group_counts[i]) == 1:
+                gain += sum(self.friends[v].get(from_bus, 0) for v in grp if v != u)
+        return gain
+
+    def is_tabu(self, u, bus, iteration):
+        return u is not None and self.tabu_until.get((u, bus), -1) > iteration
+
+    def refresh_gains(self, u):
+        """
+        Recomputes the cached gains of moving U (boundary vertices only) to each bus and pushes the
+        ones that changed into the (from bus, to bus) heaps, marking these pairs dirty.
+        """
+        from_bus = self.scorer.bus_of[u]
+        row = self.friends[u]
+        own = row.get(from_bus, 0)
+        old_bus, old_gains = self.gains_bus[u], self.gains[u]
+        if old_bus != from_bus or self.own[u] != own:
+            heapq.heappush(self.least_attached[from_bus], (own, u))
+            self.heap_entries += 1
+            self.dirty_buses.add(from_bus)
+            if old_bus >= 0:
+                self.dirty_buses.add(old_bus)
+        bonus = self.break_gain(u) if self.scorer.invalid_count[u] else 0
+        if bonus:
+            self.bonuses[u] = bonus
+        else:
+            self.bonuses.pop(u, None)
+
+        gains = {}
+        if own != self.degrees[u] or bonus:
+            for to_bus in (row if not bonus else range(self.num_buses)):
+                if to_bus != from_bus:
+                    gains[to_bus] = row.get(to_bus, 0) - own + bonus
+        for to_bus, gain in old_gains.items():
+            if old_bus != from_bus or gains.get(to_bus) != gain:
+                self.dirty_pairs.add((old_bus, to_bus))
+        for to_bus, gain in gains.items():
+            if old_bus != from_bus or old_gains.get(to_bus) != gain:
+                heapq.heappush(self.pair_heaps.setdefault((from_bus, to_bus), []), (-gain, u))
+                self.heap_entries += 1
+                self.dirty_pairs.add((from_bus, to_bus))
+        self.live_gains += len(gains) - len(old_gains)
+        self.gains[u], self.gains_bus[u], self.own[u] = gains, from_bus, own
+
+    def top_gains(self, pair, k):
+        """
+        :return: list of the (gain, vertex) of the (at most) K best moves of PAIR, (from bus, to bus).
+        """
+        heap = self.pair_heaps.get(pair)
+        top = []
+        seen = set()
+        while heap and len(top) < k:
+            gain, u = heapq.heappop(heap)
+            if self.gains_bus[u] == pair[0] and self.gains[u].get(pair[1]) == -gain and u not in seen:
+                top.append((-gain, u))
+                seen.add(u)
+        for gain, u in top:
+            heapq.heappush(heap, (-gain, u))
+        return top
+
+    def least_attached_vertex(self, bus):
+        """
+        :return: (gain, vertex) of the vertex of BUS with the fewest friends on it (gain is minus
+            its friends on BUS), or None if BUS is empty.
+        """
+        heap = self.least_attached[bus]
+        while heap and (self.gains_bus[heap[0][1]] != bus or self.own[heap[0][1]] != heap[0][0]):
+            heapq.heappop(heap)
+        return (-heap[0][0], heap[0][1]) if heap else None
+
+    def pair_candidates_of(self, bus1, bus2):
+        """
+        :return: list of (cached gain, vertex_1, vertex_2, bus1, bus2) of the best legal moves from
+            BUS1 to BUS2 and of the swaps of the best vertices of (BUS1, BUS2) with the best ones of
+            (BUS2, BUS1) and the least attached vertex of BUS2.
+        """
+        top = self.top_gains((bus1, bus2), max(self.num_exact, self.swap_candidates))
+        if not top:
+            return []
+        candidates = []
+        if self.can_leave[bus1] and self.has_room[bus2]:
+            candidates.extend((gain, u, None, bus1, bus2) for gain, u in top[:self.num_exact])
+
+        partners = self.top_gains((bus2, bus1), self.swap_candidates)
+        least = self.least_attached_vertex(bus2)
+        if least is not None:
+            partners = heapq.nlargest(self.swap_candidates, partners + [least])
+        groups_of = self.scorer.vertex_groups
+        for gain_1, u in top[:self.swap_candidates]:
+            for gain_2, v in partners:
+                if u == v:
+                    continue
+                gain = gain_1 + gain_2 - 2 * (v in self.neighbor_sets[u])
+                if (u in self.bonuses or v in self.bonuses) and set(groups_of[u]) & set(groups_of[v]):
+                    # Swapping two members of a whole group doesn't break it up.
+                    gain -= self.bonuses.get(u, 0) + self.bonuses.get(v, 0)
+                candidates.append((gain, u, v, bus1, bus2))
+        return candidates
+
+    def rebuild_heaps(self):
+        """
+        Rebuilds the (from bus, to bus) and least attached heaps from the cached gains, without
+        their outdated entries.
+        """
+        self.pair_heaps = {}
+        self.least_attached = [[] for _ in range(self.num_buses)]
+        for u, gains in enumerate(self.gains):
+            from_bus = self.gains_bus[u]
+            self.least_attached[from_bus].append((self.own[u], u))
+            for to_bus, gain in gains.items():
+                self.pair_heaps.setdefault((from_bus, to_bus), []).append((-gain, u))
+        for heap in self.pair_heaps.values():
+            heapq.heapify(heap)
+        for heap in self.least_attached:
+            heapq.heapify(heap)
+        self.heap_entries = self.live_gains + len(self.gains)
+
+    def refresh_candidates(self):
+        """
+        Brings the candidate buckets up to date after moves: the cached gains of the dirty vertices
+        are recomputed, then the candidates of the dirty (from bus, to bus) pairs (and of their
+        reverse pairs, whose swaps share the same vertices), and of the pairs into the buses whose
+        least attached vertex changed. The heaps are rebuilt when most of their entries are outdated.
+        """
+        for u in self.dirty_vertices:
+            self.refresh_gains(u)
+        self.dirty_vertices.clear()
+        if self.heap_entries > 4 * (self.live_gains + len(self.gains)):
+            self.rebuild_heaps()
+        for bus in self.dirty_buses:
+            least = self.least_attached_vertex(bus)
+            if least != self.least_tops[bus]:
+                self.least_tops[bus] = least
+                self.dirty_pairs.update((from_bus, bus) for from_bus in range(self.num_buses))
+        self.dirty_buses.clear()
+
+        pairs = self.dirty_pairs | {(bus2, bus1) for bus1, bus2 in self.dirty_pairs}
+        self.dirty_pairs.clear()
+        for pair in pairs:
+            candidates = self.pair_candidates_of(*pair)
+            if candidates:
+                self.pair_candidates[pair] = candidates
+            else:
+                self.pair_candidates.pop(pair, None)
+            for candidate in candidates:
+                self.counter += 1
+                heapq.heappush(self.candidate_heap, self.candidate_entry(candidate, self.counter))
+
+        if len(self.candidate_heap) > 4 * sum(map(len, self.pair_candidates.values())) + 1000:
+            self.candidate_heap = [self.candidate_entry(candidate, i) for i, candidate in
+                                   enumerate(c for candidates in self.pair_candidates.values() for c in candidates)]
+            heapq.heapify(self.candidate_heap)
+            self.counter = len(self.candidate_heap)
+
+    @staticmethod
+    def candidate_entry(candidate, counter):
+        """
+        :return: the candidate_heap entry of CANDIDATE. Ties in gain go to moves, then to the lowest
+            vertex_1 (the order of a scan of the vertices).
+        """
+        return -candidate[0], candidate[2] is not None, candidate[1], counter, candidate
+
+    def candidates(self, k):
+        """
+        :return: list of the K best (cached gain, vertex_1, vertex_2, bus1, bus2) of the legal moves
+            (vertex_2 is None) and swaps of the boundary vertices, see DeltaScorer.swap_moves for the
+            swap format.
+        """
+        self.refresh_candidates()
+        heap = self.candidate_heap
+        top = []
+        seen = set()
+        while heap and len(top) < k:
+            entry = heapq.heappop(heap)
+            candidate = entry[-1]
+            if candidate not in seen and candidate in self.pair_candidates.get((candidate[3], candidate[4]), ()):
+                top.append(entry)
+                seen.add(candidate)
+        for entry in top:
+            heapq.heappush(heap, entry)
+        return [entry[-1] for entry in top]
+
+    def optimize(self):
+        deadline = time.time() + self.time_limit if self.time_limit is not None else None
+        scorer = self.scorer
+        self.build_friends()
+        self.journal.commit()
+        best_edges = scorer.edges
+        last_best = 0
+        # Return to the best solution when the journal gets this long, so its memory stays O(V).
+        journal_limit = max(10000, 10 * len(self.adjacency))
+
+        for iteration in range(self.max_iterations):
+            # When all of the best candidates are tabu (e.g. one vertex's moves to every bus), look further.
+            best, best_delta = None, None
+            num_candidates, scored = self.num_exact, 0
+            while best is None:
+                candidates = self.candidates(num_candidates)
+                for _, vertex_1, vertex_2, bus1, bus2 in candidates[scored:]:
+                    delta = scorer.swap_delta(vertex_1, vertex_2, bus1, bus2)
+                    tabu = self.is_tabu(vertex_1, bus2, iteration) or self.is_tabu(vertex_2, bus1, iteration)
+                    if tabu and scorer.edges + delta <= best_edges:
+                        continue
+                    if best_delta is None or delta > best_delta:
+                        best, best_delta = (vertex_1, vertex_2, bus1, bus2), delta
+                if len(candidates) < num_candidates:
+                    break
+                num_candidates, scored = 2 * num_candidates, len(candidates)
+            if best is None:
+                break
+
+            vertex_1, vertex_2, bus1, bus2 = best
+            self.move_vertices(vertex_1, vertex_2, bus1, bus2)
+            tenure = self.tenure + np.random.randint(self.tenure // 2 + 1)
+            self.tabu_until[(vertex_1, bus1)] = iteration + tenure
+            if vertex_2 is not None:
+                self.tabu_until[(vertex_2, bus2)] = iteration + tenure
+
+            if scorer.edges > best_edges:
+                best_edges = scorer.edges
+                last_best = iteration
+                self.journal.commit()
+            elif len(self.journal) > journal_limit:
+                self.journal.rollback(self)
+
+            if self.verbose and not iteration % 10:
+                sys.stdout.write(f"\r\tScore on iteration {iteration} of TabuSearchOptimizer: "
+                                 f"{round(best_edges / scorer.total_edges, 5)} {' ' * 30}")
+                sys.stdout.flush()
+            if iteration - last_best >= self.max_stall:
+                break
+            if out_of_time(deadline):
+                break
+
+        self.journal.rollback(self)  # Back to the best solution.
+        self.friends = None
+        self.gains = self.pair_heaps = self.least_attached = self.pair_candidates = self.candidate_heap = None
+        self.whole_groups = None
+        if self.verbose:
+            print("")
+
+
+#####################
+# Multilevel Solver #
+#####################
+
+
+class CoarseLevel:
+    """
+    One level of MultilevelSolver's coarsening. Its vertices (clusters) are sets of students.
+    """
+
+    def __init__(self, cluster_of, weights, adjacency, groups):
+        """
+        :param cluster_of: list of the cluster of each student (vertex index of the input).
+        :param weights: list of the number of students in each cluster.
+        :param adjacency: list of dicts of {neighbor cluster: number of friendships between the clusters}
+        :param groups: list of the rowdy groups as lists of (distinct) clusters.
+        """
+        self.cluster_of = cluster_of
+        self.weights = weights
+        self.adjacency = adjacency
+        self.groups = groups
+
+    def __len__(self):
+        return len(self.weights)
+
+    def members(self):
+        """
+        :return: list of the students (vertex indices) of each cluster.
+        """
+        members = [[] for _ in range(len(self.weights))]
+        for u, cluster in enumerate(self.cluster_of):
+            members[cluster].append(u)
+        return members
+
+
+class MultilevelSolver(Solver):
+    """
+    Multilevel solver (for the large inputs). The friendship graph is coarsened by heavy edge
+    matching, the coarsest graph is solved by weighted greedy placement and the solution is then
+    projected back one level at a time, moving whole clusters to improve it at each level.
+    The input level is refined with FMOptimizer.
+
+    Two clusters are never merged if their union holds all of a rowdy group, so a rowdy group
+    can always be broken up (and it is whole on a coarse level iff it is whole on the input level).
+    """
+
+    def __init__(self, graph, num_buses, bus_size, constraints, coarsest_size=None, max_cluster_weight=None,
+                 coarse_tries=8, refine_passes=4, fm_passes=3, exact_flips=False, time_limit=None, verbose=False,
+                 instance=None):
+        """
+        :param coarsest_size: stop coarsening at this many clusters, defaults to max(4 * num_buses, 50).
+        :param max_cluster_weight: max students in a cluster, defaults to max(1, bus_size // 4).
+        :param coarse_tries: number of greedy placements of the coarsest graph (see coarse_solution).
+        :param refine_passes: max number of cluster refinement passes on each level.
+        :param fm_passes: max_passes of the final FMOptimizer.
+        :param exact_flips: exact_flips of the final FMOptimizer.
+        :param time_limit: seconds (wall-clock) after which the refinement stops (the coarsening and the
+            coarsest solution always run), the final FMOptimizer gets the time that is left.
+        """
+        Solver.__init__(self, graph, num_buses, bus_size, constraints, instance=instance)
+        self.coarsest_size = coarsest_size if coarsest_size else max(4 * num_buses, 50)
+        self.max_cluster_weight = max_cluster_weight if max_cluster_weight else max(1, bus_size // 4)
+        self.coarse_tries = coarse_tries
+        self.refine_passes = refine_passes
+        self.fm_passes = fm_passes
+        self.exact_flips = exact_flips
+        self.time_limit = time_limit
+        self.verbose = verbose
+
+    def input_level(self):
+        """
+        :return: CoarseLevel obj of the input graph (each student is its own cluster).
+        """
+        instance = self.instance
+        adjacency = [{} for _ in range(len(instance.adjacency))]
+        for u, neighbors in enumerate(instance.adjacency):
+            for v in neighbors:
+                if v != u:
+                    adjacency[u][v] = adjacency[u].get(v, 0) + 1
+        return CoarseLevel(list(range(len(adjacency))), [1] * len(adjacency), adjacency,
+                           [list(grp) for grp in instance.groups])
+
+    def coarsen(self, level):
+        """
+        Heavy edge matching of LEVEL: clusters are visited in a random order and each unmatched
+        cluster is merged with the unmatched neighbor it has the most friendships with
+        (that keeps the merged cluster within max_cluster_weight and breakable rowdy groups).
+
+        :return: the CoarseLevel obj of the matching.
+        """
+        groups_of = [[] for _ in range(len(level))]
+        for i, grp in enumerate(level.groups):
+            for cluster in grp:
+                groups_of[cluster].append(i)
+
+        match = [-1] * len(level)
+        for u in np.random.permutation(len(level)).tolist():
+            if match[u] >= 0:
+                continue
+            match[u] = u
+            best, best_weight = None, 0
+            for v, weight in level.adjacency[u].items():
+                if match[v] >= 0 or level.weights[u] + level.weights[v] > self.max_cluster_weight:
+                    continue
+                if weight > best_weight and not any(len(level.groups[i]) == 2 and v in level.groups[i]
+                                                    for i in groups_of[u]):
+                    best, best_weight = v, weight
+            if best is not None:
+                match[u] = match[best] = u
+
+        coarse_of = {}
+        for u in range(len(level)):
+            if match[u] == u:
+                coarse_of[u] = len(coarse_of)
+        fine_to_coarse = [coarse_of[match[u]] for u in range(len(level))]
+
+        weights = [0] * len(coarse_of)
+        adjacency = [{} for _ in range(len(coarse_of))]
+        for u in range(len(level)):
+            cu = fine_to_coarse[u]
+            weights[cu] += level.weights[u]
+            for v, weight in level.adjacency[u].items():
+                cv = fine_to_coarse[v]
+                if cu != cv:
+                    adjacency[cu][cv] = adjacency[cu].get(cv, 0) + weight
+        groups = [sorted(set(fine_to_coarse[u] for u in grp)) for grp in level.groups]
+        return CoarseLevel([fine_to_coarse[cluster] for cluster in level.cluster_of], weights, adjacency, groups)
+
+    def coarse_solution(self, level):
+        """
+        Solves LEVEL's graph (one vertex per cluster) by greedy placement, coarse_tries times:
+        each cluster goes to the bus where it has the most friendships (by the merged edge weights)
+        that has room for all of its students, without completing a rowdy group if it can help it
+        and keeping enough empty buses for the clusters left. Even tries place the clusters from the
+        heaviest to the lightest, odd tries place the cluster with the most friendships on a bus
+        next (ties are broken at random after the first two tries). Each projected solution is
+        repaired (Solver.repair) and scored.
+
+        :return: list of the bus of each student, from the best repaired solution.
+        """
+        weighted_degrees = [sum(neighbors.values()) for neighbors in level.adjacency]
+        groups_of = [[] for _ in range(len(level))]
+        for i, grp in enumerate(level.groups):
+            for cluster in grp:
+                groups_of[cluster].append(i)
+
+        scorer = DeltaScorer(self.instance)
+        best, best_score = None, None
+        for attempt in range(self.coarse_tries):
+            noise = np.random.random(len(level)).tolist() if attempt > 1 else [0] * len(level)
+            grow = attempt % 2  # Odd tries place the cluster with the most friends on a bus next.
+            friends = [[0] * self.num_buses for _ in range(len(level))]
+            heap = [(0, -level.weights[c], -weighted_degrees[c], noise[c], c) for c in range(len(level))]
+            heapq.heapify(heap)
+            bus_of_cluster = [-1] * len(level)
+            loads = [0] * self.num_buses
+            placed = [0] * len(level.groups)
+            group_buses = [set() for _ in level.groups]  # Buses of the group's placed clusters.
+            unplaced, empty = len(level), self.num_buses
+            while heap:
+                rank, *_, cluster = heapq.heappop(heap)
+                if bus_of_cluster[cluster] >= 0 or (grow and -rank != max(friends[cluster])):
+                    continue  # Placed or outdated entry.
+                weight = level.weights[cluster]
+                completing = set()  # Buses that hold the rest of one of the cluster's rowdy groups.
+                for i in groups_of[cluster]:
+                    if placed[i] == len(level.groups[i]) - 1 and len(group_buses[i]) == 1:
+                        completing.update(group_buses[i])
+                best_bus, best_key = None, None
+                for bus in range(self.num_buses):
+                    if loads[bus] + weight > self.bus_size or (loads[bus] and unplaced <= empty):
+                        continue  # The last clusters go to the empty buses.
+                    key = (bus not in completing, friends[cluster][bus], -loads[bus])
+                    if best_key is None or key > best_key:
+                        best_bus, best_key = bus, key
+                if best_bus is None:  # No bus has room for the whole cluster, repair splits it up.
+                    best_bus = min(range(self.num_buses), key=lambda b: loads[b])
+                bus_of_cluster[cluster] = best_bus
+                unplaced -= 1
+                empty -= not loads[best_bus]
+                loads[best_bus] += weight
+                for i in groups_of[cluster]:
+                    placed[i] += 1
+                    group_buses[i].add(best_bus)
+                for v, edge_weight in level.adjacency[cluster].items():
+                    if bus_of_cluster[v] < 0:
+                        friends[v][best_bus] += edge_weight
+                        if grow and friends[v][best_bus] == max(friends[v]):
+                            heapq.heappush(heap, (-friends[v][best_bus], -level.weights[v], -weighted_degrees[v],
+                                                  noise[v], v))
+
+            bus_of = [bus_of_cluster[cluster] for cluster in level.cluster_of]
+            self.repair(bus_of)
+            scorer.load(self.bus_solution(bus_of))
+            if best_score is None or scorer.edges > best_score:
+                best, best_score = bus_of, scorer.edges
+        return best
+
+    def refine(self, scorer, level, deadline=None):
+        """
+        Greedy refinement of the solution in SCORER (a DeltaScorer) that moves whole clusters of
+        LEVEL to the bus (among the 3 where they have the most friends) that improves the score the
+        most, while keeping the bus capacities and non empty buses. Moves are scored exactly by SCORER.
+
+        :param deadline: time.time() at which it stops (checked after every pass).
+        """
+        adjacency = self.instance.adjacency
+        buses = scorer.assignment.buses
+        clusters = level.members()
+        for _ in range(self.refine_passes):
+            improved = False
+            for cluster in np.random.permutation(len(clusters)).tolist():
+                members = clusters[cluster]
+                friends = {}
+                for u in members:
+                    for v in adjacency[u]:
+                        if level.cluster_of[v] != cluster:
+                            friends[scorer.bus_of[v]] = friends.get(scorer.bus_of[v], 0) + 1
+                best_moves, best_delta = None, 0
+                for bus in sorted(friends, key=lambda b: -friends[b])[:3]:
+                    moves = [(u, bus) for u in members if scorer.bus_of[u] != bus]
+                    if not moves or len(buses[bus]) + len(moves) > self.bus_size:
+                        continue
+                    leaving = {}
+                    for u, _ in moves:
+                        leaving[scorer.bus_of[u]] = leaving.get(scorer.bus_of[u], 0) + 1
+                    if any(len(buses[b]) == count for b, count in leaving.items()):
+                        continue
+                    delta = scorer.delta(moves)
+                    if delta > best_delta:
+                        best_moves, best_delta = moves, delta
+                if best_moves is not None:
+                    scorer.apply(best_moves)
+                    improved = True
+            if not improved or out_of_time(deadline):
+                break
+
+    def solve(self):
+        deadline = time.time() + self.time_limit if self.time_limit is not None else None
+        levels = [self.input_level()]
+        while len(levels[-1]) > self.coarsest_size:
+            level = self.coarsen(levels[-1])
+            if len(level) > 0.95 * len(levels[-1]):
+                break
+            levels.append(level)
+        if self.verbose:
+            sys.stdout.write(f"\r\tMultilevel: {len(levels)} levels, coarsest has {len(levels[-1])} clusters {' ' * 20}")
+            sys.stdout.flush()
+
+        bus_of = self.coarse_solution(levels[-1])
+        scorer = DeltaScorer(self.instance, self.bus_solution(bus_of))
+        for level in reversed(levels[1:]):
+            if out_of_time(deadline):
+                break
+            self.refine(scorer, level, deadline)
+
+        self.solution = scorer.assignment.to_solution(self.instance.nodes)
+        if not out_of_time(deadline):
+            refiner = FMOptimizer(self.graph, self.num_buses, self.bus_size, self.constraints, self.solution,
+                                  max_passes=self.fm_passes, exact_flips=self.exact_flips,
+                                  time_limit=deadline - time.time() if deadline is not None else None,
+                                  instance=self.instance)
+            refiner.solve()
+            self.solution = refiner.solution
+        if self.verbose:
+            print("")
+        return self.solution
+
+
+##################
+# Memetic Solver #
+##################
+
+
+def memetic_offspring(task):
+    """
+    Worker function of MemeticSolver (its instance is WORKER_INSTANCE, see init_heuristic_worker).
+
+    :param task: Tuple of (parent_1, parent_2, local_search_passes, deadline), see MemeticSolver.offspring.
+    :return: MemeticSolver.offspring of the parents, or None if the deadline has passed.
+    """
+    parent_1, parent_2, local_search_passes, deadline = task
+    if out_of_time(deadline):
+        return None
+    solver = MemeticSolver(*WORKER_INSTANCE, [], local_search_passes=local_search_passes, instance=WORKER_INSTANCE)
+    return solver.offspring(parent_1, parent_2, deadline)
+
+
+class MemeticSolver(Solver):
+    """
+    Memetic (genetic + local search) solver. The population starts as the given solutions (the
+    heuristic solutions of solve) and every generation breeds offspring from pairs of parents
+    (binary tournaments) that replace the worst solutions of the population.
+
+    Offspring are made by a bus preserving crossover: the parents take turns giving their buses
+    with the most intra-bus friendships (DeltaScorer.bus_edges) to the child, minus the students
+    that are already placed. The leftover students go to the bus (with a free seat) where they
+    have the most friends, the buses are repaired (Solver.repair) and the child gets a short
+    FMOptimizer local search. The offspring of a generation are made by a process pool.
+
+    Solutions in the population are lists of the bus of each student (vertex index).
+    """
+
+    def __init__(self, graph, num_buses, bus_size, constraints, population, generations=20, offspring=None,
+                 local_search_passes=2, processes=None, time_limit=None, verbose=False, instance=None):
+        """
+        :param population: list of solutions (lists of lists (buses) of vertices) of the initial population.
+        :param generations: number of generations.
+        :param offspring: number of offspring per generation, defaults to max(4, processes).
+        :param local_search_passes: max_passes of the offspring's FMOptimizer.
+        :param processes: number of worker processes for the offspring. They are all made in this
+            process if it is None or 1.
+        :param time_limit: seconds (wall-clock) after which no more offspring are made, the local
+            search of the offspring that are being made stops at that time too.
+        """
+        Solver.__init__(self, graph, num_buses, bus_size, constraints, instance=instance)
+        self.population = population
+        self.generations = generations
+        self.offspring_count = offspring if offspring else max(4, processes if processes else 1)
+        self.local_search_passes = local_search_passes
+        self.processes = processes
+        self.time_limit = time_limit
+        self.verbose = verbose
+
+    def key(self, bus_of):
+        """
+        :return: hashable key of the partition BUS_OF (the same for any relabeling of the buses).
+        """
+        labels = {}
+        return tuple(labels.setdefault(bus, len(labels)) for bus in bus_of)
+
+    def crossover(self, parent_1, parent_2):
+        """
+        :return: list of the bus of each student of the child of PARENT_1 and PARENT_2 (see class doc).
+            Over capacity and empty buses are NOT repaired.
+        """
+        adjacency = self.instance.adjacency
+        ranked = []
+        for parent in (parent_1, parent_2):
+            scorer = DeltaScorer(self.instance, self.bus_solution(parent))
+            ranked.append([scorer.assignment.buses[bus] for bus in
+                           sorted(range(self.num_buses), key=lambda b: -scorer.bus_edges[b])])
+
+        bus_of = [-1] * len(parent_1)
+        loads = [0] * self.num_buses
+        turn = np.random.randint(2)
+        next_bus = [0, 0]
+        for bus in range(self.num_buses):
+            # The parent whose turn it is gives its best bus that still has students to place.
+            for _ in range(2):
+                members = []
+                while next_bus[turn] < self.num_buses and not members:
+                    members = [u for u in ranked[turn][next_bus[turn]] if bus_of[u] < 0]
+                    next_bus[turn] += 1
+                turn = 1 - turn
+                if members:
+                    break
+            for u in members:
+                bus_of[u] = bus
+            loads[bus] = len(members)
+
+        for u in np.random.permutation(len(bus_of)).tolist():
+            if bus_of[u] >= 0:
+                continue
+            friends = {}
+            for v in adjacency[u]:
+                if v != u and bus_of[v] >= 0 and loads[bus_of[v]] < self.bus_size:
+                    friends[bus_of[v]] = friends.get(bus_of[v], 0) + 1
+            if friends:
+                bus = max(friends, key=lambda b: (friends[b], -loads[b]))
+            else:
+                bus = min(range(self.num_buses), key=lambda b: loads[b])
+            bus_of[u] = bus
+            loads[bus] += 1
+        return bus_of
+
+    def offspring(self, parent_1, parent_2, deadline=None):
+        """
+        :param deadline: time.time() at which the local search stops, or None (no time limit).
+        :return: Tuple of (number of valid intra-bus friendships, bus of each student) of the
+            (repaired and locally searched) child of PARENT_1 and PARENT_2.
+        """
+        bus_of = self.crossover(parent_1, parent_2)
+        self.repair(bus_of)
+        optimizer = FMOptimizer(self.graph, self.num_buses, self.bus_size, self.constraints, self.bus_solution(bus_of),
+                                max_passes=self.local_search_passes, exact_flips=False,
+                                time_limit=deadline - time.time() if deadline is not None else None,
+                                instance=self.instance)
+        optimizer.solve()
+        return optimizer.scorer.edges, optimizer.scorer.bus_of[:]
+
+    def tournament(self, population):
+        """
+        :return: the better of 2 random solutions of POPULATION (list of (edges, bus_of) tuples).
+        """
+        i, j = np.random.randint(len(population), size=2).tolist()
+        return max(population[i], population[j], key=lambda tup: tup[0])[1]
+
+    def solve(self):
+        deadline = time.time() + self.time_limit if self.time_limit is not None else None
+        scorer = DeltaScorer(self.instance)
+        population = []
+        keys = set()
+        for solution in self.population:
+            scorer.load(solution)
+            bus_of = scorer.bus_of[:]
+            if min(bus_of) >= 0 and self.key(bus_of) not in keys:
+                keys.add(self.key(bus_of))
+                population.append((scorer.edges, bus_of))
+
+        pool = None
+        if self.processes and self.processes > 1:
+            pool = multiprocessing.Pool(self.processes, initializer=init_heuristic_worker, initargs=(self.instance,))
+        try:
+            for generation in range(self.generations if len(population) > 1 else 0):
+                tasks = []
+                for _ in range(self.offspring_count):
+                    parent_1 = self.tournament(population)
+                    parent_2 = self.tournament(population)
+                    tasks.append((parent_1, parent_2, self.local_search_passes, deadline))
+                if pool is not None:
+                    children = pool.map(memetic_offspring, tasks)
+                else:
+                    children = []
+                    for parent_1, parent_2, _, _ in tasks:
+                        if out_of_time(deadline):
+                            break
+                        children.append(self.offspring(parent_1, parent_2, deadline))
+
+                for edges, bus_of in filter(None, children):
+                    worst = min(range(len(population)), key=lambda i: population[i][0])
+                    key = self.key(bus_of)
+                    if edges > population[worst][0] and key not in keys:
+                        keys.discard(self.key(population[worst][1]))
+                        keys.add(key)
+                        population[worst] = (edges, bus_of)
+
+                if self.verbose:
+                    best = max(population, key=lambda tup: tup[0])[0]
+                    sys.stdout.write(f"\r\tScore on generation {generation} of MemeticSolver: "
+                                     f"{round(best / self.instance.num_edges, 5)} {' ' * 20}")
+                    sys.stdout.flush()
+                if out_of_time(deadline):
+                    break
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        self.solution = self.bus_solution(max(population, key=lambda tup: tup[0])[1])
+        if self.verbose:
+            print("")
+        return self.solution
+
+
+##########
+# Racing #
+##########
+
+
+class RaceStats:
+    """
+    Per size category win statistics of the RacingSolver's configurations, kept in a JSON file of
+    {category: {configuration name: {"runs": number of races, "wins": number of races won}}}.
+    Several solver processes can record into the same file at once.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: path of the stats (.json) file.
+        """
+        self.path = path
+
+    def _lock(self):
+        """
+        :return: file descriptor of the exclusively locked lock file of the stats file.
+        """
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        fd = os.open(f"{self.path}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        return fd
+
+    def load(self):
+        """
+        :return: the stats dict (empty if there is no stats file or it can't be read).
+        """
+        try:
+            with open(self.path, 'r') as f:
+                stats = json.load(f)
+            return stats if isinstance(stats, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def record(self, category, names, winners):
+        """
+        Records a race of the configurations NAMES, won by the configurations WINNERS (ties
+        with the best score all win), on an input of size CATEGORY.
+        """
+        fd = self._lock()
+        try:
+            stats = self.load()
+            table = stats.setdefault(category, {})
+            for name in names:
+                entry = table.setdefault(name, {"runs": 0, "wins": 0})
+                entry["runs"] += 1
+                entry["wins"] += name in winners
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(stats, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.path)
+        finally:
+            os.close(fd)
+
+    def losers(self, category, min_runs):
+        """
+        :return: set of the configuration names that never won in at least MIN_RUNS races on CATEGORY.
+        """
+        table = self.load().get(category, {})
+        return {name for name, entry in table.items() if entry["runs"] >= min_runs and not entry["wins"]}
+
+
+def run_arm(instance, refiner, solution, time_limit):
+    """
+    Runs the optimizer REFINER (one of RACE_REFINERS) on SOLUTION for TIME_LIMIT seconds.
+
+    :return: Tuple where el 0 is the score and el 1 is the solution of the optimizer.
+    """
+    if refiner == "SIMULATED_ANNEALING":
+        optimizer = SimulatedAnnealingOptimizer(*instance, solution, schedule="REHEATING", time_limit=time_limit,
+                                                instance=instance)
+    elif refiner == "TABU":
+        optimizer = TabuSearchOptimizer(*instance, solution, time_limit=time_limit, instance=instance)
+    else:
+        raise ValueError(f"{refiner} is unsupported refiner for racing")
+    optimizer.solve()
+    return optimizer.set_score()[0], optimizer.solution
+
+
+def run_arm_task(task):
+    """
+    Worker function of RacingSolver, runs run_arm(WORKER_INSTANCE, refiner, solution, time_limit).
+
+    :param task: Tuple of (refiner, solution, time_limit, deadline). The time limit is cut to end by
+        time.time() deadline, it can be None.
+    :return: run_arm's tuple, or None if the deadline passed before the optimizer started.
+    """
+    refiner, solution, time_limit, deadline = task
+    if deadline is not None:
+        time_limit = min(time_limit, deadline - time.time())
+        if time_limit <= 0:
+            return None
+    return run_arm(WORKER_INSTANCE, refiner, solution, time_limit)
+
+
+class RacingSolver(Solver):
+    """
+    Successive halving over the heuristic configurations (see heuristic_configurations), each
+    followed by one of the RACE_REFINERS optimizers. Every configuration's heuristic is run once,
+    then each round gives every surviving configuration's optimizer a time budget (continuing from
+    its own solution), keeps the best half of them and doubles the budget, until one is left.
+
+    With a category, the result of the race is recorded in its RaceStats (configurations within
+    tie_tolerance of the winner's score win too), and configurations that never won in
+    min_runs * (number of configurations) races of that category are not raced.
+    """
+
+    def __init__(self, graph, num_buses, bus_size, constraints, category=None, stats=None, initial_budget=0.25,
+                 min_runs=1, tie_tolerance=0.005, processes=None, time_limit=None, verbose=False, instance=None):
+        """
+        :param category: size category of the input, for the stats.
+        :param stats: RaceStats obj, defaults to the stats of race_stats_path.
+        :param initial_budget: seconds of optimization that each configuration gets in the first round.
+        :param min_runs: a configuration is skipped once it lost min_runs * (number of configurations)
+            races on the category, i.e. about min_runs races per race it would win by chance.
+        :param tie_tolerance: configurations with a score within this of the winner's score win too.
+        :param processes: number of worker processes for the heuristics and optimizers of a round. They
+            are all run in this process if it is None or 1.
+        :param time_limit: seconds (wall-clock) of the whole race. The budget of a round is cut to fit
+            the time that is left, and the race ends with the best configuration when it runs out.
+        """
+        Solver.__init__(self, graph, num_buses, bus_size, constraints, instance=instance)
+        self.category = category
+        self.stats = stats if stats else (RaceStats(race_stats_path) if race_stats_path else None)
+        self.initial_budget = initial_budget
+        self.min_runs = min_runs
+        self.tie_tolerance = tie_tolerance
+        self.processes = processes
+        self.time_limit = time_limit
+        self.verbose = verbose
+
+    @staticmethod
+    def arm_name(configuration, refiner):
+        heuristic_class, tie_break, process_order = configuration
+        return f"{heuristic_class.__name__}/{tie_break}/{process_order}+{refiner}"
+
+    def arms(self):
+        """
+        :return: list of (name, heuristic configuration, refiner) tuples of the configurations to race.
+        """
+        arms = [(self.arm_name(configuration, refiner), configuration, refiner)
+                for configuration in heuristic_configurations() for refiner in RACE_REFINERS]
+        if self.category is not None and self.stats is not None:
+            losers = self.stats.losers(self.category, self.min_runs * len(arms))
+            if any(name not in losers for name, _, _ in arms):
+                arms = [arm for arm in arms if arm[0] not in losers]
+        return arms
+
+    def solve(self):
+        deadline = time.time() + self.time_limit if self.time_limit is not None else None
+        arms = self.arms()
+        configurations = list({configuration: None for _, configuration, _ in arms})
+        pool = None
+        if self.processes and self.processes > 1:
+            pool = multiprocessing.Pool(self.processes, initializer=init_heuristic_worker, initargs=(self.instance,))
+        try:
+            if pool is not None:
+                heuristics = pool.imap(run_configuration, configurations)
+            else:
+                heuristics = (run_heuristic(self.instance, *configuration) for configuration in configurations)
+            results = {}
+            for configuration, result in zip(configurations, heuristics):
+                results[configuration] = result
+                if out_of_time(deadline):
+                    break  # Only the configurations whose heuristic ran are raced.
+            arms = [arm for arm in arms if arm[1] in results]
+            results = {name: results[configuration] for name, configuration, _ in arms}
+
+            alive = arms
+            budget = self.initial_budget
+            while True:
+                if deadline is not None:
+                    # Cut the budget so that the round (len(alive) runs over the workers) ends in time.
+                    rounds = math.ceil(len(alive) / (self.processes if self.processes and self.processes > 1 else 1))
+                    budget = min(budget, (deadline - time.time()) / rounds)
+                    if budget <= 0:
+                        alive = sorted(alive, key=lambda arm: -results[arm[0]][0])
+                        break
+                if self.verbose:
+                    sys.stdout.write(f"\r\tRacing {len(alive)} configurations for {budget} seconds each {' ' * 20}")
+                    sys.stdout.flush()
+                tasks = [(refiner, results[name][1], budget, deadline) for name, _, refiner in alive]
+                if pool is not None:
+                    round_results = pool.map(run_arm_task, tasks)
+                    round_results = [result if result is not None else results[name]
+                                     for (name, _, _), result in zip(alive, round_results)]
+                else:
+                    round_results = []
+                    for i, (refiner, solution, arm_budget, _) in enumerate(tasks):
+                        if deadline is not None:
+                            # Also makes up for the time the optimizers take to start and stop.
+                            arm_budget = min(arm_budget, (deadline - time.time()) / (len(tasks) - i))
+                        if arm_budget > 0:
+                            round_results.append(run_arm(self.instance, refiner, solution, arm_budget))
+                        else:
+                            round_results.append(results[alive[i][0]])
+                for (name, _, _), result in zip(alive, round_results):
+                    if result[0] >= results[name][0]:
+                        results[name] = result
+                alive = sorted(alive, key=lambda arm: -results[arm[0]][0])
+                if len(alive) == 1 or out_of_time(deadline):
+                    break
+                alive = alive[:math.ceil(len(alive) / 2)]
+                budget *= 2
+        finally:
+            if pool is not None:
+                # Also stops the heuristics that are still queued (or running) when the time ran out.
+                pool.terminate()
+                pool.join()
+
+        winner = alive[0][0]
+        if self.category is not None and self.stats is not None:
+            winners = {name for name, _, _ in arms if results[name][0] >= results[winner][0] - self.tie_tolerance}
+            self.stats.record(self.category, [name for name, _, _ in arms], winners)
+        self.solution = results[winner][1]
+        if self.verbose:
+            print(f"\r\tRace won by {winner} {' ' * 20}")
+        return self.solution
+
+
+############################
+# Main Execution Functions #
+############################
+
+
+def parse_input(folder_name, compact=False, use_cache=True):
+    """
+        Parses an input and returns the corresponding graph and parameters
+
+        Inputs:
+            folder_name - a string representing the path to the input folder
+            compact - return the graph as a CompactGraph (and the constraints with its int vertices)
+            use_cache - read the compact input from its binary cache (see input_reader.py)
+
+        Outputs:
+            ProblemInstance object, which unpacks as (graph, num_buses, bus_size, constraints)
+            graph - the graph as a NetworkX object (or CompactGraph object)
+            num_buses - an integer representing the number of buses you can allocate to
+            bus_sizes - an integer representing the number of students that can fit on a bus
+            constraints - a list where each element is a list vertices which represents a single rowdy group
+    """
+    if compact:
+        data = read_input(folder_name, use_cache=use_cache)
+        graph = CompactGraph(data.indptr, data.indices, data.labels, data.num_edges)
+        return ProblemInstance(graph, data.num_buses, data.bus_size, data.constraints)
+
+    graph = nx.read_gml(folder_name + "/graph.gml")
+    num_buses, bus_size, constraints = read_parameters(folder_name)
+    return ProblemInstance(graph, num_buses, bus_size, constraints)
+
+
+TIE_BREAK_BREAKS = [
+    "LEAST_FULL",
+    "HEURISTIC",
+    "MOST_FULL",
+    "DEFAULT"
+]
+
+TIE_BREAK_PROCESS = [
+    "PRIO_QUEUE",
+    "HIGH_DEGREE",
+    "LOW_DEGREE",
+]
+
+OVER_CORR_BREAKS = [
+    "LEAST_FULL",
+    "HEURISTIC"
+]
+
+OVER_CORR_PROCESS = [
+    "PRIO_QUEUE",
+]
+
+RACE_REFINERS = [
+    "SIMULATED_ANNEALING",
+    "TABU",
+]
+
+REFINERS = [
+    "TREE_SEARCH",
+    "FM",
+    "SIMULATED_ANNEALING",
+    "TABU",
+    "PARALLEL_TEMPERING",
+]
+
+# Shares of solve's time limit of its phases, in order. A phase gets its share of the
+# time that is left, out of the shares of the phases that are left (so the time that
+# a phase doesn't use goes to the later phases).
+PHASE_BUDGETS = {
+    "HEURISTICS": 0.3,
+    "REFINE": 0.55,
+    "POLISH": 0.15,
+}
+
+
+def phase_time_limit(deadline, phase, phase_budgets=None):
+    """
+    :param deadline: time.time() at which the input has to be solved, or None (no time limit).
+    :param phase: key of PHASE_BUDGETS.
+    :param phase_budgets: dict that overrides PHASE_BUDGETS.
+    :return: seconds that PHASE gets (see PHASE_BUDGETS), or None if there is no deadline.
+    """
+    if deadline is None:
+        return None
+    budgets = phase_budgets if phase_budgets else PHASE_BUDGETS
+    phases = list(budgets)
+    left = sum(budgets[p] for p in phases[phases.index(phase):])
+    return max(0.0, deadline - time.time()) * budgets[phase] / left
+
+
+def heuristic_configurations():
+    """
+    :return: list of (heuristic solver class, tie_break, process_order) tuples of all of the
+        heuristic solvers that solve runs (from the lists above), in order.
+    """
+    configurations = []
+    for tie_break in TIE_BREAK_BREAKS:
+        for process_order in TIE_BREAK_PROCESS:
+            configurations.append((DDHeuristicTieBreakers, tie_break, process_order))
+    for tie_break in OVER_CORR_BREAKS:
+        for process_order in OVER_CORR_PROCESS:
+            configurations.append((DDHeuristicOversizeCorrection, tie_break, process_order))
+    return configurations
+
+
+def run_heuristic(instance, heuristic_class, tie_break, process_order):
+    """
+    :return: Tuple where el 0 is the score and el 1 is the solution of the heuristic solver.
+    """
+    solver = heuristic_class(*instance, tie_break, instance=instance)
+    solver.solve(process_order)
+    return solver.set_score()[0], solver.solution
+
+
+WORKER_INSTANCE = None  # ProblemInstance of a heuristic worker process, see init_heuristic_worker
+
+
+def init_heuristic_worker(instance):
+    """ Initializer of the heuristic worker processes, so they get the instance only once. """
+    global WORKER_INSTANCE
+    WORKER_INSTANCE = instance
+    np.random.seed()  # Forked workers would all have the same random state otherwise.
+
+
+def run_configuration(configuration):
+    """ Worker function of run_heuristics, runs CONFIGURATION on WORKER_INSTANCE (see run_heuristic). """
+    return run_heuristic(WORKER_INSTANCE, *configuration)
+
+
+def run_heuristics(instance, processes=None, verbose=False, time_limit=None):
+    """
+    Runs all of the heuristic configurations (see heuristic_configurations).
+
+    :param processes: number of worker processes. They are all run in this process if it is None or 1.
+    :param time_limit: seconds (wall-clock) after which no more configurations are run
+        (the first one always runs).
+    :return: list of (score, solution) tuples of the configurations that were run, in order.
+    """
+    deadline = time.time() + time_limit if time_limit is not None else None
+    configurations = heuristic_configurations()
+    if processes and processes > 1:
+        if verbose:
+            sys.stdout.write(f"\r\tSolving {len(configurations)} heuristic configurations "
+                             f"with {processes} processes... {' ' * 10}")
+            sys.stdout.flush()
+        results = []
+        with multiprocessing.Pool(processes, initializer=init_heuristic_worker, initargs=(instance,)) as pool:
+            for result in pool.imap(run_configuration, configurations):
+                results.append(result)
+                if out_of_time(deadline):
+                    break  # The pool is terminated with the configurations that are left.
+        return results
+    results = []
+    for heuristic_class, tie_break, process_order in configurations:
+        if results and out_of_time(deadline):
+            break
+        if verbose:
+            sys.stdout.write(f"\r\tSolving using {heuristic_class.__name__}... "
+                             f"({tie_break}) ({process_order}) {' ' * 10}")
+            sys.stdout.flush()
+        results.append(run_heuristic(instance, heuristic_class, tie_break, process_order))
+    return results
+
+
+def run_heuristic_batch(task):
+    """
+    Runs a batch of heuristic configurations in a worker process.
+
+    :param task: Tuple of (list of (configuration index, configuration) tuples, deadline). No more
+        configurations are run after time.time() deadline (the first one always runs), it can be None.
+    :return: (score, configuration index, solution) of the best configuration of the batch.
+        Ties go to the lowest configuration index (the order solve would have used).
+    """
+    indexed_configurations, deadline = task
+    best = None
+    for i, (heuristic_class, tie_break, process_order) in indexed_configurations:
+        if best is not None and out_of_time(deadline):
+            break
+        score, solution = run_heuristic(WORKER_INSTANCE, heuristic_class, tie_break, process_order)
+        if best is None or score > best[0]:
+            best = (score, i, solution)
+    return best
+
+
+def solve(graph, num_buses, bus_size, constraints, verbose=False, instance=None, processes=None,
+          refiner="TREE_SEARCH", time_limit=None, phase_budgets=None):
+    """
+    Params are obvious, they are from the skeleton code.
+    :param instance: the ProblemInstance obj of the input (from parse_input), it is
+        shared by all of the solvers. Built from the other params if it is not given.
+    :param processes: number of worker processes for the heuristic solvers and the rollouts of the
+        TreeSearchOptimizer (or the replicas of the ParallelTemperingOptimizer). They are all run
+        in this process if it is None or 1.
+    :param refiner: one of REFINERS, the optimizer that refines the best heuristic solution
+        (before the BasicOptimizer).
+    :param time_limit: seconds (wall-clock) to solve the input in, split between the heuristics, the
+        refiner and the BasicOptimizer by PHASE_BUDGETS. Each phase keeps its best solution so far
+        when it runs out. No time limit if it is None.
+    :param phase_budgets: dict that overrides PHASE_BUDGETS.
+    :return: The solver instance.
+
+    Note: we might have this function branch off (by calling other functions)
+    depending on some future solvers that we implement.
+    """
+    deadline = time.time() + time_limit if time_limit is not None else None
+    instance = instance if instance else ProblemInstance(graph, num_buses, bus_size, constraints)
+    configurations = heuristic_configurations()
+    heuristic_time_limit = phase_time_limit(deadline, "HEURISTICS", phase_budgets)
+    if processes and processes > 1:
+        if verbose:
+            sys.stdout.write(f"\r\tSolving {len(configurations)} heuristic configurations "
+                             f"with {processes} processes... {' ' * 10}")
+            sys.stdout.flush()
+        # Each worker gets a batch of configurations and only sends back its best solution.
+        batches = [list(enumerate(configurations))[i::processes] for i in range(processes)]
+        heuristic_deadline = time.time() + heuristic_time_limit if deadline is not None else None
+        with multiprocessing.Pool(processes, initializer=init_heuristic_worker, initargs=(instance,)) as pool:
+            results = pool.map(run_heuristic_batch, [(batch, heuristic_deadline) for batch in batches if batch])
+        heuristic_sol = max(results, key=lambda tup: (tup[0], -tup[1]))[2]
+    else:
+        heuristic_sol = max(run_heuristics(instance, verbose=verbose, time_limit=heuristic_time_limit),
+                            key=lambda tup: tup[0])[1]
+
+    if verbose:
+        sys.stdout.write(f"\r\tOptimizing... {' ' * 100}")
+        sys.stdout.flush()
+    refine_time_limit = phase_time_limit(deadline, "REFINE", phase_budgets)
+    if refiner.upper() == "FM":
+        solver = FMOptimizer(graph, num_buses, bus_size, constraints, heuristic_sol, time_limit=refine_time_limit,
+                             verbose=verbose, instance=instance)
+    elif refiner.upper() == "SIMULATED_ANNEALING":
+        solver = SimulatedAnnealingOptimizer(graph, num_buses, bus_size, constraints, heuristic_sol,
+                                             schedule="REHEATING", time_limit=refine_time_limit, verbose=verbose,
+                                             instance=instance)
+    elif refiner.upper() == "TABU":
+        solver = TabuSearchOptimizer(graph, num_buses, bus_size, constraints, heuristic_sol,
+                                     time_limit=refine_time_limit, verbose=verbose, instance=instance)
+    elif refiner.upper() == "PARALLEL_TEMPERING":
+        solver = ParallelTemperingOptimizer(graph, num_buses, bus_size, constraints, heuristic_sol,
+                                            processes=processes, time_limit=refine_time_limit, verbose=verbose,
+                                            instance=instance)
+    elif refiner.upper() == "TREE_SEARCH":
+        solver = TreeSearchOptimizer(graph, num_buses, bus_size, constraints, heuristic_sol, sample_size=300,
+                                     max_rollout=max(20, num_buses), verbose=verbose, processes=processes,
+                                     time_limit=refine_time_limit, instance=instance)
+    else:
+        raise ValueError(f"{refiner} is unsupported refiner for solve")
+    solver.solve()
+    solver = BasicOptimizer(graph, num_buses, bus_size, constraints, solver.solution, sample_size=300,
+                            verbose=verbose, time_limit=phase_time_limit(deadline, "POLISH", phase_budgets),
+                            instance=instance)
+    solver.solve()
+
+    return solver
+
+
+def solve_multilevel(graph, num_buses, bus_size, constraints, verbose=False, instance=None, time_limit=None,
+                     phase_budgets=None):
+    """
+    Same params as solve. Solves the input with the MultilevelSolver, instead of the sweep of
+    heuristic solvers and the TreeSearchOptimizer, then runs the BasicOptimizer on its solution.
+    With a time limit, the MultilevelSolver gets the REFINE phase budget (see PHASE_BUDGETS).
+    :return: The solver instance.
+    """
+    deadline = time.time() + time_limit if time_limit is not None else None
+    instance = instance if instance else ProblemInstance(graph, num_buses, bus_size, constraints)
+    if verbose:
+        sys.stdout.write(f"\r\tSolving using MultilevelSolver... {' ' * 50}")
+        sys.stdout.flush()
+    solver = MultilevelSolver(graph, num_buses, bus_size, constraints, verbose=verbose,
+                              time_limit=phase_time_limit(deadline, "REFINE", phase_budgets), instance=instance)
+    solver.solve()
+    solver = BasicOptimizer(graph, num_buses, bus_size, constraints, solver.solution, sample_size=300,
+                            verbose=verbose, time_limit=phase_time_limit(deadline, "POLISH", phase_budgets),
+                            instance=instance)
+    solver.solve()
+    return solver
+
+
+def solve_memetic(graph, num_buses, bus_size, constraints, verbose=False, instance=None, processes=None,
+                  time_limit=None, phase_budgets=None):
+    """
+    Same params as solve. Runs all of the heuristic configurations of solve and solves the input
+    with the MemeticSolver (with all of the heuristic solutions as its initial population),
+    then runs the BasicOptimizer on its solution.
+    With a time limit, the MemeticSolver gets the REFINE phase budget (see PHASE_BUDGETS).
+    :return: The solver instance.
+    """
+    deadline = time.time() + time_limit if time_limit is not None else None
+    instance = instance if instance else ProblemInstance(graph, num_buses, bus_size, constraints)
+    heuristics = run_heuristics(instance, processes=processes, verbose=verbose,
+                                time_limit=phase_time_limit(deadline, "HEURISTICS", phase_budgets))
+    population = [solution for _, solution in heuristics]
+    if verbose:
+        sys.stdout.write(f"\r\tSolving using MemeticSolver... {' ' * 50}")
+        sys.stdout.flush()
+    solver = MemeticSolver(graph, num_buses, bus_size, constraints, population, processes=processes,
+                           time_limit=phase_time_limit(deadline, "REFINE", phase_budgets), verbose=verbose,
+                           instance=instance)
+    solver.solve()
+    solver = BasicOptimizer(graph, num_buses, bus_size, constraints, solver.solution, sample_size=300,
+                            verbose=verbose, time_limit=phase_time_limit(deadline, "POLISH", phase_budgets),
+                            instance=instance)
+    solver.solve()
+    return solver
+
+
+def solve_racing(graph, num_buses, bus_size, constraints, verbose=False, instance=None, processes=None,
+                 category=None, time_limit=None, phase_budgets=None):
+    """
+    Same params as solve. Solves the input with the RacingSolver (successive halving over the
+    heuristic configurations and RACE_REFINERS), then runs the BasicOptimizer on its solution.
+    With a time limit, the RacingSolver (which runs its own heuristics) gets the REFINE phase budget,
+    which then includes its share of the HEURISTICS budget (see PHASE_BUDGETS).
+    :param category: size category of the input, for the RacingSolver's win statistics.
+    :return: The solver instance.
+    """
+    deadline = time.time() + time_limit if time_limit is not None else None
+    instance = instance if instance else ProblemInstance(graph, num_buses, bus_size, constraints)
+    solver = RacingSolver(graph, num_buses, bus_size, constraints, category=category, processes=processes,
+                          time_limit=phase_time_limit(deadline, "REFINE", phase_budgets), verbose=verbose,
+                          instance=instance)
+    solver.solve()
+    solver = BasicOptimizer(graph, num_buses, bus_size, constraints, solver.solution, sample_size=300,
+                            verbose=verbose, time_limit=phase_time_limit(deadline, "POLISH", phase_budgets),
+                            instance=instance)
+    solver.solve()
+    return solver
+
+
+def optimize_ours(graph, num_buses, bus_size, constraints, solution, sample_size, max_rollout, verbose=False,
+                  instance=None):
+    # Optimizes our own solutions
+    solver = TreeSearchOptimizer(graph, num_buses, bus_size, constraints, solution, sample_size=sample_size,
+                                 max_rollout=max_rollout, verbose=False, early_termination=False, instance=instance)
+    solver.solve()
+    return solver
+
+
+def solve_function(category):
+    """
+    :return: the function (solve, solve_multilevel, solve_memetic or solve_racing) that main uses
+        for the inputs of size CATEGORY.
+    """
+    if category in multilevel_categories:
+        return solve_multilevel
+    if category in memetic_categories:
+        return solve_memetic
+    if category in racing_categories:
+        return functools.partial(solve_racing, category=category)
+    return solve
+
+
+def solve_input(input_path, category=None):
+    """
+    Parses and solves a single input, this is what the worker processes of main run.
+
+    :param input_path: path to the input folder.
+    :param category: size category of the input (see solve_function).
+    :return: Tuple of (score, msg, solution with the vertex labels). Score is -1 and
+        msg is the error if the input could not be solved.
+    """
+    try:
+        instance = parse_input(input_path, compact=True)
+        solver_instance = solve_function(category)(*instance, instance=instance, time_limit=input_time_limit)
+        score, msg = solver_instance.set_score()
+        return score, msg, solver_instance.labeled_solution()
+    except Exception as e:
+        return -1, f"{type(e).__name__}: {e}", None
+
+
+def solve_input_task(task):
+    """
+    :param task: (task index, input path, category) tuple.
+    :return: (task index, result of solve_input)
+    """
+    i, input_path, category = task
+    return i, solve_input(input_path, category)
+
+
+def prefetch_input(input_path):
+    """ Worker function of InputPrefetcher, runs parse_input(INPUT_PATH, compact=True). """
+    return parse_input(input_path, compact=True)
+
+
+class InputPrefetcher:
+    """
+    Iterable over parsed inputs. A worker process parses (and precomputes the ProblemInstance of)
+    the next inputs while the current one is being solved, so this process only unpickles them.
+    (A thread would hold the GIL while it parses.)
+    """
+
+    def __init__(self, input_paths, prefetch=2):
+        """
+        :param input_paths: list of paths to the input folders, in the order they are wanted.
+        :param prefetch: max number of inputs parsed ahead of the one being solved.
+        """
+        self.input_paths = input_paths
+        self.prefetch = max(1, prefetch)
+        self.pool = multiprocessing.Pool(1)
+        self.pending = deque()  # AsyncResults of prefetch_input, in the order of self.input_paths.
+        self.submitted = 0
+
+    def _submit(self):
+        while self.submitted < len(self.input_paths) and len(self.pending) < self.prefetch:
+            self.pending.append(self.pool.apply_async(prefetch_input, (self.input_paths[self.submitted],)))
+            self.submitted += 1
+
+    def __iter__(self):
+        """
+        :return: generator of (input path, ProblemInstance) tuples.
+        :raises: the error of an input that could not be parsed.
+        """
+        self._submit()
+        for input_path in self.input_paths:
+            result = self.pending.popleft()
+            self._submit()
+            yield input_path, result.get()
+
+    def close(self):
+        """
+        Stops the worker process, along with the inputs it has left to parse.
+        """
+        self.pool.terminate()
+        self.pool.join()
+
+
+class OutputWriter:
+    """
+    Writes outputs (with write_output) on a background thread, so the solver doesn't wait on file I/O.
+    write_output's messages are printed by the thread that calls put and close (so they don't get
+    mixed up with the solver's progress lines).
+    """
+
+    def __init__(self, verbose=False):
+        """
+        :param verbose: print write_output's messages or not.
+        """
+        self.verbose = verbose
+        self.queue = queue.Queue()
+        self.messages = queue.Queue()
+        self.error = None
+        self.thread = threading.Thread(target=self._write, daemon=True)
+        self.thread.start()
+
+    def _write(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            try:
+                self.messages.put(write_output(*item))
+            except Exception as e:
+                self.error = self.error if self.error else e
+
+    def print_messages(self):
+        """
+        Prints the messages of the outputs written so far (if verbose).
+        """
+        while not self.messages.empty():
+            msg = self.messages.get()
+            if self.verbose:
+                print(msg)
+
+    def put(self, file_path, score, solution):
+        """
+        Queues SOLUTION to be written to FILE_PATH (see write_output).
+        """
+        self.print_messages()
+        if self.error is not None:
+            raise self.error
+        self.queue.put((file_path, score, solution))
+
+    def close(self, raise_error=True):
+        """
+        Waits for all queued outputs to be written.
+
+        :param raise_error: raise the writer thread's error, False when the caller is already
+            handling an exception (which would be replaced by it).
+        :raises: the first error of the writer thread.
+        """
+        self.queue.put(None)
+        self.thread.join()
+        self.print_messages()
+        if raise_error and self.error is not None:
+            raise self.error
+
+
+def input_tasks(size_categories):
+    """
+    :return: list of (category, input name) tuples of all inputs, longest first, i.e. by
+        category (last category first), then by graph.gml size (largest first).
+    """
+    tasks = []
+    for rank, size in enumerate(size_categories):
+        category_path = path_to_inputs + "/" + size
+        for input_name in os.listdir(category_path):
+            graph_path = f"{category_path}/{input_name}/graph.gml"
+            graph_size = os.path.getsize(graph_path) if os.path.isfile(graph_path) else 0
+            tasks.append((-rank, -graph_size, size, input_name))
+    return [(size, input_name) for _, _, size, input_name in sorted(tasks)]
+
+
+def main(processes=None, prefetch=2):
+    """
+        Main method which iterates over all inputs and calls `solve` on each.
+        The student should modify `solve` to return their solution and modify
+        the portion which writes it to a file to make sure their output is
+        formatted correctly.
+
+        :param processes: number of worker processes, each solving one input at a time.
+            Defaults to num_processes. This process is the only one that writes the
+            outputs and records the scores.
+        :param prefetch: (one process only) number of inputs parsed ahead of the solver.
+    """
+    global SCORES
+
+    processes = processes if processes else num_processes
+    size_categories = ["small", "medium", "large"]
+    if not os.path.isdir(path_to_outputs):
+        os.mkdir(path_to_outputs)
+
+    # Load previous scores (the old scores.json file is merged into the ledger).
+    SCORES = score_ledger().load(legacy_path=score_path)
+    if SCORES:
+        print("!!~~ LOADED PREVIOUS SCORES ~~!!\n")
+
+    t_start = time.time()
+    for size in size_categories:
+        output_category_path = path_to_outputs + "/" + size
+        if not os.path.isdir(output_category_path):
+            os.mkdir(output_category_path)
+
+    if processes > 1:
+        tasks = input_tasks(size_categories)
+        input_paths = [f"{path_to_inputs}/{size}/{input_name}" for size, input_name in tasks]
+        failed = []
+        with multiprocessing.Pool(processes) as pool:
+            # Results come back as soon as they are done, the longest inputs are scheduled first.
+            results = pool.imap_unordered(solve_input_task, [(i, input_paths[i], tasks[i][0]) for i in range(len(tasks))])
+            for i, (score, msg, solution) in results:
+                size, input_name = tasks[i]
+                if score < 0:
+                    print(f"[{str(datetime.datetime.utcnow())[11:]}] FAILED {size}/{input_name}: {msg}\n")
+                    failed.append(f"{size}/{input_name}")
+                    continue
+                write_output(f"{path_to_outputs}/{size}/{input_name}.out", score, solution, verbose=True)
+        if failed:
+            print(f"Failed inputs: {failed}")
+    else:
+        tasks = []
+        for size in size_categories:
+            category_path = path_to_inputs + "/" + size
+            category_dir = os.fsencode(category_path)
+            tasks.extend((size, os.fsdecode(input_folder)) for input_folder in os.listdir(category_dir))
+
+        # Inputs are parsed ahead by a loader process and outputs are written by a writer thread.
+        writer = OutputWriter(verbose=True)
+        prefetcher = InputPrefetcher([f"{path_to_inputs}/{size}/{input_name}" for size, input_name in tasks],
+                                     prefetch=prefetch)
+        try:
+            for (size, input_name), (_, instance) in zip(tasks, prefetcher):
+                solver_instance = solve_function(size)(*instance, verbose=True, instance=instance,
+                                                       time_limit=input_time_limit)
+                solver_instance.write(input_name, path_to_outputs + "/" + size, verbose=True, writer=writer)
+        except BaseException:
+            writer.close(raise_error=False)  # Keeps the original error.
+            raise
+        else:
+            writer.close()
+        finally:
+            prefetcher.close()
 
     time_elapsed = datetime.timedelta(seconds=(time.time() - t_start))
     print(f"Time Elapsed: {time_elapsed} hrs")
@@ -0,0 +1,48 @@
+import os
+import sys
+import random
+import networkx as nx
+
+# The solver modules are top level scripts of the repo, not a package.
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+INPUTS_DIR = os.path.join(REPO_DIR, "all_inputs")
+
+
+def random_input(seed, num_vertices=30, num_buses=4, num_edges=70, num_groups=8):
+    """
+    Small random input with string labels (like the GML files), some self loops and
+    rowdy groups of 1 to 4 students (so that some of them can be whole on one bus).
+    The buses are big enough for any move to keep the solution valid.
+
+    :return: Tuple of (graph, num_buses, bus_size, constraints)
+    """
+    rng = random.Random(seed)
+    graph = nx.gnm_random_graph(num_vertices, num_edges, seed=seed)
+    graph.add_edges_from((u, u) for u in rng.sample(range(num_vertices), 3))
+    graph = nx.relabel_nodes(graph, {u: str(u) for u in graph.nodes()})
+    nodes = list(graph.nodes())
+    constraints = [rng.sample(nodes, rng.randint(1, 4)) for _ in range(num_groups)]
+    return graph, num_buses, num_vertices, constraints
+
+
+def random_solution(seed, graph, num_buses):
+    """
+    :return: random solution (list of lists (buses) of vertices) with no empty bus.
+    """
+    rng = random.Random(seed)
+    nodes = list(graph.nodes())
+    rng.shuffle(nodes)
+    solution = [[u] for u in nodes[:num_buses]]
+    for u in nodes[num_buses:]:
+        solution[rng.randrange(num_buses)].append(u)
+    return solution
+
+
+def round_robin_solution(instance):
+    """
+    :return: valid solution of INSTANCE (a ProblemInstance) that deals the students out to the buses.
+    """
+    nodes = list(instance.graph.nodes())
+    return [nodes[i::instance.num_buses] for i in range(instance.num_buses)]
@@ -0,0 +1,77 @@
+import random
+import pytest
+from conftest import random_input, random_solution
+from solver import ProblemInstance, Solver, DeltaScorer
+
+
+def set_score_edges(instance, assignment):
+    """
+    :return: number of counted friendships of ASSIGNMENT according to Solver.set_score.
+    """
+    solver = Solver(*instance, solution=assignment.to_solution(instance.nodes), instance=instance)
+    score, msg = solver.set_score()
+    assert score >= 0, msg
+    return round(score * instance.num_edges)
+
+
+def random_swap(rng, scorer, num_buses):
+    """
+    :return: random (vertex_1, vertex_2, bus1, bus2) swap where either vertex can be None (a move),
+        that never empties a bus.
+    """
+    buses = scorer.assignment.buses
+    bus1, bus2 = rng.sample(range(num_buses), 2)
+    vertex_1 = rng.choice(buses[bus1])
+    vertex_2 = rng.choice(buses[bus2])
+    if rng.random() < 0.3 and len(buses[bus1]) > 1:
+        vertex_2 = None
+    elif rng.random() < 0.3 and len(buses[bus2]) > 1:
+        vertex_1 = None
+    return vertex_1, vertex_2, bus1, bus2
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_load_matches_set_score(seed):
+    instance = ProblemInstance(*random_input(seed))
+    solution = random_solution(seed, instance.graph, instance.num_buses)
+    scorer = DeltaScorer(instance, solution)
+    solver = Solver(*instance, solution=solution, instance=instance)
+    assert scorer.score == pytest.approx(solver.set_score()[0])
+    assert sum(scorer.bus_edges) == scorer.edges
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_swaps_match_set_score(seed):
+    rng = random.Random(seed)
+    instance = ProblemInstance(*random_input(seed))
+    scorer = DeltaScorer(instance, random_solution(seed, instance.graph, instance.num_buses))
+
+    for _ in range(200):
+        vertex_1, vertex_2, bus1, bus2 = random_swap(rng, scorer, instance.num_buses)
+        moves = DeltaScorer.swap_moves(vertex_1, vertex_2, bus1, bus2)
+        edges = scorer.edges
+        delta = scorer.delta(moves)
+        assert scorer.swap_delta(vertex_1, vertex_2, bus1, bus2) == delta
+
+        if rng.random() < 0.5:
+            scorer.apply_swap(vertex_1, vertex_2, bus1, bus2)
+        else:
+            scorer.apply(moves)
+        assert scorer.edges == edges + delta
+        assert scorer.edges == set_score_edges(instance, scorer.assignment)
+
+    # The incrementally updated counters are the same as the ones built from scratch.
+    fresh = DeltaScorer(instance, scorer.assignment.to_solution(instance.nodes))
+    assert scorer.bus_edges == fresh.bus_edges
+    assert scorer.invalid_count == fresh.invalid_count
+    assert scorer.group_counts == fresh.group_counts
+
+
+def test_score_after_does_not_change_the_solution():
+    instance = ProblemInstance(*random_input(0))
+    solution = random_solution(0, instance.graph, instance.num_buses)
+    scorer = DeltaScorer(instance, solution)
+    vertex_1, vertex_2 = scorer.assignment.buses[0][0], scorer.assignment.buses[1][0]
+    scorer.score_after(DeltaScorer.swap_moves(vertex_1, vertex_2, 0, 1))
+    assert scorer.assignment.bus_of[vertex_1] == 0 and scorer.assignment.bus_of[vertex_2] == 1
+    assert scorer.edges == DeltaScorer(instance, solution).edges
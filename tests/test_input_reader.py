@@ -0,0 +1,170 @@
+import os
+import shutil
+import numpy as np
+import networkx as nx
+import pytest
+from conftest import INPUTS_DIR, random_input, random_solution
+import input_reader
+from input_reader import read_input, parse_input_data, CACHE_DIR
+from output_scorer import score_output
+from solver import Solver, write_solution_file
+
+
+@pytest.fixture
+def input_folder(tmp_path):
+    """
+    :return: path of a copy of a small input (so that its cache is made in the tmp folder).
+    """
+    folder = str(tmp_path / "input")
+    shutil.copytree(os.path.join(INPUTS_DIR, "small", "1"), folder, ignore=shutil.ignore_patterns(CACHE_DIR))
+    return folder
+
+
+def assert_same_input(data, expected):
+    assert np.array_equal(data.indptr, expected.indptr)
+    assert np.array_equal(data.indices, expected.indices)
+    assert list(data.labels) == list(expected.labels)
+    assert data.num_edges == expected.num_edges
+    assert (data.num_buses, data.bus_size) == (expected.num_buses, expected.bus_size)
+    assert data.constraints == expected.constraints
+
+
+def test_cache_round_trip(input_folder):
+    parsed = read_input(input_folder)
+    assert os.path.isfile(f"{input_folder}/{CACHE_DIR}/meta.json")
+    cached = read_input(input_folder)
+    assert isinstance(cached.indptr, np.memmap)
+    assert_same_input(cached, parsed)
+    assert_same_input(cached, parse_input_data(input_folder))
+
+
+def test_cache_is_rebuilt_when_an_input_file_changes(input_folder):
+    read_input(input_folder)
+    with open(f"{input_folder}/parameters.txt", 'r') as f:
+        lines = f.readlines()
+    with open(f"{input_folder}/parameters.txt", 'w') as f:
+        f.write(f"{int(lines[0]) + 1}\n")
+        f.writelines(lines[1:])
+
+    data = read_input(input_folder)
+    assert data.num_buses == int(lines[0]) + 1
+    assert read_input(input_folder).num_buses == int(lines[0]) + 1
+
+
+def test_cache_is_rebuilt_when_the_modification_time_changes(input_folder, monkeypatch):
+    read_input(input_folder)
+    stat = os.stat(f"{input_folder}/graph.gml")
+    os.utime(f"{input_folder}/graph.gml", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    parsed = []
+    monkeypatch.setattr(input_reader, "parse_input_data",
+                        lambda folder: parsed.append(folder) or parse_input_data(folder))
+    read_input(input_folder)
+    read_input(input_folder)
+    assert parsed == [input_folder]  # Parsed once, then read from the new cache.
+
+
+def test_broken_cache_is_ignored(input_folder):
+    expected = read_input(input_folder)
+    os.remove(f"{input_folder}/{CACHE_DIR}/indices.npy")
+    assert_same_input(read_input(input_folder), expected)
+    assert os.path.isfile(f"{input_folder}/{CACHE_DIR}/indices.npy")
+
+
+def test_no_cache(input_folder):
+    read_input(input_folder, use_cache=False)
+    assert not os.path.exists(f"{input_folder}/{CACHE_DIR}")
+
+
+def test_read_only_cache(input_folder):
+    expected = read_input(input_folder, read_only=True)
+    assert not os.path.exists(f"{input_folder}/{CACHE_DIR}")
+    read_input(input_folder)
+    cached = read_input(input_folder, read_only=True)
+    assert isinstance(cached.indptr, np.memmap)
+    assert_same_input(cached, expected)
+
+
+GML_INPUTS = [("small", "1"), ("small", "42"), ("medium", "100"), ("medium", "250"), ("large", "1000")]
+
+
+@pytest.mark.parametrize("category, name", GML_INPUTS)
+def test_gml_reader_matches_networkx(category, name):
+    file_path = os.path.join(INPUTS_DIR, category, name, "graph.gml")
+    arrays = input_reader.read_gml_arrays(file_path)
+    expected = input_reader.read_gml_arrays_networkx(file_path)
+    assert np.array_equal(arrays[0], expected[0])
+    assert np.array_equal(arrays[1], expected[1])
+    assert arrays[2:] == expected[2:]
+
+
+def test_gml_reader_round_trip(tmp_path):
+    graph = nx.Graph()
+    graph.add_nodes_from(["b", "a", "c d", "x", "5"])
+    graph.add_edges_from([("a", "b"), ("c d", "a"), ("x", "x"), ("5", "b"), ("x", "c d")])
+    nx.write_gml(graph, str(tmp_path / "graph.gml"))
+
+    indptr, indices, labels, num_edges = input_reader.read_gml_arrays(str(tmp_path / "graph.gml"))
+    assert labels == list(graph.nodes())
+    assert num_edges == graph.number_of_edges()
+    read_graph = nx.read_gml(str(tmp_path / "graph.gml"))
+    for u, label in enumerate(labels):
+        neighbors = [labels[v] for v in indices[indptr[u]:indptr[u + 1]]]
+        assert neighbors == list(read_graph.neighbors(label))  # Same order as nx.read_gml.
+        assert set(neighbors) == set(graph.neighbors(label))
+
+
+@pytest.mark.parametrize("gml", [
+    # networkx reads lists that are on one line, the line by line reader doesn't.
+    'graph [\n  node [ id 0 label "x" ]\n  node [ id 1 label "y" ]\n  edge [ source 0 target 1 ]\n]\n',
+    # Labels with HTML entities (how nx.write_gml escapes non ASCII characters).
+    'graph [\n  node [\n    id 0\n    label "&#233;"\n  ]\n  node [\n    id 1\n    label "y"\n  ]\n'
+    '  edge [\n    source 0\n    target 1\n  ]\n]\n',
+])
+def test_unhandled_gml_falls_back_to_networkx(input_folder, gml):
+    with open(f"{input_folder}/graph.gml", 'w') as f:
+        f.write(gml)
+    labels = list(nx.read_gml(f"{input_folder}/graph.gml").nodes())
+    with open(f"{input_folder}/parameters.txt", 'w', encoding='utf8') as f:
+        f.write(f"2\n1\n{labels}\n")
+    with pytest.raises(input_reader.GMLFormatError):
+        input_reader.read_gml_arrays(f"{input_folder}/graph.gml")
+
+    data = read_input(input_folder)
+    assert data.labels == labels
+    assert data.num_edges == 1
+    assert data.constraints == [[0, 1]]
+
+
+def write_input(folder, graph, num_buses, bus_size, constraints):
+    os.makedirs(folder)
+    nx.write_gml(graph, f"{folder}/graph.gml")
+    with open(f"{folder}/parameters.txt", 'w') as f:
+        f.write(f"{num_buses}\n{bus_size}\n")
+        for grp in constraints:
+            f.write(f"{grp}\n")
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_output_scorer_matches_set_score(tmp_path, seed):
+    graph, num_buses, bus_size, constraints = random_input(seed)
+    folder = str(tmp_path / "input")
+    write_input(folder, graph, num_buses, bus_size, constraints)
+    solution = random_solution(seed, graph, num_buses)
+    write_solution_file(str(tmp_path / "out"), solution)
+
+    expected = Solver(graph, num_buses, bus_size, constraints, solution=solution).set_score()[0]
+    assert score_output(folder, str(tmp_path / "out"))[0] == pytest.approx(expected)
+    assert not os.path.exists(f"{folder}/{CACHE_DIR}")  # Scoring doesn't write to the input folder.
+
+
+def test_output_scorer_rejects_invalid_outputs(tmp_path):
+    graph, num_buses, bus_size, constraints = random_input(0)
+    folder = str(tmp_path / "input")
+    write_input(folder, graph, num_buses, bus_size, constraints)
+    solution = random_solution(0, graph, num_buses)
+
+    write_solution_file(str(tmp_path / "missing.out"), [solution[0][1:]] + solution[1:])
+    assert score_output(folder, str(tmp_path / "missing.out"))[0] == -1
+    write_solution_file(str(tmp_path / "twice.out"), [solution[0] + solution[1][:1]] + solution[1:])
+    assert score_output(folder, str(tmp_path / "twice.out"))[0] == -1
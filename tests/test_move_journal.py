@@ -0,0 +1,90 @@
+import random
+import pytest
+from conftest import random_input, random_solution
+from solver import ProblemInstance, Solver, BasicOptimizer, DeltaScorer
+
+
+def partition(optimizer):
+    """
+    :return: the optimizer's solution as a list of sets (the order within a bus is not kept by moves).
+    """
+    return [set(bus) for bus in optimizer.solution]
+
+
+def scorer_state(scorer):
+    return scorer.edges, list(scorer.bus_edges), list(scorer.invalid_count), [dict(c) for c in scorer.group_counts]
+
+
+def apply_random_swaps(rng, optimizer, count):
+    buses = optimizer.scorer.assignment.buses
+    for _ in range(count):
+        bus1, bus2 = rng.sample(range(optimizer.num_buses), 2)
+        vertex_1 = rng.choice(buses[bus1])
+        vertex_2 = rng.choice(buses[bus2]) if rng.random() < 0.7 or len(buses[bus1]) == 1 else None
+        optimizer.move_vertices(vertex_1, vertex_2, bus1, bus2)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_rollback_restores_the_solution(seed):
+    rng = random.Random(seed)
+    instance = ProblemInstance(*random_input(seed))
+    optimizer = BasicOptimizer(*instance, random_solution(seed, instance.graph, instance.num_buses),
+                               instance=instance)
+    before, state = partition(optimizer), scorer_state(optimizer.scorer)
+
+    apply_random_swaps(rng, optimizer, 50)
+    assert len(optimizer.journal) == 50
+    optimizer.journal.rollback(optimizer)
+
+    assert len(optimizer.journal) == 0
+    assert partition(optimizer) == before
+    assert scorer_state(optimizer.scorer) == state
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_rollback_to_mark(seed):
+    rng = random.Random(seed)
+    instance = ProblemInstance(*random_input(seed))
+    optimizer = BasicOptimizer(*instance, random_solution(seed, instance.graph, instance.num_buses),
+                               instance=instance)
+    apply_random_swaps(rng, optimizer, 20)
+    mark = optimizer.journal.mark()
+    at_mark, state = partition(optimizer), scorer_state(optimizer.scorer)
+
+    apply_random_swaps(rng, optimizer, 20)
+    optimizer.journal.rollback(optimizer, mark)
+
+    assert len(optimizer.journal) == mark
+    assert partition(optimizer) == at_mark
+    assert scorer_state(optimizer.scorer) == state
+    # The restored counters are the same as the ones built from scratch.
+    assert scorer_state(DeltaScorer(instance, optimizer.solution)) == state
+
+
+def test_commit_keeps_the_swaps():
+    rng = random.Random(0)
+    instance = ProblemInstance(*random_input(0))
+    optimizer = BasicOptimizer(*instance, random_solution(0, instance.graph, instance.num_buses),
+                               instance=instance)
+    apply_random_swaps(rng, optimizer, 10)
+    after = partition(optimizer)
+    optimizer.journal.commit()
+    optimizer.journal.rollback(optimizer)
+    assert partition(optimizer) == after
+
+
+def test_solution_is_a_read_only_snapshot():
+    instance = ProblemInstance(*random_input(0))
+    solution = random_solution(0, instance.graph, instance.num_buses)
+    optimizer = BasicOptimizer(*instance, solution, instance=instance)
+    snapshot = optimizer.solution
+    with pytest.raises(AttributeError):
+        snapshot[0].append(snapshot[1][0])
+    with pytest.raises(TypeError):
+        snapshot[0] = ()
+
+    apply_random_swaps(random.Random(0), optimizer, 10)
+    assert [set(bus) for bus in snapshot] == [set(bus) for bus in solution]
+    assert optimizer.labeled_solution() == [list(bus) for bus in optimizer.solution]
+    solver = Solver(*instance, solution=optimizer.labeled_solution(), instance=instance)
+    assert optimizer.get_solution_vertices_by_importance() == solver.get_solution_vertices_by_importance()
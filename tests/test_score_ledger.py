@@ -0,0 +1,75 @@
+import json
+import multiprocessing
+import pytest
+from solver import ScoreLedger, fcntl
+
+NUM_WORKERS = 4
+RECORDS = 50
+
+
+def record_scores(path, worker):
+    """
+    Worker process that records scores for 5 outputs, compacting the ledger now and then.
+    """
+    ledger = ScoreLedger(path)
+    for i in range(RECORDS):
+        ledger.record(f"out/{i % 5}.out", (i * NUM_WORKERS + worker) / 1000)
+        if i % 10 == worker:
+            ledger.load()
+
+
+def test_record_keeps_the_best_score(tmp_path):
+    ledger = ScoreLedger(str(tmp_path / "scores.jsonl"))
+    writes = []
+    assert ledger.record("a.out", 0.5, write=lambda: writes.append(0.5)) == (None, True)
+    assert ledger.record("a.out", 0.4, write=lambda: writes.append(0.4)) == (0.5, False)
+    assert ledger.record("a.out", 0.5) == (0.5, False)
+    assert ledger.record("a.out", 0.7, write=lambda: writes.append(0.7)) == (0.5, True)
+    assert writes == [0.5, 0.7]
+    assert ScoreLedger(ledger.path).load() == {"a.out": 0.7}
+
+
+def test_load_compacts_and_merges_the_legacy_scores(tmp_path):
+    path = tmp_path / "scores.jsonl"
+    legacy_path = tmp_path / "scores.json"
+    legacy_path.write_text(json.dumps({"a.out": 0.9, "b.out": 0.1}))
+    ledger = ScoreLedger(str(path))
+    for score in (0.1, 0.3, 0.2):
+        ledger.record("a.out", score)
+        ledger.record("b.out", score)
+
+    assert ScoreLedger(str(path)).load(legacy_path=str(legacy_path)) == {"a.out": 0.9, "b.out": 0.3}
+    assert len(path.read_text().splitlines()) == 2
+    # The first ledger sees that the file was replaced and re-reads it.
+    assert ledger.record("b.out", 0.2) == (0.3, False)
+
+
+def test_partial_and_bad_lines_are_ignored(tmp_path):
+    path = tmp_path / "scores.jsonl"
+    path.write_text('{"file": "a.out", "score": 0.4}\nnot json\n{"file": "b.out"}\n{"file": "a.out", "sco')
+    ledger = ScoreLedger(str(path))
+    assert ledger.record("b.out", 0.2) == (None, True)
+    assert ledger.record("a.out", 0.3) == (0.4, False)
+    assert ScoreLedger(str(path)).load() == {"a.out": 0.4, "b.out": 0.2}
+
+
+@pytest.mark.skipif(fcntl is None, reason="the ledger is only safe to share with file locks")
+def test_processes_share_the_ledger(tmp_path):
+    path = str(tmp_path / "scores.jsonl")
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=record_scores, args=(path, worker)) for worker in range(NUM_WORKERS)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+
+    with open(path, 'r') as f:
+        entries = [json.loads(line) for line in f]  # Every line is whole.
+    best = {}
+    for i in range(RECORDS):
+        for worker in range(NUM_WORKERS):
+            file_path = f"out/{i % 5}.out"
+            best[file_path] = max(best.get(file_path, -1), (i * NUM_WORKERS + worker) / 1000)
+    assert ScoreLedger(path).load() == best
+    assert max(entry["score"] for entry in entries) == max(best.values())
@@ -0,0 +1,71 @@
+import os
+import numpy as np
+import pytest
+from conftest import INPUTS_DIR, random_input
+from solver import ProblemInstance, parse_input, DeltaScorer, DDHeuristicTieBreakers, TabuSearchOptimizer
+
+
+class CheckedTabuSearch(TabuSearchOptimizer):
+    """
+    TabuSearchOptimizer that checks its incrementally updated gains and candidates against ones
+    computed from scratch on every iteration.
+    """
+
+    checked = 0
+
+    def candidates(self, k):
+        top = TabuSearchOptimizer.candidates(self, k)
+        scorer = self.scorer
+        for u in range(len(self.adjacency)):
+            from_bus = scorer.bus_of[u]
+            row = self.friends[u]
+            own = row.get(from_bus, 0)
+            bonus = self.break_gain(u) if scorer.invalid_count[u] else 0
+            gains = {}
+            if own != self.degrees[u] or bonus:
+                for to_bus in (row if not bonus else range(self.num_buses)):
+                    if to_bus != from_bus:
+                        gains[to_bus] = row.get(to_bus, 0) - own + bonus
+            assert (self.gains[u], self.gains_bus[u], self.own[u]) == (gains, from_bus, own)
+            assert self.bonuses.get(u, 0) == bonus
+
+        for pair, candidates in self.pair_candidates.items():
+            assert candidates == self.pair_candidates_of(*pair)
+        # The best legal move is one of the candidates.
+        buses = scorer.assignment.buses
+        legal = [gain for u in range(len(self.adjacency)) for to_bus, gain in self.gains[u].items()
+                 if len(buses[scorer.bus_of[u]]) > 1 and len(buses[to_bus]) < self.bus_size]
+        if legal:
+            moves = [c[0] for candidates in self.pair_candidates.values() for c in candidates if c[2] is None]
+            assert max(moves) == max(legal)
+        assert len(set(top)) == len(top)
+        self.checked += 1
+        return top
+
+
+def check_tabu_search(instance, solution):
+    optimizer = CheckedTabuSearch(*instance, solution, max_iterations=100, instance=instance)
+    start_score = optimizer.set_score()[0]
+    optimizer.solve()
+    assert optimizer.checked > 0
+    score = optimizer.set_score()[0]
+    assert score >= start_score  # Ends on the best solution it has seen.
+    assert score == pytest.approx(DeltaScorer(instance, optimizer.solution).score)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_candidates_on_random_inputs(seed):
+    np.random.seed(seed)
+    graph, num_buses, _, constraints = random_input(seed)
+    instance = ProblemInstance(graph, num_buses, 10, constraints)  # Full buses, so there are swaps.
+    solution = [list(graph.nodes())[i::num_buses] for i in range(num_buses)]
+    check_tabu_search(instance, solution)
+
+
+@pytest.mark.parametrize("category, name", [("small", "1"), ("medium", "100"), ("large", "1000")])
+def test_candidates_on_inputs(category, name):
+    np.random.seed(0)
+    instance = parse_input(os.path.join(INPUTS_DIR, category, name), compact=True, use_cache=False)
+    heuristic = DDHeuristicTieBreakers(*instance, "LEAST_FULL", instance=instance)
+    heuristic.solve("PRIO_QUEUE")
+    check_tabu_search(instance, heuristic.solution)
@@ -0,0 +1,83 @@
+import os
+import random
+import time
+import pytest
+from conftest import INPUTS_DIR, round_robin_solution
+import solver
+from solver import (parse_input, BasicOptimizer, TreeSearchOptimizer, FMOptimizer, SimulatedAnnealingOptimizer,
+                    ParallelTemperingOptimizer, TabuSearchOptimizer, MultilevelSolver, MemeticSolver, RaceStats,
+                    RacingSolver)
+
+TIME_LIMIT = 1.0
+SLACK = 0.75  # Seconds an optimizer may take after its time limit (its last step, stopping workers).
+# Optimizers that don't stop on their own before the time limit on these inputs.
+RUNS_TO_LIMIT = {"basic", "tree_search", "tree_search_processes", "simulated_annealing", "parallel_tempering",
+                 "tabu", "racing", "racing_processes"}
+
+
+# large/1000 has a student in a rowdy pair with students of every bus, medium/150 has rowdy groups of
+# hundreds of students (which makes single moves slow).
+@pytest.fixture(scope="module", params=[("large", "1000"), ("medium", "150")], ids=lambda param: "/".join(param))
+def instance(request):
+    return parse_input(os.path.join(INPUTS_DIR, *request.param), compact=True, use_cache=False)
+
+
+def make_optimizers(instance, tmp_path):
+    """
+    :return: dict of {name: function that makes the optimizer} of optimizers that run for much
+        longer than TIME_LIMIT without one.
+    """
+    solution = round_robin_solution(instance)
+    population = [solution]
+    for seed in range(3):
+        shuffled = [u for bus in solution for u in bus]
+        random.Random(seed).shuffle(shuffled)
+        population.append([shuffled[i::instance.num_buses] for i in range(instance.num_buses)])
+    return {
+        "basic": lambda: BasicOptimizer(*instance, solution, sample_size=10 ** 6, early_termination=False,
+                                        time_limit=TIME_LIMIT, instance=instance),
+        "tree_search": lambda: TreeSearchOptimizer(*instance, solution, sample_size=300, max_rollout=50,
+                                                   early_termination=False, time_limit=TIME_LIMIT,
+                                                   instance=instance),
+        "tree_search_processes": lambda: TreeSearchOptimizer(*instance, solution, sample_size=300, max_rollout=50,
+                                                             early_termination=False, processes=2,
+                                                             time_limit=TIME_LIMIT, instance=instance),
+        "fm": lambda: FMOptimizer(*instance, solution, max_passes=10 ** 6, time_limit=TIME_LIMIT, instance=instance),
+        "simulated_annealing": lambda: SimulatedAnnealingOptimizer(*instance, solution, schedule="REHEATING",
+                                                                   time_limit=TIME_LIMIT, instance=instance),
+        "parallel_tempering": lambda: ParallelTemperingOptimizer(*instance, solution, processes=2,
+                                                                 time_limit=TIME_LIMIT, instance=instance),
+        "tabu": lambda: TabuSearchOptimizer(*instance, solution, max_iterations=10 ** 9, max_stall=10 ** 9,
+                                            time_limit=TIME_LIMIT, instance=instance),
+        "multilevel": lambda: MultilevelSolver(*instance, refine_passes=10 ** 6, time_limit=TIME_LIMIT,
+                                               instance=instance),
+        "memetic": lambda: MemeticSolver(*instance, population, generations=10 ** 6, time_limit=TIME_LIMIT,
+                                         instance=instance),
+        "racing": lambda: RacingSolver(*instance, stats=RaceStats(str(tmp_path / "race_stats.json")),
+                                       time_limit=TIME_LIMIT, instance=instance),
+        "racing_processes": lambda: RacingSolver(*instance, stats=RaceStats(str(tmp_path / "race_stats.json")),
+                                                 processes=2, time_limit=TIME_LIMIT, instance=instance),
+    }
+
+
+OPTIMIZERS = ["basic", "tree_search", "tree_search_processes", "fm", "simulated_annealing", "parallel_tempering",
+              "tabu", "multilevel", "memetic", "racing", "racing_processes"]
+
+
+@pytest.mark.parametrize("name", OPTIMIZERS)
+def test_optimizer_stops_at_its_time_limit(instance, tmp_path, name):
+    optimizer = make_optimizers(instance, tmp_path)[name]()
+    start = time.time()
+    optimizer.solve()
+    elapsed = time.time() - start
+    assert elapsed <= TIME_LIMIT + SLACK
+    if name in RUNS_TO_LIMIT:
+        assert elapsed >= TIME_LIMIT
+    assert optimizer.set_score()[0] >= 0
+
+
+def test_solve_splits_its_time_limit(instance):
+    start = time.time()
+    optimizer = solver.solve(*instance, instance=instance, refiner="FM", time_limit=2 * TIME_LIMIT)
+    assert time.time() - start <= 2 * TIME_LIMIT + SLACK
+    assert optimizer.set_score()[0] >= 0
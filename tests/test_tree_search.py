@@ -0,0 +1,21 @@
+import os
+import numpy as np
+import pytest
+from conftest import INPUTS_DIR
+from solver import parse_input, DeltaScorer, DDHeuristicTieBreakers, TreeSearchOptimizer
+
+
+@pytest.mark.parametrize("category, name", [("small", "1"), ("medium", "100"), ("large", "1000")])
+@pytest.mark.parametrize("processes, batch_size", [(None, 1), (None, 4), (2, 1)])
+def test_tree_search_keeps_its_score(category, name, processes, batch_size):
+    np.random.seed(0)
+    instance = parse_input(os.path.join(INPUTS_DIR, category, name), compact=True, use_cache=False)
+    heuristic = DDHeuristicTieBreakers(*instance, "LEAST_FULL", instance=instance)
+    heuristic.solve("PRIO_QUEUE")
+    optimizer = TreeSearchOptimizer(*instance, heuristic.solution, sample_size=60, max_rollout=20,
+                                    batch_size=batch_size, processes=processes, chunk_size=25, instance=instance)
+    start_score = optimizer.set_score()[0]
+    optimizer.optimize(max_iterations=3)
+    score = optimizer.set_score()[0]
+    assert score >= start_score  # Only rollouts that aren't worse are kept.
+    assert score == pytest.approx(DeltaScorer(instance, optimizer.solution).score)